@@ -0,0 +1,179 @@
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import get_state_dir
+from app.logger import logger
+
+
+# Keys probed at the bucket root when bucket_manifest_key is not configured
+DEFAULT_MANIFEST_KEYS = ("_manifest.json.gz", "_manifest.json")
+# Manifests older than this (hours) are ignored; overridable with bucket_manifest_max_age
+DEFAULT_MAX_AGE_HOURS = 24.0
+# When no manifest is published, probe again only after this many seconds
+_MISSING_RECHECK = 3600.0
+
+
+def get_bucket_manifest_cache_path(profile: str | None = None) -> Path:
+    return get_state_dir(profile) / "bucket_manifest_cache.json"
+
+
+def _load_cache(profile: str | None = None) -> dict:
+    path = get_bucket_manifest_cache_path(profile)
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save_cache(data: dict, profile: str | None = None):
+    path = get_bucket_manifest_cache_path(profile)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _status_code(exc: BaseException) -> int | None:
+    response = getattr(exc, "response", None)
+    if not isinstance(response, dict):
+        return None
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    code = response.get("Error", {}).get("Code")
+    if status is None and code and str(code).isdigit():
+        status = int(code)
+    if code in ("NoSuchKey", "NotFound"):
+        status = 404
+    return status
+
+
+def _parse_body(key: str, body: bytes, content_encoding: str | None) -> dict:
+    if key.endswith(".gz") or content_encoding == "gzip" or body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    data = json.loads(body)
+    if isinstance(data, list):
+        data = {"objects": data}
+    return data
+
+
+def _check_objects(objects: list):
+    """Raise ValueError unless every record has a key, size and etag.
+
+    Records without them cannot be compared against local files, so a
+    manifest containing any is not used at all.
+    """
+    if not isinstance(objects, list):
+        raise ValueError("'objects' is not a list")
+    for o in objects:
+        if not isinstance(o, dict) or not o.get("key") or not o.get("etag") or not isinstance(o.get("size"), int):
+            raise ValueError(f"incomplete record {o!r:.200}")
+
+
+def _to_listing(objects: list) -> list:
+    """Convert manifest records into ListObjectsV2-style entries."""
+    return [
+        {
+            "Key": o["key"],
+            "Size": o["size"],
+            "ETag": o["etag"],
+            "LastModified": o.get("last_modified"),
+        }
+        for o in objects
+    ]
+
+
+def _is_fresh(generated: str | None, max_age_hours: float) -> bool:
+    if not generated or max_age_hours <= 0:
+        return True
+    try:
+        stamp = datetime.fromisoformat(generated.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    age = datetime.now(timezone.utc) - stamp
+    return age.total_seconds() <= max_age_hours * 3600
+
+
+def fetch_bucket_manifest(s3, config: dict) -> list | None:
+    """Return the producer-published object index as ListObjectsV2-style entries.
+
+    The manifest is a JSON document (optionally gzip compressed) at the bucket
+    root: ``{"generated": "<ISO time>", "objects": [{"key", "size", "etag",
+    "last_modified"}, ...]}``. It is fetched with If-None-Match against the
+    cached copy, so an unchanged manifest costs a single 304 response.
+    Returns None when there is no manifest, it is older than
+    bucket_manifest_max_age hours, it cannot be read, or a record lacks its
+    size or etag; callers then fall back to listing the bucket.
+    """
+    if not config.get("use_bucket_manifest", True):
+        return None
+
+    bucket = config["bucket"]
+    configured = config.get("bucket_manifest_key")
+    candidates = (configured,) if configured else DEFAULT_MANIFEST_KEYS
+    max_age = float(config.get("bucket_manifest_max_age", DEFAULT_MAX_AGE_HOURS))
+
+    profile = config.get("profile")
+    cache = _load_cache(profile)
+    if cache.get("bucket") != bucket:
+        cache = {}
+    if cache.get("missing") and time.time() - cache.get("checked", 0) < _MISSING_RECHECK:
+        return None
+
+    # try the key that worked last time first
+    if cache.get("key") in candidates:
+        candidates = (cache["key"],) + tuple(k for k in candidates if k != cache["key"])
+
+    for key in candidates:
+        kwargs = {"Bucket": bucket, "Key": key}
+        if cache.get("key") == key and cache.get("etag"):
+            kwargs["IfNoneMatch"] = cache["etag"]
+        try:
+            resp = s3.get_object(**kwargs)
+        except Exception as exc:
+            status = _status_code(exc)
+            if status == 304:
+                logger.info("Bucket manifest %s unchanged (304)", key)
+                data = cache
+                break
+            if status == 404:
+                continue
+            logger.warning("Failed to fetch bucket manifest %s, falling back to listing: %s", key, exc)
+            return None
+
+        try:
+            data = _parse_body(key, resp["Body"].read(), resp.get("ContentEncoding"))
+        except Exception as exc:
+            logger.warning("Bucket manifest %s is unreadable, falling back to listing: %s", key, exc)
+            return None
+        generated = data.get("generated")
+        if not generated and resp.get("LastModified") is not None:
+            generated = resp["LastModified"].isoformat()
+        data = {
+            "bucket": bucket,
+            "key": key,
+            "etag": resp.get("ETag"),
+            "generated": generated,
+            "objects": data.get("objects", []),
+        }
+        _save_cache(data, profile)
+        logger.info("Bucket manifest %s downloaded: %d objects", key, len(data["objects"]))
+        break
+    else:
+        _save_cache({"bucket": bucket, "missing": True, "checked": time.time()}, profile)
+        return None
+
+    if not _is_fresh(data.get("generated"), max_age):
+        logger.info("Bucket manifest %s is stale (generated %s), falling back to listing", data["key"], data.get("generated"))
+        return None
+    try:
+        _check_objects(data.get("objects", []))
+    except ValueError as exc:
+        logger.warning("Bucket manifest %s is incomplete, falling back to listing: %s", data["key"], exc)
+        return None
+    return _to_listing(data.get("objects", []))
@@ -1,14 +1,30 @@
 from PySide6.QtWidgets import (
     QWidget, QLabel, QVBoxLayout, QGridLayout, QFrame,
-    QPushButton, QHBoxLayout
+    QPushButton, QHBoxLayout, QMenu
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal
 from datetime import date
 import calendar
 
+from app import tracing
+
+
+def _week_context_menu(widget: QWidget, week: tuple, on_week_action, event):
+    """Show the per-week actions menu and forward the chosen action."""
+    if on_week_action is None:
+        return
+    menu = QMenu(widget)
+    prioritize = menu.addAction(f"Download W{week[1]:02d} first")
+    cancel = menu.addAction(f"Cancel queued downloads for W{week[1]:02d}")
+    chosen = menu.exec(event.globalPos())
+    if chosen is prioritize:
+        on_week_action(week, "prioritize")
+    elif chosen is cancel:
+        on_week_action(week, "cancel")
+
 
 class DayCell(QFrame):
-    def __init__(self, day: date, current_month: int, week_status: dict | None = None):
+    def __init__(self, day: date, current_month: int, week_status: dict | None = None, on_week_action=None, in_scope=None):
         super().__init__()
 
         self.setObjectName("dayCell")
@@ -26,10 +42,16 @@ class DayCell(QFrame):
         self.setLayout(layout)
 
         # Initial style will be set by update_style which is called by the parent
-        self._week_status = week_status or {}
+        # shared with the calendar (also when empty) so in-place updates show up
+        self._week_status = week_status if week_status is not None else {}
         self._current_month = current_month
+        self._on_week_action = on_week_action
+        self._in_scope = in_scope
         self.update_style()
 
+    def contextMenuEvent(self, event):
+        _week_context_menu(self, (self.iso_year, self.iso_week), self._on_week_action, event)
+
     def update_style(self):
         week_key = (self.iso_year, self.iso_week)
         ws = self._week_status.get(week_key, {"local": False, "bucket": False})
@@ -38,9 +60,15 @@ class DayCell(QFrame):
         purple = "#531a46"
         yellow = "#eea83a"
         crimson = "#d82b2c"
+        orange = "#e4532e"
 
         # Determine colors based on status
-        if ws.get("bucket") and ws.get("local"):
+        if ws.get("bucket") and ws.get("local") and ws.get("stale"):
+            # synced, but files were re-uploaded in the bucket since
+            bg = "rgba(228, 83, 46, 0.3)"
+            border = orange
+            text = "#FFFFFF"
+        elif ws.get("bucket") and ws.get("local"):
             # synced
             bg = "rgba(83, 26, 70, 0.3)"
             border = purple
@@ -61,11 +89,19 @@ class DayCell(QFrame):
                 border = "rgba(128, 128, 128, 0.2)"
                 text = "#FFFFFF"
 
+        # weeks outside the sync filter keep their status colour but are
+        # drawn with a dashed border and dimmed text
+        line = "solid"
+        if self._in_scope is not None and not self._in_scope(week_key):
+            line = "dashed"
+            border = "rgba(128, 128, 128, 0.6)"
+            text = "rgba(255, 255, 255, 0.35)"
+
         base_style = f"""
             QFrame#dayCell {{
                 background-color: {bg};
                 color: {text};
-                border: 1px solid {border};
+                border: 1px {line} {border};
                 border-radius: 2px;
             }}
             QFrame#dayCell QLabel {{ color: {text}; background: transparent; border: none; }}
@@ -88,11 +124,12 @@ class DayCell(QFrame):
 
 
 class WeekCell(QFrame):
-    def __init__(self, year: int, week: int):
+    def __init__(self, year: int, week: int, on_week_action=None):
         super().__init__()
 
         self.year = year
         self.week = week
+        self._on_week_action = on_week_action
 
         self.setFrameShape(QFrame.StyledPanel)
         self.setMinimumSize(32, 20)
@@ -116,9 +153,12 @@ class WeekCell(QFrame):
             QFrame QLabel { color: rgba(255,255,255,0.75); font-size: 11px; }
         """)
 
+    def contextMenuEvent(self, event):
+        _week_context_menu(self, (self.year, self.week), self._on_week_action, event)
+
 
 class MonthWidget(QWidget):
-    def __init__(self, year: int, month: int, week_status: dict | None = None):
+    def __init__(self, year: int, month: int, week_status: dict | None = None, on_week_action=None, in_scope=None):
         super().__init__()
 
         layout = QVBoxLayout()
@@ -149,15 +189,17 @@ class MonthWidget(QWidget):
 
         row = 1
         col = 1  # Start from column 1 to leave column 0 for week numbers
+        self.day_cells = []
         
         # Add first week number
         if days:
-            _, week_num, _ = days[0].isocalendar()
-            grid.addWidget(WeekCell(year, week_num), row, 0)
+            week_year, week_num, _ = days[0].isocalendar()
+            grid.addWidget(WeekCell(week_year, week_num, on_week_action), row, 0)
 
         for d in days:
-            cell = DayCell(d, month, week_status=week_status)
+            cell = DayCell(d, month, week_status=week_status, on_week_action=on_week_action, in_scope=in_scope)
             grid.addWidget(cell, row, col)
+            self.day_cells.append(cell)
 
             col += 1
             if col == 8:
@@ -167,8 +209,8 @@ class MonthWidget(QWidget):
                 if d != days[-1]:
                     # Use the next day's week number
                     next_day = days[days.index(d) + 1]
-                    _, w_num, _ = next_day.isocalendar()
-                    grid.addWidget(WeekCell(year, w_num), row, 0)
+                    w_year, w_num, _ = next_day.isocalendar()
+                    grid.addWidget(WeekCell(w_year, w_num, on_week_action), row, 0)
 
         layout.addWidget(title)
         layout.addLayout(grid)
@@ -179,6 +221,9 @@ class MonthWidget(QWidget):
 
 
 class YearCalendarWidget(QWidget):
+    # (year, week) tuple and action name ("prioritize" / "cancel") from the context menu
+    week_action = Signal(object, str)
+
     def __init__(self, year: int):
         super().__init__()
 
@@ -230,6 +275,10 @@ class YearCalendarWidget(QWidget):
 
         # current week status (tuple keys -> dict)
         self._week_status: dict[tuple, dict] = {}
+        # (year, week) -> bool from the sync filter, None = everything in scope
+        self._in_scope = None
+        # (year, week) -> day cells showing it, for restyling single weeks
+        self._day_cells: dict[tuple, list] = {}
 
         self.setLayout(self._main_layout)
 
@@ -244,13 +293,22 @@ class YearCalendarWidget(QWidget):
                 w.setParent(None)
 
     def _build_months(self):
-        self._clear_grid()
-
-        month = 1
-        for row in range(3):
-            for col in range(4):
-                self._grid.addWidget(MonthWidget(self.year, month, week_status=self._week_status), row, col)
-                month += 1
+        # a span when redrawn for a new week status, a trace of its own when paging years
+        with tracing.operation("build_months", group=tracing.UI_GROUP, year=self.year):
+            self._clear_grid()
+            self._day_cells = {}
+
+            month = 1
+            for row in range(3):
+                for col in range(4):
+                    month_widget = MonthWidget(
+                        self.year, month, week_status=self._week_status,
+                        on_week_action=self.week_action.emit, in_scope=self._in_scope,
+                    )
+                    for cell in month_widget.day_cells:
+                        self._day_cells.setdefault((cell.iso_year, cell.iso_week), []).append(cell)
+                    self._grid.addWidget(month_widget, row, col)
+                    month += 1
 
     def set_week_status(self, week_status: dict):
         """Update internal week status and refresh rendering."""
@@ -258,6 +316,19 @@ class YearCalendarWidget(QWidget):
         # rebuild months to apply new styles
         self._build_months()
 
+    def update_weeks(self, weeks):
+        """Restyle the cells of ``weeks`` after their entries in the current
+        week status changed in place; the months are not rebuilt.
+        """
+        for week in weeks:
+            for cell in self._day_cells.get(week, ()):
+                cell.update_style()
+
+    def set_scope(self, in_scope):
+        """Set the (year, week) -> bool predicate marking weeks inside the sync filter."""
+        self._in_scope = in_scope
+        self._build_months()
+
     def _on_prev(self):
         if self.year > self._min_year:
             self.year -= 1
@@ -0,0 +1,357 @@
+"""Headless entry point: ``python -m app.cli refresh|plan|download|verify|retry-failed|daemon``.
+
+Uses the same config.json and state files as the desktop app but never
+imports PySide6. Each command prints a one-line JSON summary on stdout
+(the daemon prints one per cycle); logging goes to stderr and app.log.
+``--profile NAME`` selects a profile, ``--all-profiles`` runs the command
+for every profile concurrently (one summary per profile). ``--shard K/N``
+limits a run to one part of the keyspace; ``backfill --workers N`` starts N
+such shard processes on this machine.
+Exit codes: 0 success, 1 some objects failed, 2 not configured, 130 interrupted.
+"""
+import argparse
+import json
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import get_active_profile, get_config_path, list_profiles, load_config, use_shard_state
+from app.failure_journal import get_failure_journal, merge_shard_journals
+from app.logger import logger
+from app.sharding import SHARD_BY, format_shard, parse_shard
+from app.sync import (
+    SyncCancelled,
+    download_weeks,
+    needs_download,
+    plan_download,
+    refresh_week_status,
+    retry_failed,
+    save_week_status,
+    verify_local_mirror,
+)
+from app.telemetry import format_snapshot
+
+
+_REQUIRED = ("endpoint", "access_key", "secret_key", "bucket", "local_path")
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_NOT_CONFIGURED = 2
+EXIT_CANCELLED = 130
+
+_print_lock = threading.Lock()
+
+
+def _emit(summary: dict):
+    summary.setdefault("time", datetime.now(timezone.utc).isoformat(timespec="seconds"))
+    line = json.dumps(summary, default=str)
+    with _print_lock:
+        print(line, flush=True)
+
+
+def _status_counts(status: dict) -> dict:
+    return {
+        "weeks": len(status),
+        "synced": sum(1 for v in status.values() if v.get("local") and v.get("bucket") and not v.get("stale")),
+        "missing": sum(1 for v in status.values() if v.get("bucket") and not v.get("local")),
+        "stale": sum(1 for v in status.values() if v.get("stale")),
+        "pending": sum(1 for v in status.values() if needs_download(v)),
+    }
+
+
+def _progress_printer(enabled: bool, profile: str):
+    if not enabled:
+        return None
+
+    def _progress(snap: dict):
+        if "bytes_done" in snap:
+            print(f"[{profile}] {format_snapshot(snap)}", file=sys.stderr, flush=True)
+    return _progress
+
+
+def _download_summary(command: str, profile: str, status: dict, failures: list, downloaded: list, started: float) -> dict:
+    return {
+        "command": command,
+        "profile": profile,
+        "ok": not failures,
+        "downloaded": len(downloaded),
+        "failed": len(failures),
+        "failures": [{"key": key, "error": error} for key, error in failures],
+        "status": _status_counts(status),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def cmd_refresh(args, cancel_event, profile: str) -> int:
+    started = time.monotonic()
+    status = refresh_week_status(cancel_event=cancel_event, profile=profile)
+    save_week_status(status, profile)
+    _emit({
+        "command": "refresh",
+        "profile": profile,
+        "ok": True,
+        "status": _status_counts(status),
+        "seconds": round(time.monotonic() - started, 3),
+    })
+    return EXIT_OK
+
+
+def cmd_plan(args, cancel_event, profile: str) -> int:
+    started = time.monotonic()
+    plan = plan_download(None, cancel_event=cancel_event, profile=profile)
+    _emit({
+        "command": "plan",
+        "profile": profile,
+        "ok": True,
+        **plan,
+        "seconds": round(time.monotonic() - started, 3),
+    })
+    return EXIT_OK
+
+
+def cmd_download(args, cancel_event, profile: str) -> int:
+    started = time.monotonic()
+    progress = _progress_printer(args.progress, profile)
+    status, failures, downloaded = download_weeks(
+        None, cancel_event=cancel_event, progress=progress, profile=profile,
+        shard=args.shard, shard_by=args.shard_by,
+    )
+    if not args.shard:
+        # a shard only sees part of the bucket; its status must not replace the full one
+        save_week_status(status, profile)
+    summary = _download_summary("download", profile, status, failures, downloaded, started)
+    if args.shard:
+        summary["shard"] = args.shard
+    _emit(summary)
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def cmd_retry_failed(args, cancel_event, profile: str) -> int:
+    started = time.monotonic()
+    progress = _progress_printer(args.progress, profile)
+    status, failures, downloaded = retry_failed(cancel_event=cancel_event, progress=progress, profile=profile)
+    save_week_status(status, profile)
+    _emit(_download_summary("retry-failed", profile, status, failures, downloaded, started))
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def cmd_verify(args, cancel_event, profile: str) -> int:
+    started = time.monotonic()
+    summary = verify_local_mirror("quick" if args.quick else "full", cancel_event=cancel_event, profile=profile)
+    ok = not summary["missing"] and not summary["corrupt"]
+    _emit({
+        "command": "verify",
+        "profile": profile,
+        **summary,
+        "ok": ok,
+        "passed": summary["ok"],
+        "corrupt": [{"key": key, "problem": problem} for key, problem in summary["corrupt"]],
+        "seconds": round(time.monotonic() - started, 3),
+    })
+    return EXIT_OK if ok else EXIT_FAILURES
+
+
+def cmd_backfill(args, cancel_event, profile: str) -> int:
+    """Run ``download`` in ``--workers`` shard processes and wait for all of them.
+
+    Each child prints its own JSON summary, which is passed through; a final
+    summary with the totals follows. Failures of the shards are merged into
+    the profile's failure journal afterwards. Cancelling stops the children, which
+    keep their unfinished downloads queued for the next backfill.
+    """
+    started = time.monotonic()
+    n = args.workers
+    procs = []
+    for k in range(1, n + 1):
+        cmd = [sys.executable, "-m", "app.cli", "--profile", profile,
+               "--shard", format_shard((k, n)), "--shard-by", args.shard_by or "key", "download"]
+        if args.progress:
+            cmd.append("--progress")
+        procs.append(subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True))
+    logger.info("Backfill of profile %s started with %d shard processes", profile, n)
+
+    results = []
+    lock = threading.Lock()
+
+    def _relay(proc):
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            with _print_lock:
+                print(line, flush=True)
+            try:
+                with lock:
+                    results.append(json.loads(line))
+            except ValueError:
+                pass
+
+    relays = [threading.Thread(target=_relay, args=(p,), daemon=True) for p in procs]
+    for t in relays:
+        t.start()
+    while any(p.poll() is None for p in procs):
+        if cancel_event.wait(0.5):
+            for p in procs:
+                if p.poll() is None:
+                    p.terminate()
+    for p in procs:
+        p.wait()
+    for t in relays:
+        t.join()
+
+    codes = [p.returncode for p in procs]
+    # shards record failures in their own state; "retry-failed" and the GUI read the profile's
+    merge_shard_journals(profile, Path(load_config(profile)["local_path"]))
+    summary = {"journal": len(get_failure_journal(profile))}
+    if not cancel_event.is_set():
+        # shards only saw their own part; record the status of the whole bucket
+        status = refresh_week_status(cancel_event=cancel_event, profile=profile)
+        save_week_status(status, profile)
+        summary["status"] = _status_counts(status)
+    _emit({
+        "command": "backfill",
+        "profile": profile,
+        "ok": all(c == EXIT_OK for c in codes),
+        "workers": n,
+        "downloaded": sum(r.get("downloaded", 0) for r in results),
+        "failed": sum(r.get("failed", 0) for r in results),
+        "exit_codes": codes,
+        **summary,
+        "seconds": round(time.monotonic() - started, 3),
+    })
+    if cancel_event.is_set():
+        return EXIT_CANCELLED
+    return max(c if c >= 0 else EXIT_CANCELLED for c in codes)
+
+
+def cmd_daemon(args, cancel_event, profile: str) -> int:
+    """Download on an interval until interrupted; failures never stop the loop."""
+    logger.info("Daemon started for profile %s, syncing every %ds", profile, args.interval)
+    while not cancel_event.is_set():
+        try:
+            cmd_download(args, cancel_event, profile)
+        except SyncCancelled:
+            break
+        except Exception as exc:
+            logger.exception("Sync cycle of profile %s failed", profile)
+            _emit({"command": "download", "profile": profile, "ok": False, "error": str(exc)})
+        if cancel_event.wait(args.interval):
+            break
+    logger.info("Daemon stopped for profile %s", profile)
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Mirror parquet files from R2 without the GUI.")
+    which = parser.add_mutually_exclusive_group()
+    which.add_argument("--profile", help="configuration profile to use (default: the active one)")
+    which.add_argument("--all-profiles", action="store_true", help="run for every profile concurrently")
+    parser.add_argument("--shard", help="download only shard K of N (e.g. 2/4); other shards may run elsewhere")
+    parser.add_argument("--shard-by", choices=SHARD_BY, help="split shards into key (week) ranges of each prefix (default) or by prefix")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("refresh", help="compare local folder and bucket, update the saved week status")
+
+    sub.add_parser("plan", help="show what download would transfer (files, bytes, requests, time) without downloading")
+
+    p = sub.add_parser("download", help="download everything missing or outdated (resumes queued downloads)")
+    p.add_argument("--progress", action="store_true", help="print transfer progress to stderr")
+
+    p = sub.add_parser("retry-failed", help="download only the objects in the failure journal")
+    p.add_argument("--progress", action="store_true", help="print transfer progress to stderr")
+
+    p = sub.add_parser("verify", help="check the local mirror, quarantine and requeue broken files")
+    p.add_argument("--quick", action="store_true", help="parquet header/footer and size only")
+
+    p = sub.add_parser("backfill", help="download everything using several shard processes")
+    p.add_argument("--workers", type=int, default=4, help="number of shard processes (default 4)")
+    p.add_argument("--progress", action="store_true", help="print transfer progress to stderr")
+
+    p = sub.add_parser("daemon", help="run download repeatedly")
+    p.add_argument("--interval", type=int, default=3600, help="seconds between syncs (default 3600)")
+    p.add_argument("--progress", action="store_true", help="print transfer progress to stderr")
+    return parser
+
+
+_COMMANDS = {
+    "refresh": cmd_refresh,
+    "plan": cmd_plan,
+    "download": cmd_download,
+    "retry-failed": cmd_retry_failed,
+    "verify": cmd_verify,
+    "backfill": cmd_backfill,
+    "daemon": cmd_daemon,
+}
+
+
+def _run_profile(args, cancel_event, profile: str) -> int:
+    try:
+        return _COMMANDS[args.command](args, cancel_event, profile)
+    except SyncCancelled:
+        _emit({"command": args.command, "profile": profile, "ok": False, "error": "cancelled"})
+        return EXIT_CANCELLED
+    except Exception as exc:
+        logger.exception("%s failed for profile %s", args.command, profile)
+        _emit({"command": args.command, "profile": profile, "ok": False, "error": str(exc)})
+        return EXIT_FAILURES
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as exc:
+            parser.error(str(exc))
+        if args.command not in ("download", "daemon"):
+            parser.error("--shard only applies to download and daemon")
+        args.shard = format_shard(shard)
+        # each shard keeps its own queue and manifests
+        use_shard_state(shard)
+    if args.command == "backfill" and args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if args.all_profiles:
+        profiles = list_profiles()
+    else:
+        profiles = [args.profile or get_active_profile()]
+    for profile in profiles:
+        config = load_config(profile)
+        missing = [k for k in _REQUIRED if not config.get(k)]
+        if missing:
+            _emit({
+                "command": args.command,
+                "profile": profile,
+                "ok": False,
+                "error": f"not configured: missing {', '.join(missing)} in {get_config_path()}",
+            })
+            return EXIT_NOT_CONFIGURED
+
+    # Ctrl+C / SIGTERM cancel cooperatively; unfinished downloads stay queued
+    cancel_event = threading.Event()
+
+    def _stop(signum, frame):
+        logger.info("Received signal %d, stopping", signum)
+        cancel_event.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _stop)
+
+    if len(profiles) == 1:
+        return _run_profile(args, cancel_event, profiles[0])
+
+    # profiles share the bandwidth limit and the global worker budgets
+    with ThreadPoolExecutor(max_workers=len(profiles), thread_name_prefix="profile") as pool:
+        codes = list(pool.map(lambda p: _run_profile(args, cancel_event, p), profiles))
+    return max(codes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import threading
+import time
+
+from app.logger import logger
+
+
+# Error codes / HTTP statuses that mean "slow down" rather than "broken"
+_THROTTLE_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequests",
+    "TooManyRequestsException",
+    "ServiceUnavailable",
+    "RequestTimeout",
+}
+_THROTTLE_STATUSES = {429, 503}
+
+# Multiplicative decrease factor and the minimum spacing between decreases
+_DECREASE_FACTOR = 0.5
+_DECREASE_COOLDOWN = 5.0
+# Throughput must improve by this fraction to justify the last increase
+_MIN_GAIN = 0.05
+# Error share within one round that counts as congestion
+_MAX_ERROR_RATE = 0.2
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """True for throttling responses (429/503/SlowDown) and timeouts."""
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if code in _THROTTLE_CODES or status in _THROTTLE_STATUSES:
+            return True
+    return "Timeout" in type(exc).__name__
+
+
+class SharedBudget:
+    """Process-wide cap on in-flight requests of one kind, shared by every
+    profile syncing at the same time. The number of slots can be changed
+    while requests are running.
+    """
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self._slots = max(1, int(slots))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def resize(self, slots: int):
+        with self._cond:
+            self._slots = max(1, int(slots))
+            self._cond.notify_all()
+
+    def acquire(self, cancel_event=None) -> bool:
+        with self._cond:
+            while self._in_flight >= self._slots:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                self._cond.wait(0.25)
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+_budgets: dict[str, SharedBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_shared_budget(name: str, slots: int) -> SharedBudget:
+    """Return the process-wide budget ``name``, resized to ``slots``."""
+    with _budgets_lock:
+        budget = _budgets.get(name)
+        if budget is None:
+            budget = _budgets[name] = SharedBudget(name, slots)
+        else:
+            budget.resize(slots)
+        return budget
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit for a pool of workers.
+
+    Workers call ``acquire()`` before each request and ``release()`` after it
+    with the outcome. The limit grows by one per round (``limit`` completed
+    requests) while measured throughput keeps improving, steps back by one
+    when an increase did not pay off, and is halved on throttling responses,
+    timeouts or a high error rate. It always stays within [minimum, maximum].
+    With a ``budget`` every slot also takes one from that ``SharedBudget``.
+    """
+
+    def __init__(self, name: str, minimum: int, maximum: int, initial: int | None = None, unit: str = "B",
+                 budget: SharedBudget | None = None):
+        self.name = name
+        self.unit = unit
+        self.budget = budget
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        start = initial if initial is not None else self.minimum
+        self._limit = min(self.maximum, max(self.minimum, int(start)))
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+
+        self._round_started = time.monotonic()
+        self._round_done = 0
+        self._round_errors = 0
+        self._round_amount = 0
+        self._round_latency = 0.0
+        self._last_throughput = None
+        self._last_increase = False
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def acquire(self, cancel_event=None) -> bool:
+        """Wait for a free slot. Returns False if ``cancel_event`` was set meanwhile."""
+        with self._cond:
+            while self._in_flight >= self._limit:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+                self._cond.wait(0.25)
+            self._in_flight += 1
+        if self.budget is not None and not self.budget.acquire(cancel_event):
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+            return False
+        return True
+
+    def release(self, ok: bool = True, amount: int = 0, latency: float = 0.0, throttled: bool = False):
+        """Give the slot back and feed the outcome of the request into the controller.
+
+        ``amount`` is the work done (bytes for transfers, keys for listing pages).
+        """
+        if self.budget is not None:
+            self.budget.release()
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._decrease_locked("throttled or timed out")
+            else:
+                self._round_done += 1
+                self._round_amount += amount
+                self._round_latency += latency
+                if not ok:
+                    self._round_errors += 1
+                if self._round_done >= self._limit:
+                    self._end_round_locked()
+            self._cond.notify_all()
+
+    def release_unused(self):
+        """Give a slot back without recording an outcome (nothing was requested)."""
+        if self.budget is not None:
+            self.budget.release()
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _set_limit_locked(self, new: int, reason: str):
+        new = min(self.maximum, max(self.minimum, new))
+        if new == self._limit:
+            return False
+        logger.info("Concurrency (%s): %d -> %d (%s)", self.name, self._limit, new, reason)
+        self._limit = new
+        return True
+
+    def _reset_round_locked(self):
+        self._round_started = time.monotonic()
+        self._round_done = 0
+        self._round_errors = 0
+        self._round_amount = 0
+        self._round_latency = 0.0
+
+    def _decrease_locked(self, reason: str):
+        now = time.monotonic()
+        # one decrease per cooldown so a burst of 503s from in-flight requests
+        # does not collapse the limit straight to the minimum
+        if now - self._last_decrease >= _DECREASE_COOLDOWN:
+            self._set_limit_locked(int(self._limit * _DECREASE_FACTOR), reason)
+            self._last_decrease = now
+        self._last_throughput = None
+        self._last_increase = False
+        self._reset_round_locked()
+
+    def _end_round_locked(self):
+        elapsed = max(time.monotonic() - self._round_started, 1e-6)
+        throughput = self._round_amount / elapsed
+        error_rate = self._round_errors / self._round_done
+        avg_latency = self._round_latency / self._round_done
+
+        if error_rate > _MAX_ERROR_RATE:
+            self._decrease_locked(f"{error_rate:.0%} errors")
+            return
+
+        previous = self._last_throughput
+        if self._last_increase and previous is not None and throughput < previous * (1 + _MIN_GAIN):
+            # the last step up did not buy anything; go back and hold
+            self._set_limit_locked(
+                self._limit - 1,
+                f"no gain at {throughput:.0f} {self.unit}/s vs {previous:.0f} {self.unit}/s, "
+                f"latency {avg_latency * 1000:.0f} ms",
+            )
+            self._last_increase = False
+        else:
+            self._last_increase = self._set_limit_locked(
+                self._limit + 1,
+                f"{throughput:.0f} {self.unit}/s, latency {avg_latency * 1000:.0f} ms",
+            )
+        self._last_throughput = throughput
+        self._reset_round_locked()
@@ -1,14 +1,37 @@
 import json
 import os
+import re
 from pathlib import Path
 
 APP_NAME = "SA_R2_Downloader"
 
+DEFAULT_PROFILE = "default"
+
+# Settings shared by all profiles: one bandwidth / concurrency budget and
+# one object cache per machine. Everything else belongs to a profile.
+GLOBAL_KEYS = (
+    "bandwidth_limit",
+    "bandwidth_schedule",
+    "global_download_workers",
+    "global_listing_workers",
+    "object_cache",
+    "cache_root",
+    "trace",
+    "log_format",
+)
+
+_PROFILE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9 _.-]{0,63}$")
+
+# Set in sharded worker processes so that shards running on the same machine
+# never write the same queue / manifest files
+_shard_state = None
+
 
 def get_appdata_dir() -> Path:
-    base = Path(os.getenv("APPDATA"))
-    app_dir = base / APP_NAME
-    app_dir.mkdir(exist_ok=True)
+    # %APPDATA% on Windows; XDG config dir elsewhere (headless Linux servers)
+    base = os.getenv("APPDATA") or os.getenv("XDG_CONFIG_HOME") or Path.home() / ".config"
+    app_dir = Path(base) / APP_NAME
+    app_dir.mkdir(parents=True, exist_ok=True)
     return app_dir
 
 
@@ -16,17 +39,125 @@ def get_config_path() -> Path:
     return get_appdata_dir() / "config.json"
 
 
-def load_config() -> dict:
+def _load_raw() -> dict:
     path = get_config_path()
     if not path.exists():
         return {}
     try:
-        config = json.loads(path.read_text(encoding="utf-8"))
-        return config
+        return json.loads(path.read_text(encoding="utf-8"))
     except Exception:
         return {}
 
 
-def save_config(config: dict):
+def _write_raw(raw: dict):
     path = get_config_path()
-    path.write_text(json.dumps(config, indent=2), encoding="utf-8")
+    path.write_text(json.dumps(raw, indent=2), encoding="utf-8")
+
+
+def validate_profile_name(name: str) -> str:
+    name = (name or "").strip()
+    if not _PROFILE_NAME.match(name):
+        raise ValueError(f"Invalid profile name '{name}': use letters, digits, spaces, '.', '_' or '-'")
+    return name
+
+
+def list_profiles() -> list:
+    raw = _load_raw()
+    if "profiles" in raw:
+        return list(raw["profiles"])
+    return [DEFAULT_PROFILE]
+
+
+def get_active_profile() -> str:
+    raw = _load_raw()
+    active = raw.get("active_profile")
+    if active and active in raw.get("profiles", {}):
+        return active
+    if raw.get("profiles"):
+        return next(iter(raw["profiles"]))
+    return DEFAULT_PROFILE
+
+
+def set_active_profile(name: str):
+    raw = _load_raw()
+    if name not in raw.get("profiles", {}):
+        raise KeyError(f"Unknown profile '{name}'")
+    raw["active_profile"] = name
+    _write_raw(raw)
+
+
+def use_shard_state(shard: tuple | None):
+    """Keep this process's state apart from other shards, e.g. ``(1, 4)``."""
+    global _shard_state
+    _shard_state = f"{shard[0]}-of-{shard[1]}" if shard else None
+
+
+def get_state_dir(profile: str | None = None) -> Path:
+    """Directory holding a profile's queue, manifests and week status.
+
+    The default profile keeps using the app data folder itself, so state
+    written before profiles existed is picked up unchanged.
+    """
+    name = profile or get_active_profile()
+    if name == DEFAULT_PROFILE:
+        state_dir = get_appdata_dir()
+    else:
+        state_dir = get_appdata_dir() / "profiles" / name
+    if _shard_state:
+        state_dir = state_dir / "shards" / _shard_state
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+def load_config(profile: str | None = None) -> dict:
+    """Return the settings of ``profile`` (default: the active profile).
+
+    ``config.json`` either holds a single flat profile (the original layout,
+    treated as "default") or ``{"active_profile": ..., "profiles": {name:
+    {...}}, <GLOBAL_KEYS>...}``. The returned dict merges the global keys
+    with the profile's own and carries the profile name under ``profile``.
+    Returns {} when nothing is configured.
+    """
+    raw = _load_raw()
+    name = profile or get_active_profile()
+    if "profiles" not in raw:
+        if not raw or name != DEFAULT_PROFILE:
+            return {}
+        return {**raw, "profile": DEFAULT_PROFILE}
+
+    if name not in raw["profiles"]:
+        return {}
+    shared = {k: v for k, v in raw.items() if k not in ("profiles", "active_profile")}
+    return {**shared, **raw["profiles"][name], "profile": name}
+
+
+def save_config(config: dict, profile: str | None = None):
+    """Save ``config`` as ``profile`` (default: ``config["profile"]`` or the active one).
+
+    A single default profile keeps the flat layout; saving any other profile
+    converts the file to the multi-profile layout.
+    """
+    raw = _load_raw()
+    name = profile or config.get("profile") or get_active_profile()
+    values = {k: v for k, v in config.items() if k != "profile"}
+
+    if "profiles" not in raw:
+        if name == DEFAULT_PROFILE:
+            _write_raw(values)
+            return
+        # move the existing flat settings into the default profile
+        flat = {k: v for k, v in raw.items() if k not in GLOBAL_KEYS}
+        raw = {k: v for k, v in raw.items() if k in GLOBAL_KEYS}
+        raw["profiles"] = {DEFAULT_PROFILE: flat} if flat else {}
+        if flat:
+            raw["active_profile"] = DEFAULT_PROFILE
+
+    own = {}
+    for key, value in values.items():
+        if key in GLOBAL_KEYS:
+            raw[key] = value
+        else:
+            own[key] = value
+    raw["profiles"][name] = own
+    raw.setdefault("active_profile", name)
+    _write_raw(raw)
@@ -9,15 +9,25 @@ from PySide6.QtWidgets import (
     QHBoxLayout
 )
 
-from app.config import save_config, load_config
+from app.config import DEFAULT_PROFILE, get_active_profile, save_config, load_config, validate_profile_name
+from app.object_cache import get_default_cache_root
+from app.ratelimit import parse_schedule, format_schedule, get_bandwidth_limiter
+from app.sync_filter import parse_patterns, parse_week_range, format_week_range
 from app.sync import test_connection
 from app import theme
 
 
+# Fields that must be filled in before the configuration can be saved
+_REQUIRED = ("endpoint", "access_key", "secret_key", "bucket", "local_path")
+
+
 class ConfigDialog(QDialog):
-    def __init__(self):
+    def __init__(self, profile: str | None = None):
         super().__init__()
 
+        # name the settings were saved under, read by the caller after exec()
+        self.profile = profile or get_active_profile()
+
         self.setWindowTitle("R2 Configuration")
         self.setMinimumWidth(450)
         self.setStyleSheet(theme.get_stylesheet())
@@ -25,6 +35,8 @@ class ConfigDialog(QDialog):
         layout = QVBoxLayout()
         form = QFormLayout()
 
+        self.profile_name = QLineEdit(self.profile)
+        self.profile_name.setToolTip("Save under a new name to add another bucket / local folder profile")
         self.endpoint = QLineEdit()
         self.access_key = QLineEdit()
         self.secret_key = QLineEdit()
@@ -39,20 +51,73 @@ class ConfigDialog(QDialog):
         path_layout.addWidget(self.local_path)
         path_layout.addWidget(browse_btn)
 
+        form.addRow("Profile:", self.profile_name)
         form.addRow("R2 Endpoint:", self.endpoint)
         form.addRow("Access Key:", self.access_key)
         form.addRow("Secret Key:", self.secret_key)
         form.addRow("Bucket:", self.bucket)
         form.addRow("Local Folder:", path_layout)
 
+        # Optional download bandwidth cap, in MB/s (empty or 0 = unlimited)
+        self.bandwidth_limit = QLineEdit()
+        self.bandwidth_limit.setPlaceholderText("unlimited")
+        self.bandwidth_limit.setToolTip("Download bandwidth limit in MB/s, shared by all transfers")
+        self.bandwidth_schedule = QLineEdit()
+        self.bandwidth_schedule.setPlaceholderText("e.g. 08:00-18:00=5, 22:00-06:00=0")
+        self.bandwidth_schedule.setToolTip(
+            "Time-of-day windows overriding the limit (MB/s, 0 = unlimited)"
+        )
+        form.addRow("Bandwidth (MB/s):", self.bandwidth_limit)
+        form.addRow("Limit Schedule:", self.bandwidth_schedule)
+
+        # Optional selective sync: prefix patterns and a week range
+        self.include_prefixes = QLineEdit()
+        self.include_prefixes.setPlaceholderText("all prefixes")
+        self.include_prefixes.setToolTip("Comma separated prefixes to sync, wildcards allowed (e.g. sensor_a, lab_*)")
+        self.exclude_prefixes = QLineEdit()
+        self.exclude_prefixes.setPlaceholderText("none")
+        self.exclude_prefixes.setToolTip("Comma separated prefixes to skip, wildcards allowed")
+        self.week_range = QLineEdit()
+        self.week_range.setPlaceholderText("all weeks, e.g. 2024-W10..2025-W05 or last 12")
+        self.week_range.setToolTip(
+            "Only list and download these weeks: a range (either end may be left open)\n"
+            "or \"last N\" for the N most recent weeks"
+        )
+        form.addRow("Include Prefixes:", self.include_prefixes)
+        form.addRow("Exclude Prefixes:", self.exclude_prefixes)
+        form.addRow("Week Range:", self.week_range)
+
+        # Optional object cache location (empty = inside the app data folder)
+        self.cache_root = QLineEdit()
+        self.cache_root.setPlaceholderText(str(get_default_cache_root()))
+        self.cache_root.setToolTip(
+            "Downloaded files are hardlinked here by ETag so a new or moved local folder\n"
+            "is filled from disk instead of downloading again. Files are never copied,\n"
+            "so the folder must be on the same drive as the local folder. When empty,\n"
+            "the app data folder is used if it is on that drive."
+        )
+        cache_browse_btn = QPushButton("Browse…")
+        cache_browse_btn.clicked.connect(self.browse_cache_folder)
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(self.cache_root)
+        cache_layout.addWidget(cache_browse_btn)
+        form.addRow("Cache Folder:", cache_layout)
+
         # Prefill with existing config so user can change only the destination folder
-        cfg = load_config()
+        cfg = load_config(self.profile)
         if cfg:
             self.endpoint.setText(cfg.get("endpoint", ""))
             self.access_key.setText(cfg.get("access_key", ""))
             self.secret_key.setText(cfg.get("secret_key", ""))
             self.bucket.setText(cfg.get("bucket", ""))
             self.local_path.setText(cfg.get("local_path", ""))
+            if cfg.get("bandwidth_limit"):
+                self.bandwidth_limit.setText(f"{cfg['bandwidth_limit']:g}")
+            self.bandwidth_schedule.setText(format_schedule(cfg.get("bandwidth_schedule", [])))
+            self.cache_root.setText(cfg.get("cache_root", ""))
+            self.include_prefixes.setText(", ".join(cfg.get("include_prefixes", [])))
+            self.exclude_prefixes.setText(", ".join(cfg.get("exclude_prefixes", [])))
+            self.week_range.setText(format_week_range(cfg))
 
         layout.addLayout(form)
 
@@ -68,20 +133,54 @@ class ConfigDialog(QDialog):
         if folder:
             self.local_path.setText(folder)
 
+    def browse_cache_folder(self):
+        folder = QFileDialog.getExistingDirectory(
+            self, "Select cache folder")
+        if folder:
+            self.cache_root.setText(folder)
+
     def save_and_test(self):
-        config = {
+        try:
+            name = validate_profile_name(self.profile_name.text() or DEFAULT_PROFILE)
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid profile name", str(e))
+            return
+
+        # keep settings that are not editable here (e.g. download_workers);
+        # a new profile starts from the one being edited
+        config = dict(load_config(name) or load_config(self.profile) or {})
+        config.update({
             "endpoint": self.endpoint.text().strip(),
             "access_key": self.access_key.text().strip(),
             "secret_key": self.secret_key.text().strip(),
             "bucket": self.bucket.text().strip(),
             "local_path": self.local_path.text().strip(),
-        }
+            "cache_root": self.cache_root.text().strip(),
+        })
 
-        if not all(config.values()):
+        if not all(config[k] for k in _REQUIRED):
             QMessageBox.warning(self, "Missing data",
                                 "Please fill all fields.")
             return
 
+        try:
+            limit = self.bandwidth_limit.text().strip()
+            config["bandwidth_limit"] = float(limit) if limit else 0.0
+            if config["bandwidth_limit"] < 0:
+                raise ValueError("Bandwidth limit cannot be negative")
+            config["bandwidth_schedule"] = parse_schedule(self.bandwidth_schedule.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid bandwidth settings", str(e))
+            return
+
+        try:
+            config.update(parse_week_range(self.week_range.text()))
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid week range", str(e))
+            return
+        config["include_prefixes"] = parse_patterns(self.include_prefixes.text())
+        config["exclude_prefixes"] = parse_patterns(self.exclude_prefixes.text())
+
         try:
             test_connection(config)
         except Exception as e:
@@ -92,7 +191,10 @@ class ConfigDialog(QDialog):
             )
             return
 
-        save_config(config)
+        save_config(config, name)
+        self.profile = name
+        # running transfers pick up the new limit immediately
+        get_bandwidth_limiter().configure(config)
         QMessageBox.information(
             self, "Success", "Configuration saved successfully.")
         self.accept()
\ No newline at end of file
@@ -0,0 +1,251 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from app.config import get_active_profile, get_state_dir
+from app.logger import logger
+
+
+# Item states persisted in download_queue.json. Finished items are removed;
+# cancelled ones are kept so later listings do not queue them again.
+QUEUED = "queued"
+ACTIVE = "active"
+CANCELLED = "cancelled"
+
+# Minimum seconds between automatic saves while workers are draining the queue
+_SAVE_INTERVAL = 2.0
+
+
+def get_download_queue_path(profile: str | None = None) -> Path:
+    return get_state_dir(profile) / "download_queue.json"
+
+
+def _priority(item: dict) -> tuple:
+    # heapq pops the smallest tuple: boosted (user selected) weeks first,
+    # most recently boosted first, then newest week first
+    return (-item.get("boost", 0), -item["year"], -item["week"], item["key"])
+
+
+class DownloadQueue:
+    """Persistent priority queue of bucket objects waiting to be downloaded.
+
+    Items are plain dicts keyed by object key (see ``app.sync`` listing
+    entries). The queue is saved to ``download_queue.json`` in the appdata
+    directory so pending downloads survive an application restart. Items that
+    were in flight when the app stopped are queued again on load.
+
+    Cancelled items stay cancelled, across restarts too, until they are
+    prioritised again.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self._path = path or get_download_queue_path()
+        self._lock = threading.Lock()
+        self._items: dict[str, dict] = {}
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._boost = 0
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    def _load(self):
+        if not self._path.exists():
+            return
+        try:
+            raw = json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as exc:
+            logger.warning("Failed to load download queue %s: %s", str(self._path), exc)
+            return
+
+        for item in raw.get("items", []):
+            if item.get("state") != CANCELLED:
+                item["state"] = QUEUED
+            self._items[item["key"]] = item
+            self._boost = max(self._boost, item.get("boost", 0))
+        self._rebuild_heap()
+        pending = sum(1 for i in self._items.values() if i["state"] == QUEUED)
+        if pending:
+            logger.info("Download queue restored: %d pending objects", pending)
+
+    def _rebuild_heap(self):
+        self._heap = [(_priority(i), next(self._seq), i["key"]) for i in self._items.values() if i["state"] == QUEUED]
+        heapq.heapify(self._heap)
+
+    def _push(self, item: dict):
+        heapq.heappush(self._heap, (_priority(item), next(self._seq), item["key"]))
+
+    def _save_locked(self, force: bool = False):
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_save < _SAVE_INTERVAL:
+            return
+        data = {"items": list(self._items.values())}
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, self._path)
+        self._dirty = False
+        self._last_save = now
+
+    def save(self):
+        """Write pending changes to disk immediately."""
+        with self._lock:
+            self._save_locked(force=True)
+
+    def add(self, objects) -> int:
+        """Queue listing entries that are not queued yet. Returns number added.
+
+        Cancelled entries are skipped; ``prioritize_keys`` /
+        ``prioritize_weeks`` queue them again.
+        """
+        added = 0
+        with self._lock:
+            for obj in objects:
+                if obj["key"] in self._items:
+                    continue
+                item = dict(obj)
+                item["state"] = QUEUED
+                item["boost"] = 0
+                self._items[item["key"]] = item
+                self._push(item)
+                added += 1
+            if added:
+                self._dirty = True
+                self._save_locked(force=True)
+        return added
+
+    def pop_next(self, only: set | None = None) -> dict | None:
+        """Return the highest priority queued item and mark it active.
+
+        With ``only``, return None as soon as the next item is not one of
+        these keys (callers boost them to the front first).
+        """
+        with self._lock:
+            while self._heap:
+                prio, _, key = self._heap[0]
+                item = self._items.get(key)
+                # skip stale heap entries left behind by re-prioritisation
+                if item is None or item["state"] != QUEUED or _priority(item) != prio:
+                    heapq.heappop(self._heap)
+                    continue
+                if only is not None and key not in only:
+                    return None
+                heapq.heappop(self._heap)
+                item["state"] = ACTIVE
+                self._dirty = True
+                return dict(item)
+            return None
+
+    def mark_done(self, key: str):
+        with self._lock:
+            if self._items.pop(key, None) is not None:
+                self._dirty = True
+                self._save_locked()
+
+    # Failed items are dropped from the queue; callers report them
+    mark_failed = mark_done
+
+    def requeue(self, key: str):
+        """Put an active item back so it is picked up again (e.g. after a cancel)."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item["state"] != ACTIVE:
+                return
+            item["state"] = QUEUED
+            self._push(item)
+            self._dirty = True
+
+    def prioritize_keys(self, keys) -> int:
+        """Move the given object keys to the front of the queue, queueing
+        cancelled ones again."""
+        count = 0
+        with self._lock:
+            self._boost += 1
+            for key in keys:
+                item = self._items.get(key)
+                if item is None:
+                    continue
+                item["boost"] = self._boost
+                if item["state"] == CANCELLED:
+                    item["state"] = QUEUED
+                if item["state"] == QUEUED:
+                    self._push(item)
+                count += 1
+            if count:
+                self._dirty = True
+                self._save_locked(force=True)
+        return count
+
+    def prioritize_weeks(self, weeks) -> int:
+        """Move all queued objects of the given (year, week) tuples to the front.
+
+        Cancelled objects of these weeks are queued again.
+        """
+        weeks = set(weeks)
+        count = 0
+        with self._lock:
+            self._boost += 1
+            for item in self._items.values():
+                if (item["year"], item["week"]) in weeks:
+                    item["boost"] = self._boost
+                    if item["state"] == CANCELLED:
+                        item["state"] = QUEUED
+                    if item["state"] == QUEUED:
+                        self._push(item)
+                    count += 1
+            if count:
+                self._dirty = True
+                self._save_locked(force=True)
+        if count:
+            logger.info("Prioritized %d queued objects for %d weeks", count, len(weeks))
+        return count
+
+    def cancel_week(self, week: tuple) -> int:
+        """Cancel all objects of one (year, week). In-flight transfers are aborted."""
+        count = 0
+        with self._lock:
+            for item in self._items.values():
+                if (item["year"], item["week"]) == tuple(week) and item["state"] != CANCELLED:
+                    item["state"] = CANCELLED
+                    count += 1
+            if count:
+                self._dirty = True
+                self._save_locked(force=True)
+        return count
+
+    def is_cancelled(self, key: str) -> bool:
+        item = self._items.get(key)
+        return item is None or item["state"] == CANCELLED
+
+    def cancelled(self) -> set:
+        """Keys of cancelled objects."""
+        with self._lock:
+            return {k for k, i in self._items.items() if i["state"] == CANCELLED}
+
+    def pending(self) -> list:
+        """Queued items in the order they will be downloaded."""
+        with self._lock:
+            items = [i for i in self._items.values() if i["state"] == QUEUED]
+        return sorted(items, key=_priority)
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for i in self._items.values() if i["state"] != CANCELLED)
+
+
+_queues: dict[str, DownloadQueue] = {}
+_queue_lock = threading.Lock()
+
+
+def get_download_queue(profile: str | None = None) -> DownloadQueue:
+    """Return the profile's download queue, shared by the UI and workers."""
+    name = profile or get_active_profile()
+    with _queue_lock:
+        if name not in _queues:
+            _queues[name] = DownloadQueue(get_download_queue_path(name))
+        return _queues[name]
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from app.config import get_active_profile, get_state_dir
+from app.logger import logger
+
+
+def get_failure_journal_path(profile: str | None = None) -> Path:
+    return get_state_dir(profile) / "failed_downloads.json"
+
+
+class FailureJournal:
+    """Persistent record of objects that still failed after all retries.
+
+    Entries keep the full listing dict so a later "retry failed" can fetch
+    exactly these keys without listing the bucket again.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self._path = path or get_failure_journal_path()
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._load()
+
+    def _load(self):
+        if not self._path.exists():
+            return
+        try:
+            raw = json.loads(self._path.read_text(encoding="utf-8"))
+            self._entries = {e["item"]["key"]: e for e in raw.get("failures", [])}
+        except Exception as exc:
+            logger.warning("Failed to load failure journal %s: %s", str(self._path), exc)
+
+    def _save_locked(self):
+        data = {"failures": list(self._entries.values())}
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, self._path)
+
+    def record(self, item: dict, error: str, attempts: int, permanent: bool):
+        item = {k: v for k, v in item.items() if k not in ("state", "boost")}
+        with self._lock:
+            previous = self._entries.get(item["key"], {})
+            self._entries[item["key"]] = {
+                "item": item,
+                "error": error,
+                "attempts": previous.get("attempts", 0) + attempts,
+                "permanent": permanent,
+                "last_failed": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._save_locked()
+
+    def resolve(self, key: str):
+        """Forget a key once it has been downloaded successfully."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save_locked()
+
+    def merge(self, entries: list) -> int:
+        """Take over entries recorded elsewhere (e.g. by shard processes)."""
+        with self._lock:
+            for entry in entries:
+                self._entries[entry["item"]["key"]] = entry
+            if entries:
+                self._save_locked()
+        return len(entries)
+
+    def resolve_present(self, dest_path: Path) -> int:
+        """Forget keys whose file is now in ``dest_path`` with the listed size."""
+        resolved = 0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                try:
+                    present = (dest_path / key).stat().st_size == entry["item"].get("size")
+                except OSError:
+                    present = False
+                if present:
+                    del self._entries[key]
+                    resolved += 1
+            if resolved:
+                self._save_locked()
+        return resolved
+
+    def items(self) -> list:
+        with self._lock:
+            return [e["item"] for e in self._entries.values()]
+
+    def entries(self) -> list:
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_journals: dict[str, FailureJournal] = {}
+_journal_lock = threading.Lock()
+
+
+def get_failure_journal(profile: str | None = None) -> FailureJournal:
+    name = profile or get_active_profile()
+    with _journal_lock:
+        if name not in _journals:
+            _journals[name] = FailureJournal(get_failure_journal_path(name))
+        return _journals[name]
+
+
+def merge_shard_journals(profile: str | None = None, dest_path: Path | None = None) -> int:
+    """Move failures recorded by shard processes into the profile's journal.
+
+    Shards keep their state apart (see ``use_shard_state``), but "retry
+    failed" and the GUI only read the profile's own journal. With
+    ``dest_path``, entries downloaded by a shard in the meantime are dropped.
+    Returns the number of merged entries.
+    """
+    journal = get_failure_journal(profile)
+    merged = 0
+    for path in sorted((get_state_dir(profile) / "shards").glob("*/failed_downloads.json")):
+        merged += journal.merge(FailureJournal(path).entries())
+        try:
+            path.unlink()
+        except OSError as exc:
+            logger.warning("Failed to remove shard failure journal %s: %s", str(path), exc)
+    if dest_path is not None:
+        journal.resolve_present(dest_path)
+    if merged:
+        logger.info("Merged %d failures from shard journals", merged)
+    return merged
@@ -0,0 +1,207 @@
+import hashlib
+import mmap
+import time
+from pathlib import Path
+
+from app.logger import logger
+from app.retry import TransientError
+
+
+_MB = 1024 * 1024
+# Slice size used when hashing memory-mapped files
+_HASH_SLICE = 8 * _MB
+
+
+class IntegrityError(TransientError):
+    """A transfer did not match the size / ETag reported by the bucket."""
+
+
+def _candidate_part_sizes(size: int, parts: int) -> list:
+    """Multipart chunk sizes the uploader may have used for ``parts`` parts.
+
+    Uploaders use whole MiB part sizes (8 MiB for the AWS CLI and boto3,
+    5 MiB for rclone); several of them can give the same part count, e.g. a
+    9 MiB object has 2 parts with both 5 and 8 MiB chunks.
+    """
+    if parts <= 1 or size <= 0:
+        return []
+    candidates = []
+    smallest = -(-size // parts)
+    for mib in (8, 5, 16, 10, 15, 32, 50, 64, 100, 128, -(-smallest // _MB)):
+        part_size = mib * _MB
+        if -(-size // part_size) == parts and part_size not in candidates:
+            candidates.append(part_size)
+    return candidates
+
+
+class _PartHasher:
+    """Multipart ETag of a stream for one assumed part size."""
+
+    def __init__(self, part_size: int):
+        self.part_size = part_size
+        self._parts = []
+        self._md5 = hashlib.md5()
+        self._filled = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.part_size - self._filled)
+            self._md5.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == self.part_size:
+                self._parts.append(self._md5.digest())
+                self._md5 = hashlib.md5()
+                self._filled = 0
+
+    def hexdigest(self) -> str:
+        parts = list(self._parts)
+        if self._filled:
+            parts.append(self._md5.digest())
+        return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+
+class EtagHasher:
+    """Compute an S3/R2 style ETag incrementally while bytes stream in.
+
+    Single-part ETags are the MD5 of the body. Multipart ETags ("<hex>-<n>")
+    are the MD5 of the concatenated part MD5s. Unless ``part_size`` is
+    known, every common part size that gives the ETag's part count is hashed
+    at the same time and a match on any of them counts. Only when no part
+    size fits the part count (or the ETag is not an MD5, e.g. SSE-C objects)
+    is the size checked alone and ``verifiable`` False.
+    """
+
+    def __init__(self, etag: str, size: int, part_size: int | None = None):
+        self.expected = (etag or "").strip('"').lower()
+        self.size = size
+        self.received = 0
+        self._md5 = hashlib.md5()
+        self._multipart = None
+
+        if "-" in self.expected:
+            digest, _, count = self.expected.partition("-")
+            sizes = []
+            if count.isdigit():
+                sizes = _candidate_part_sizes(size, int(count))
+                if part_size:
+                    sizes = [part_size] if -(-size // part_size) == int(count) else []
+            self._multipart = [_PartHasher(part_size) for part_size in sizes]
+            self.verifiable = bool(sizes) and len(digest) == 32
+        else:
+            self.verifiable = len(self.expected) == 32
+
+    def update(self, data):
+        self.received += len(data)
+        if self._multipart is None:
+            self._md5.update(data)
+            return
+        for hasher in self._multipart:
+            hasher.update(data)
+
+    def hexdigest(self) -> str:
+        if self._multipart is None:
+            return self._md5.hexdigest()
+        digests = [h.hexdigest() for h in self._multipart]
+        if self.expected in digests:
+            return self.expected
+        return digests[0] if digests else ""
+
+    @property
+    def part_sizes(self) -> list:
+        """Part sizes tried for a multipart ETag."""
+        return [h.part_size for h in self._multipart or []]
+
+    @property
+    def part_size(self) -> int | None:
+        """Part size that reproduced a multipart ETag, if any."""
+        for h in self._multipart or []:
+            if h.hexdigest() == self.expected:
+                return h.part_size
+        return None
+
+    def check(self) -> str | None:
+        """Return a description of the mismatch, or None if the data is intact."""
+        if self.received != self.size:
+            return f"size mismatch: got {self.received} bytes, expected {self.size}"
+        if not self.verifiable or self.hexdigest() == self.expected:
+            return None
+        if self._multipart is not None:
+            tried = ", ".join(f"{size / _MB:g}" for size in self.part_sizes)
+            return f"checksum mismatch: no part size ({tried} MiB) reproduces {self.expected}"
+        return f"checksum mismatch: got {self.hexdigest()}, expected {self.expected}"
+
+
+def hash_file(path: Path, etag: str, size: int, part_size: int | None = None) -> EtagHasher:
+    """Hash a local file through a read-only memory map."""
+    hasher = EtagHasher(etag, size, part_size)
+    with open(path, "rb") as fh:
+        if path.stat().st_size == 0:
+            return hasher
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), _HASH_SLICE):
+                    hasher.update(view[offset:offset + _HASH_SLICE])
+            finally:
+                view.release()
+    return hasher
+
+
+PARQUET_MAGIC = b"PAR1"
+# header magic + footer length (uint32 LE) + footer magic
+_PARQUET_MIN_SIZE = 12
+
+
+def check_parquet_footer(path: Path, expected_size: int | None = None) -> str | None:
+    """Cheap structural check of a parquet file through a memory map.
+
+    Only the first and last 8 bytes are touched: header and footer magic,
+    a footer length that fits in the file, and the file size against
+    ``expected_size`` when known. Returns a description of the problem, or
+    None if the file looks complete.
+    """
+    size = path.stat().st_size
+    if size == 0:
+        return "zero-length file"
+    if expected_size is not None and size != expected_size:
+        return f"size mismatch: {size} bytes on disk, expected {expected_size}"
+    if size < _PARQUET_MIN_SIZE:
+        return f"truncated: only {size} bytes"
+
+    with open(path, "rb") as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = mm[:4]
+            footer_len = int.from_bytes(mm[size - 8:size - 4], "little")
+            trailer = mm[size - 4:size]
+
+    if header != PARQUET_MAGIC:
+        return "missing parquet header magic"
+    if trailer != PARQUET_MAGIC:
+        return "missing parquet footer magic (truncated?)"
+    if footer_len == 0 or footer_len > size - _PARQUET_MIN_SIZE:
+        return f"invalid footer length {footer_len}"
+    return None
+
+
+def get_quarantine_dir(dest_path: Path) -> Path:
+    # dot-folder so the local week scan never treats it as a prefix
+    return dest_path / ".quarantine"
+
+
+def quarantine(path: Path, dest_path: Path, key: str, reason: str) -> Path | None:
+    """Move a corrupt file out of the mirror, keeping it for inspection."""
+    target = get_quarantine_dir(dest_path) / f"{key.replace('/', '__')}.{time.strftime('%Y%m%d-%H%M%S')}.bad"
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        path.replace(target)
+    except Exception as exc:
+        logger.warning("Failed to quarantine %s: %s", str(path), exc)
+        try:
+            path.unlink()
+        except Exception:
+            pass
+        return None
+    logger.warning("Quarantined %s (%s) as %s", key, reason, str(target))
+    return target
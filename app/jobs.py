@@ -0,0 +1,158 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+from PySide6.QtCore import QObject, Signal
+
+from app.logger import logger
+from app.sync import SyncCancelled
+
+
+class JobState(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    CANCELLING = "cancelling"
+    CANCELLED = "cancelled"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+_ACTIVE_STATES = {JobState.PENDING, JobState.RUNNING, JobState.CANCELLING}
+
+# Each lane has its own pool so a long download never occupies the worker
+# that status refreshes run on. Job keys are per profile, so the lanes are
+# wide enough for several profiles to sync side by side; their transfers
+# share the global worker and bandwidth budgets.
+DEFAULT_LANES = {
+    "refresh": 2,
+    "download": 4,
+    "default": 2,
+}
+
+
+class Job:
+    """A unit of background work tracked by ``JobManager``."""
+
+    def __init__(self, job_id: int, kind: str, key: str):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.state = JobState.PENDING
+        self.cancel_event = threading.Event()
+        self.result = None
+        self.error = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in _ACTIVE_STATES
+
+    def __repr__(self):
+        return f"<Job #{self.id} {self.kind} {self.state.value}>"
+
+
+class JobManager(QObject):
+    """Run sync operations on thread pools and report back through Qt signals.
+
+    Jobs are identified by a key (defaults to the job kind). Submitting a job
+    while another job with the same key is still active returns the existing
+    job instead of starting a second one, so e.g. a second refresh simply joins
+    the one already running.
+
+    The submitted callable receives ``cancel_event`` and ``progress`` keyword
+    arguments. It is expected to check the event periodically and raise
+    ``SyncCancelled`` when it is set.
+    """
+
+    # All signals carry the Job object; slots run in the thread owning the manager
+    job_state_changed = Signal(object)
+    job_progress = Signal(object, object)
+    job_finished = Signal(object)
+    job_failed = Signal(object, str)
+
+    def __init__(self, lanes: dict | None = None, parent=None):
+        super().__init__(parent)
+        lanes = lanes or DEFAULT_LANES
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"job-{name}")
+            for name, workers in lanes.items()
+        }
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+
+    def submit(self, kind: str, fn, *args, key: str | None = None, lane: str | None = None, **kwargs) -> Job:
+        key = key or kind
+        lane = lane if lane in self._executors else (kind if kind in self._executors else "default")
+
+        with self._lock:
+            existing = self._jobs.get(key)
+            if existing is not None and existing.active and not existing.cancel_event.is_set():
+                logger.info("Job %s already running (#%d), joining it", key, existing.id)
+                return existing
+
+            job = Job(next(self._ids), kind, key)
+            self._jobs[key] = job
+
+        self.job_state_changed.emit(job)
+        self._executors[lane].submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, key: str) -> Job | None:
+        job = self._jobs.get(key)
+        if job is not None and job.active:
+            return job
+        return None
+
+    def is_active(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def cancel(self, key: str) -> bool:
+        job = self.get(key)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        if job.state == JobState.RUNNING:
+            self._set_state(job, JobState.CANCELLING)
+        logger.info("Cancellation requested for job %s (#%d)", key, job.id)
+        return True
+
+    def cancel_all(self):
+        for key in list(self._jobs):
+            self.cancel(key)
+
+    def shutdown(self):
+        self.cancel_all()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _set_state(self, job: Job, state: JobState):
+        job.state = state
+        self.job_state_changed.emit(job)
+
+    def _run(self, job: Job, fn, args, kwargs):
+        if job.cancel_event.is_set():
+            self._set_state(job, JobState.CANCELLED)
+            return
+
+        self._set_state(job, JobState.RUNNING)
+        try:
+            job.result = fn(
+                *args,
+                cancel_event=job.cancel_event,
+                progress=lambda payload: self.job_progress.emit(job, payload),
+                **kwargs,
+            )
+        except SyncCancelled:
+            logger.info("Job %s (#%d) cancelled", job.key, job.id)
+            self._set_state(job, JobState.CANCELLED)
+            return
+        except Exception as exc:
+            logger.exception("Job %s (#%d) failed", job.key, job.id)
+            job.error = exc
+            self._set_state(job, JobState.FAILED)
+            self.job_failed.emit(job, str(exc))
+            return
+
+        self._set_state(job, JobState.SUCCEEDED)
+        self.job_finished.emit(job)
@@ -1,37 +1,177 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import threading
+from datetime import datetime
 from logging import Logger
-from logging.handlers import RotatingFileHandler
-from app.config import get_appdata_dir
+from logging.handlers import QueueHandler, RotatingFileHandler
+from app.config import get_appdata_dir, load_config
 
 
 _LOGGER_NAME = "sa_r2"
 
+# Records written per flush at most; the writer flushes whenever the queue runs dry
+_BATCH_SIZE = 500
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_writer = None
+
 
 def get_log_path():
     return get_appdata_dir() / "app.log"
 
 
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: time, level, thread, message, structured
+    fields passed with ``extra=`` (e.g. key, bytes, duration_ms, throughput)
+    and the traceback, if any.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _BatchFlush:
+    """Mixin for stream handlers: ``emit`` no longer flushes every record,
+    the log writer flushes once per batch instead.
+    """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.StreamHandler.flush(self)
+
+
+class _BatchFileHandler(_BatchFlush, RotatingFileHandler):
+    pass
+
+
+class _BatchStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+
+class _RecordQueueHandler(QueueHandler):
+    """Queue handler that keeps the traceback separate from the message, so
+    the writer's formatters decide how to render it.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _LogWriter:
+    """Background thread that writes queued records and flushes per batch,
+    so worker threads never wait for the disk or the console.
+    """
+
+    _STOP = object()
+
+    def __init__(self, handlers: list):
+        self.queue = queue.SimpleQueue()
+        self.handlers = handlers
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _write(self, record: logging.LogRecord):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._STOP:
+                    stop = True
+                else:
+                    self._write(record)
+            for handler in self.handlers:
+                try:
+                    handler.flush_batch()
+                except Exception:
+                    pass
+            if stop:
+                return
+
+    def stop(self):
+        """Write out everything queued so far (called at exit)."""
+        if self._thread.is_alive():
+            self.queue.put(self._STOP)
+            self._thread.join(timeout=5)
+
+
+def _log_format() -> str:
+    try:
+        return str(load_config().get("log_format", "text")).lower()
+    except Exception:
+        return "text"
+
+
 def configure_logger() -> Logger:
+    global _writer
     logger = logging.getLogger(_LOGGER_NAME)
     if logger.handlers:
         return logger
 
     logger.setLevel(logging.INFO)
 
-    log_path = get_log_path()
-    handler = RotatingFileHandler(str(log_path), maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
     fmt = logging.Formatter("%(asctime)s %(levelname)-7s %(message)s", "%Y-%m-%d %H:%M:%S")
-    handler.setFormatter(fmt)
-    logger.addHandler(handler)
+
+    log_path = get_log_path()
+    handler = _BatchFileHandler(str(log_path), maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+    # "log_format": "json" writes app.log as JSON lines for analysis
+    handler.setFormatter(JsonLinesFormatter() if _log_format() == "json" else fmt)
 
     # also add a lightweight console handler for development
-    ch = logging.StreamHandler()
+    ch = _BatchStreamHandler()
     ch.setFormatter(fmt)
-    logger.addHandler(ch)
+
+    # records are formatted and written on a background thread
+    _writer = _LogWriter([handler, ch])
+    logger.addHandler(_RecordQueueHandler(_writer.queue))
 
     return logger
 
 
+def set_console_level(level: int):
+    """Change what reaches the console; app.log keeps everything."""
+    for handler in _writer.handlers if _writer else ():
+        if isinstance(handler, _BatchStreamHandler):
+            handler.setLevel(level)
+
+
 def get_logger() -> Logger:
     return configure_logger()
 
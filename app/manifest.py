@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from app.config import get_active_profile, get_state_dir
+from app.logger import logger
+
+
+# Minimum seconds between automatic saves while downloads are running
+_SAVE_INTERVAL = 5.0
+
+
+def get_manifest_path(profile: str | None = None) -> Path:
+    return get_state_dir(profile) / "local_manifest.json"
+
+
+class LocalManifest:
+    """What we know about each file in the local mirror, keyed by bucket key.
+
+    Entries hold the ``size``, ``etag`` and ``last_modified`` the object had
+    in the bucket when it was downloaded and verified, so the mirror can be
+    checked, and compared with a fresh listing, without asking the bucket
+    about each file.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self._path = path or get_manifest_path()
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    def _load(self):
+        if not self._path.exists():
+            return
+        try:
+            self._entries = json.loads(self._path.read_text(encoding="utf-8")).get("objects", {})
+        except Exception as exc:
+            logger.warning("Failed to load local manifest %s: %s", str(self._path), exc)
+
+    def _save_locked(self, force: bool = False):
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_save < _SAVE_INTERVAL:
+            return
+        tmp = self._path.with_name(self._path.name + ".tmp")
+        tmp.write_text(json.dumps({"objects": self._entries}), encoding="utf-8")
+        os.replace(tmp, self._path)
+        self._dirty = False
+        self._last_save = now
+
+    def save(self):
+        with self._lock:
+            self._save_locked(force=True)
+
+    def record(self, key: str, size: int, etag: str, last_modified: str | None = None, part_size: int | None = None):
+        entry = {"size": size, "etag": etag, "last_modified": last_modified}
+        if part_size:
+            # multipart chunk size the ETag was reproduced with, for "verify"
+            entry["part_size"] = part_size
+        with self._lock:
+            self._entries[key] = entry
+            self._dirty = True
+            self._save_locked()
+
+    def remove(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._dirty = True
+                self._save_locked()
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+    def items(self) -> list:
+        with self._lock:
+            return list(self._entries.items())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_manifests: dict[str, LocalManifest] = {}
+_manifest_lock = threading.Lock()
+
+
+def get_local_manifest(profile: str | None = None) -> LocalManifest:
+    name = profile or get_active_profile()
+    with _manifest_lock:
+        if name not in _manifests:
+            _manifests[name] = LocalManifest(get_manifest_path(name))
+        return _manifests[name]
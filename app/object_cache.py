@@ -0,0 +1,197 @@
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from app.config import get_appdata_dir
+from app.logger import logger
+
+
+# Linux FICLONE ioctl (btrfs, XFS with reflink=1, ...)
+_FICLONE = 0x40049409
+
+# Bytes held only by the cache (not shared with a mirror file) before the
+# oldest entries are evicted; overridable with cache_max_gb
+DEFAULT_MAX_GB = 20
+
+
+def get_default_cache_root() -> Path:
+    return get_appdata_dir() / "cache"
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+        return True
+    except OSError:
+        try:
+            dst.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def _clone(src: Path, dst: Path, copy: bool = True) -> str | None:
+    """Make ``dst`` a copy of ``src`` as cheaply as the filesystem allows.
+
+    Tries a hardlink, then a reflink, then (with ``copy``) a plain copy;
+    returns the method used, or None when no cheap method worked.
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    if _reflink(src, dst):
+        return "reflink"
+    if not copy:
+        return None
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+def _device(path: Path) -> int | None:
+    """``st_dev`` of ``path`` or of its nearest existing parent."""
+    for candidate in (path, *path.parents):
+        try:
+            return candidate.stat().st_dev
+        except OSError:
+            continue
+    return None
+
+
+class ObjectCache:
+    """Content-addressed store of downloaded objects, keyed by ETag.
+
+    Files are kept as ``<root>/<etag[:2]>/<etag>``. Destination folders are
+    populated from the cache instead of downloading again, e.g. after
+    ``local_path`` was changed. Files are only added as hardlinks or
+    reflinks, never copied, so the cache must be on the mirror's volume.
+    Entries no longer shared with a mirror file are evicted oldest first
+    once they exceed ``max_bytes`` (see ``trim``).
+    """
+
+    def __init__(self, root: Path, max_bytes: int | None = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def path_for(self, etag: str) -> Path:
+        etag = etag.strip('"')
+        return self.root / etag[:2] / etag
+
+    def has(self, etag: str, size: int) -> bool:
+        if not etag:
+            return False
+        try:
+            return self.path_for(etag).stat().st_size == size
+        except OSError:
+            return False
+
+    def add(self, src: Path, etag: str) -> str | None:
+        """Link ``src`` into the cache under its ETag. Returns the method
+        used, or None (also when the cache is on another volume)."""
+        if not etag:
+            return None
+        target = self.path_for(etag)
+        if target.exists():
+            return None
+        tmp = target.with_name(target.name + ".tmp")
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            method = _clone(src, tmp, copy=False)
+            if method is None:
+                return None
+            os.replace(tmp, target)
+            return method
+        except OSError as exc:
+            logger.warning("Failed to add %s to object cache: %s", str(src), exc)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return None
+
+    def discard(self, etag: str):
+        """Drop a cache entry, e.g. when its (possibly hardlinked) mirror copy is corrupt."""
+        try:
+            self.path_for(etag).unlink()
+        except OSError:
+            pass
+
+    def trim(self) -> int:
+        """Evict the oldest entries held only by the cache (link count 1)
+        until they fit in ``max_bytes``. Returns the number of bytes freed.
+        """
+        if self.max_bytes is None or not self.root.is_dir():
+            return 0
+        own = []
+        for path in self.root.glob("*/*"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if st.st_nlink == 1 and not path.name.endswith(".tmp"):
+                own.append((st.st_mtime, st.st_size, path))
+        excess = sum(size for _, size, _ in own) - self.max_bytes
+        freed = 0
+        for _, size, path in sorted(own, key=lambda e: e[0]):
+            if freed >= excess:
+                break
+            try:
+                path.unlink()
+                freed += size
+            except OSError:
+                pass
+        if freed:
+            logger.info("Object cache trimmed by %d bytes", freed)
+        return freed
+
+    def links_to(self, path: Path) -> bool:
+        """True if entries can be hardlinked into ``path``, i.e. it is on the cache's volume."""
+        device = _device(self.root)
+        return device is not None and device == _device(path)
+
+    def materialize(self, etag: str, size: int, dest: Path) -> str | None:
+        """Populate ``dest`` from the cache. Returns the method used, or None on a miss."""
+        if not self.has(etag, size):
+            return None
+        tmp = dest.with_name(dest.name + ".part")
+        try:
+            if tmp.exists():
+                tmp.unlink()
+            method = _clone(self.path_for(etag), tmp)
+            os.replace(tmp, dest)
+            return method
+        except OSError as exc:
+            logger.warning("Failed to restore %s from object cache: %s", str(dest), exc)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return None
+
+
+def get_object_cache(config: dict) -> ObjectCache | None:
+    """Return the cache configured by ``object_cache`` / ``cache_root``, or None if disabled.
+
+    Unless ``object_cache`` is set explicitly, the cache is used only when a
+    ``cache_root`` is configured or the default root is on the same volume
+    as ``local_path`` (otherwise nothing could be hardlinked into it).
+    """
+    root = Path(config.get("cache_root") or get_default_cache_root())
+    enabled = config.get("object_cache")
+    if enabled is None:
+        enabled = bool(config.get("cache_root")) or (
+            bool(config.get("local_path")) and _device(root) == _device(Path(config["local_path"]))
+        )
+    if not enabled:
+        return None
+    max_gb = config.get("cache_max_gb", DEFAULT_MAX_GB)
+    return ObjectCache(root, int(float(max_gb) * 1024 ** 3) if max_gb else None)
@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+from datetime import datetime
+
+from app.logger import logger
+
+
+_MB = 1024 * 1024
+# Re-evaluate the schedule at most this often (seconds)
+_SCHEDULE_CHECK_INTERVAL = 1.0
+# Longest single sleep, so rate changes and cancellation are noticed quickly
+_MAX_SLEEP = 0.25
+
+_WINDOW = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(\d+(?:\.\d+)?)\s*$")
+
+
+def parse_schedule(text: str) -> list:
+    """Parse "HH:MM-HH:MM=MBps" windows separated by commas or semicolons.
+
+    A limit of 0 means unlimited. Windows may wrap around midnight
+    (e.g. "22:00-06:00=0"). Raises ValueError on malformed input.
+    """
+    windows = []
+    for part in re.split(r"[;,]", text or ""):
+        if not part.strip():
+            continue
+        m = _WINDOW.match(part)
+        if not m:
+            raise ValueError(f"Invalid schedule window '{part.strip()}', expected HH:MM-HH:MM=MB/s")
+        h1, m1, h2, m2 = (int(g) for g in m.groups()[:4])
+        if h1 > 23 or h2 > 24 or m1 > 59 or m2 > 59:
+            raise ValueError(f"Invalid time in schedule window '{part.strip()}'")
+        windows.append({"start": f"{h1:02d}:{m1:02d}", "end": f"{h2:02d}:{m2:02d}", "limit": float(m.group(5))})
+    return windows
+
+
+def format_schedule(windows: list) -> str:
+    return ", ".join(f"{w['start']}-{w['end']}={w['limit']:g}" for w in windows or [])
+
+
+def _minutes(hhmm: str) -> int:
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+def limit_for(windows: list, default: float, now: datetime | None = None) -> float:
+    """Return the MB/s limit in effect at ``now``: the first matching window, else ``default``."""
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for w in windows or []:
+        start, end = _minutes(w["start"]), _minutes(w["end"])
+        if start <= end:
+            inside = start <= minute < end
+        else:
+            inside = minute >= start or minute < end
+        if inside:
+            return float(w["limit"])
+    return float(default or 0)
+
+
+class TokenBucket:
+    """Token bucket shared by all transfers; ``rate`` is bytes per second, 0 = unlimited.
+
+    Callers take tokens for data they have already received and sleep while
+    the bucket is in debt, so a large chunk is allowed through but the
+    following ones wait. The rate can be changed at any time; sleeping
+    callers pick up the new rate within a fraction of a second.
+    """
+
+    def __init__(self, rate: float = 0, burst: float | None = None):
+        self._lock = threading.Lock()
+        self._rate = float(rate)
+        self._burst = burst
+        self._tokens = self._capacity()
+        self._stamp = time.monotonic()
+
+    def _capacity(self) -> float:
+        if self._burst is not None:
+            return float(self._burst)
+        # about a quarter second of traffic keeps bursts short
+        return max(self._rate / 4, 64 * 1024)
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill_locked(time.monotonic())
+            self._rate = float(rate)
+            self._tokens = min(self._tokens, self._capacity())
+
+    def _refill_locked(self, now: float):
+        if self._rate > 0:
+            self._tokens = min(self._capacity(), self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+    def consume(self, n: int, cancel_event=None):
+        with self._lock:
+            if self._rate <= 0:
+                return
+            self._refill_locked(time.monotonic())
+            self._tokens -= n
+
+        while True:
+            with self._lock:
+                if self._rate <= 0:
+                    # limit lifted while we were waiting
+                    self._tokens = self._capacity()
+                    return
+                self._refill_locked(time.monotonic())
+                if self._tokens >= 0:
+                    return
+                wait = -self._tokens / self._rate
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            time.sleep(min(wait, _MAX_SLEEP))
+
+
+class BandwidthLimiter:
+    """Global download bandwidth limit with optional time-of-day windows.
+
+    Configured from ``bandwidth_limit`` (MB/s, 0 = unlimited) and
+    ``bandwidth_schedule`` (list of {"start", "end", "limit"}) in the config.
+    """
+
+    def __init__(self):
+        self._bucket = TokenBucket()
+        self._default = 0.0
+        self._windows = []
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def configure(self, config: dict):
+        with self._lock:
+            self._default = float(config.get("bandwidth_limit") or 0)
+            self._windows = list(config.get("bandwidth_schedule") or [])
+            self._last_check = 0.0
+        self._apply_schedule()
+
+    def _apply_schedule(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_check < _SCHEDULE_CHECK_INTERVAL:
+                return
+            self._last_check = now
+            rate = limit_for(self._windows, self._default) * _MB
+
+        if rate != self._bucket.rate:
+            logger.info(
+                "Bandwidth limit now %s",
+                f"{rate / _MB:g} MB/s" if rate > 0 else "unlimited",
+            )
+            self._bucket.set_rate(rate)
+
+    def consume(self, n: int, cancel_event=None):
+        self._apply_schedule()
+        self._bucket.consume(n, cancel_event)
+
+
+_limiter = BandwidthLimiter()
+
+
+def get_bandwidth_limiter() -> BandwidthLimiter:
+    """Return the process-wide limiter shared by every transfer."""
+    return _limiter
@@ -0,0 +1,80 @@
+import random
+
+from app.concurrency import is_throttle_error
+
+
+# Retry defaults; overridable with retry_attempts / retry_base_delay / retry_max_delay
+DEFAULT_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# Server side error codes that are worth another try
+_TRANSIENT_CODES = {
+    "InternalError",
+    "ServiceUnavailable",
+    "SlowDown",
+    "RequestTimeout",
+}
+
+# Network level failures from botocore / urllib3 / the standard library,
+# matched by class name so no particular botocore version is required
+_TRANSIENT_EXCEPTIONS = {
+    "EndpointConnectionError",
+    "ConnectionClosedError",
+    "ConnectTimeoutError",
+    "ReadTimeoutError",
+    "IncompleteReadError",
+    "ResponseStreamingError",
+    "ProtocolError",
+    "ConnectionError",
+    "ConnectionResetError",
+    "ConnectionAbortedError",
+    "BrokenPipeError",
+    "TimeoutError",
+    "IncompleteRead",
+}
+
+
+class TransientError(Exception):
+    """Raised by sync code for failures that should be retried (e.g. a checksum mismatch)."""
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Tell retryable failures (throttling, 5xx, dropped connections) from
+    permanent ones (missing object, access denied, local disk errors).
+    """
+    if isinstance(exc, TransientError) or is_throttle_error(exc):
+        return True
+
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in _TRANSIENT_CODES or status >= 500
+
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & _TRANSIENT_EXCEPTIONS:
+        return True
+    return False
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BASE_DELAY, cap: float = DEFAULT_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RetryPolicy:
+    """Retry settings taken from the config dict."""
+
+    def __init__(self, config: dict | None = None):
+        config = config or {}
+        self.attempts = max(1, int(config.get("retry_attempts", DEFAULT_ATTEMPTS)))
+        self.base_delay = float(config.get("retry_base_delay", DEFAULT_BASE_DELAY))
+        self.max_delay = float(config.get("retry_max_delay", DEFAULT_MAX_DELAY))
+
+    def should_retry(self, exc: BaseException, attempt: int) -> bool:
+        """``attempt`` is the 1-based number of the attempt that just failed."""
+        return attempt < self.attempts and is_transient_error(exc)
+
+    def delay(self, attempt: int) -> float:
+        return backoff_delay(attempt - 1, self.base_delay, self.max_delay)
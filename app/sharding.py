@@ -0,0 +1,189 @@
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from hashlib import sha1
+from pathlib import Path
+
+from app.logger import logger
+
+
+# Seconds a lease stays valid without renewal; overridable with lease_ttl
+DEFAULT_LEASE_TTL = 300.0
+
+SHARD_BY = ("key", "prefix")
+
+
+def parse_shard(text: str) -> tuple:
+    """Parse "K/N" (1-based: "1/4" .. "4/4") into a (k, n) tuple."""
+    try:
+        k, n = (int(p) for p in (text or "").split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{text}', expected K/N such as 1/4") from None
+    if n < 1 or not 1 <= k <= n:
+        raise ValueError(f"Invalid shard '{text}': K must be between 1 and N")
+    return k, n
+
+
+def format_shard(shard: tuple) -> str:
+    return f"{shard[0]}/{shard[1]}"
+
+
+def shard_of(value: str, n: int) -> int:
+    """Deterministic 1-based shard for a prefix, identical on every host."""
+    return zlib.crc32(value.encode("utf-8")) % n + 1
+
+
+def week_slice(first: tuple, last: tuple, k: int, n: int) -> tuple:
+    """Contiguous part ``k`` of ``n`` of the weeks ``first`` .. ``last``.
+
+    Returns ``(lo, hi)`` as (year, week) tuples, ``lo`` inclusive and ``hi``
+    exclusive; the first part has no lower and the last no upper bound, so
+    weeks outside the span (e.g. published after ``last``) still belong to
+    exactly one shard.
+    """
+    start = date.fromisocalendar(*first, 1)
+    total = max(1, (date.fromisocalendar(*last, 1) - start).days // 7 + 1)
+
+    def _bound(i):
+        return (start + timedelta(weeks=total * i // n)).isocalendar()[:2]
+
+    return (_bound(k - 1) if k > 1 else None), (_bound(k) if k < n else None)
+
+
+def get_lease_dir(dest_path: Path) -> Path:
+    # dot-folder so the local week scan never treats it as a prefix
+    return dest_path / ".leases"
+
+
+class LeaseManager:
+    """Per-object lease files that keep sharded workers from downloading the
+    same key twice into a shared ``local_path``.
+
+    A lease is created with O_CREAT | O_EXCL, which is atomic on local disks
+    and SMB/NFS shares alike, and names its owner. It expires ``ttl`` seconds
+    after its last renewal (the file's mtime); leases of crashed workers are
+    taken over by renaming them away first; a worker that finds it moved a
+    lease other than the stale one it inspected puts it back (or leaves it
+    alone if that is no longer possible) and backs off. Running transfers
+    renew their lease every ``ttl / 3`` seconds, as long as it still names
+    them as owner.
+    """
+
+    def __init__(self, dest_path: Path, ttl: float = DEFAULT_LEASE_TTL, owner: str | None = None):
+        self.dir = get_lease_dir(dest_path)
+        self.ttl = float(ttl)
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self._held: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{sha1(key.encode('utf-8')).hexdigest()}.lease"
+
+    def _create(self, path: Path, key: str) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump({"key": key, "owner": self.owner, "created": time.time()}, fh)
+        return True
+
+    def _read(self, path: Path):
+        """(owner, created, mtime) of a lease file, or None if it is gone."""
+        try:
+            mtime = path.stat().st_mtime
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # half-written or unreadable lease: judge it by its mtime alone
+            data = {}
+        return data.get("owner"), data.get("created"), mtime
+
+    def acquire(self, key: str) -> bool:
+        """Take the lease for ``key``. Returns False if another worker holds it."""
+        path = self._path(key)
+        if not self._create(path, key):
+            seen = self._read(path)
+            if seen is None:
+                # released in the meantime
+                return self._create(path, key) and self._hold(key)
+            if time.time() - seen[2] <= self.ttl:
+                return False
+            # rename is atomic: of several workers seeing the same stale lease
+            # only one moves it away, the others fail and back off
+            stale = path.with_name(f"{path.name}.stale.{os.getpid()}.{threading.get_ident()}")
+            try:
+                os.rename(path, stale)
+            except OSError:
+                return False
+            # another worker may have taken the lease over between our check
+            # and the rename; then we just moved its fresh lease and put it back
+            moved = self._read(stale)
+            if moved is not None and moved != seen:
+                try:
+                    # link fails rather than replace a lease created meanwhile
+                    os.link(stale, path)
+                except OSError as exc:
+                    # leave the moved lease alone; its owner notices on renewal
+                    logger.warning("Cannot restore lease for %s taken over by %s: %s", key, moved[0], exc)
+                else:
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        pass
+                return False
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+            logger.info("Took over expired lease for %s", key)
+            if not self._create(path, key):
+                return False
+        return self._hold(key)
+
+    def _hold(self, key: str) -> bool:
+        with self._lock:
+            self._held[key] = time.monotonic()
+        return True
+
+    def keepalive(self, key: str):
+        """Renew the lease of a running transfer when a third of the TTL has passed.
+
+        A lease that now names another owner is not renewed, and not
+        released later either.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._held.get(key)
+            if last is None or now - last < self.ttl / 3:
+                return
+            self._held[key] = now
+        path = self._path(key)
+        current = self._read(path)
+        if current is None or current[0] != self.owner:
+            logger.warning("Lost the lease for %s to %s", key, current[0] if current else "nobody")
+            with self._lock:
+                self._held.pop(key, None)
+            return
+        try:
+            os.utime(path)
+        except OSError as exc:
+            logger.warning("Failed to renew lease for %s: %s", key, exc)
+
+    def release(self, key: str):
+        with self._lock:
+            if self._held.pop(key, None) is None:
+                return
+        path = self._path(key)
+        try:
+            # never remove a lease another worker took over after ours expired
+            if json.loads(path.read_text(encoding="utf-8")).get("owner") == self.owner:
+                path.unlink()
+        except (OSError, ValueError):
+            pass
@@ -1,40 +1,135 @@
+import os
 import re
 import json
+import ctypes
+import errno
+import shutil
+import sys
+import threading
+import time
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import date, timedelta
 import boto3
+from botocore.config import Config as BotoConfig
 
-from app.config import load_config, get_appdata_dir
+from app.bucket_manifest import fetch_bucket_manifest
+from app.concurrency import AdaptiveLimit, get_shared_budget, is_throttle_error
+from app.config import DEFAULT_PROFILE, get_state_dir, load_config
+from app.download_queue import get_download_queue
+from app.failure_journal import get_failure_journal, merge_shard_journals
+from app.integrity import EtagHasher, IntegrityError, check_parquet_footer, hash_file, quarantine
 from app.logger import logger
+from app.manifest import get_local_manifest
+from app.object_cache import get_object_cache
+from app.ratelimit import get_bandwidth_limiter
+from app.retry import RetryPolicy, is_transient_error
+from app.sharding import DEFAULT_LEASE_TTL, LeaseManager
+from app.sync_filter import SyncFilter
+from app.telemetry import TransferStats, expected_throughput, record_throughput
+from app import tracing
+from app.utils import human_size
 
 
-def test_connection(config: dict):
-    s3 = boto3.client(
+_CHUNK_SIZE = 256 * 1024
+
+# Worker bounds for the adaptive download / listing pools (see app.concurrency);
+# overridable with download_workers[_min|_max] and listing_workers[_min|_max]
+_DEFAULT_DOWNLOAD_WORKERS = 4
+_DEFAULT_DOWNLOAD_WORKERS_MIN = 1
+_DEFAULT_DOWNLOAD_WORKERS_MAX = 16
+_DEFAULT_LISTING_WORKERS = 4
+_DEFAULT_LISTING_WORKERS_MIN = 1
+_DEFAULT_LISTING_WORKERS_MAX = 16
+# Key ranges a large prefix is listed in concurrently (1 lists it serially)
+_DEFAULT_LISTING_PARTITIONS = 16
+# Keys per ListObjectsV2 page, for request estimates
+_LIST_PAGE_SIZE = 1000
+# Space left free on the destination volume; overridable with min_free_space_mb
+_DEFAULT_MIN_FREE_MB = 512
+# Longest wait before an object leased by another shard worker is tried again
+_LEASE_RETRY_SECONDS = 10.0
+
+
+class SyncCancelled(Exception):
+    """Raised inside a sync operation when its cancel event has been set."""
+
+
+class DiskSpaceError(OSError):
+    """The destination volume has no room for the planned downloads."""
+
+
+class _ItemCancelled(Exception):
+    """Raised by a transfer whose queue item was cancelled individually."""
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise SyncCancelled()
+
+
+def _adaptive_limit(config: dict, name: str) -> AdaptiveLimit:
+    defaults = {
+        "download": (_DEFAULT_DOWNLOAD_WORKERS, _DEFAULT_DOWNLOAD_WORKERS_MIN, _DEFAULT_DOWNLOAD_WORKERS_MAX),
+        "listing": (_DEFAULT_LISTING_WORKERS, _DEFAULT_LISTING_WORKERS_MIN, _DEFAULT_LISTING_WORKERS_MAX),
+    }[name]
+    # profiles syncing concurrently share one budget per kind of request
+    budget = get_shared_budget(name, int(config.get(f"global_{name}_workers", defaults[2])))
+    return AdaptiveLimit(
+        f"{name}, {config.get('profile', DEFAULT_PROFILE)}",
+        minimum=int(config.get(f"{name}_workers_min", defaults[1])),
+        maximum=int(config.get(f"{name}_workers_max", defaults[2])),
+        initial=int(config.get(f"{name}_workers", defaults[0])),
+        unit="B" if name == "download" else "keys",
+        budget=budget,
+    )
+
+
+def get_s3_client(config: dict):
+    # the connection pool must be large enough for the biggest worker pool
+    pool_size = max(
+        int(config.get("download_workers_max", _DEFAULT_DOWNLOAD_WORKERS_MAX)),
+        int(config.get("listing_workers_max", _DEFAULT_LISTING_WORKERS_MAX)),
+    )
+    return boto3.client(
         "s3",
         endpoint_url=config["endpoint"],
         aws_access_key_id=config["access_key"],
         aws_secret_access_key=config["secret_key"],
+        # one request per call: RetryPolicy retries and AdaptiveLimit has to
+        # see every throttle / failure as it happens
+        config=BotoConfig(max_pool_connections=pool_size + 2, retries={"total_max_attempts": 1}),
     )
 
+
+def test_connection(config: dict):
+    s3 = get_s3_client(config)
     s3.list_objects_v2(Bucket=config["bucket"], MaxKeys=1)
 
 
 _PATTERN = re.compile(r"(?P<year>\d{4})W(?P<week>\d{2})_.*\.parquet$")
 
 
-def get_local_complete_weeks() -> set:
+@tracing.traced("local_scan")
+def get_local_complete_weeks(profile: str | None = None) -> set:
     """Scan local destination folder configured in app and return set of (year, week)
     that exist in ALL subfolders (same logic as helper.ipynb).
     """
-    config = load_config()
-    if config is None:
+    config = load_config(profile)
+    if not config:
         return set()
 
     dest_path = Path(config["local_path"])
+    flt = SyncFilter.from_config(config)
     weeks_per_folder = defaultdict(set)
 
     for folder in dest_path.iterdir():
-        if not folder.is_dir():
+        # skip non-folders and our own dot-folders (e.g. .quarantine)
+        if not folder.is_dir() or folder.name.startswith("."):
+            continue
+        # prefixes excluded by the sync filter do not count towards complete weeks
+        if not flt.prefix_allowed(folder.name):
             continue
 
         for f in folder.iterdir():
@@ -55,61 +150,571 @@ def get_local_complete_weeks() -> set:
     return set.intersection(*weeks_per_folder.values())
 
 
-def get_bucket_complete_weeks() -> set:
-    """Scan the configured Cloudflare R2 bucket and return set of (year, week)
-    that exist in ALL prefixes (folders) in the bucket.
+class LocalIndex:
+    """Week files per prefix folder of the local mirror, kept current from
+    filesystem events (see ``app.watcher``) so local completeness can be
+    updated without rescanning the whole destination.
+
+    Follows the rules of ``get_local_complete_weeks``: dot-folders and
+    prefixes outside the sync filter are ignored, and a week is complete
+    when every folder holding week files has at least one file of it.
     """
-    config = load_config()
-    if config is None:
-        return set()
 
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=config["endpoint"],
-        aws_access_key_id=config["access_key"],
-        aws_secret_access_key=config["secret_key"],
-    )
+    def __init__(self, dest_path: Path, flt: SyncFilter | None = None):
+        self.dest_path = Path(dest_path)
+        self._flt = flt or SyncFilter()
+        # prefix -> filename -> (year, week)
+        self._files: dict[str, dict[str, tuple]] = {}
+        # prefix -> (year, week) -> number of files
+        self._counts: dict[str, dict[tuple, int]] = {}
+        self._complete: set = set()
 
-    bucket = config["bucket"]
-    weeks_per_prefix = defaultdict(set)
+    def _tracked(self, name: str) -> bool:
+        return not name.startswith(".") and self._flt.prefix_allowed(name)
+
+    @staticmethod
+    def _list_folder(folder: Path) -> dict:
+        files = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    m = _PATTERN.match(entry.name)
+                    if m and entry.is_file():
+                        files[entry.name] = (int(m.group("year")), int(m.group("week")))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return files
 
+    def _folders(self) -> set:
+        try:
+            with os.scandir(self.dest_path) as it:
+                return {e.name for e in it if e.is_dir() and self._tracked(e.name)}
+        except (FileNotFoundError, NotADirectoryError):
+            return set()
+
+    def scan(self) -> set:
+        """Index the whole destination once; returns the complete weeks."""
+        self._files = {name: self._list_folder(self.dest_path / name) for name in self._folders()}
+        self._counts = {}
+        for name, files in self._files.items():
+            counts = self._counts[name] = {}
+            for week in files.values():
+                counts[week] = counts.get(week, 0) + 1
+        self._complete = self._intersection()
+        return set(self._complete)
+
+    def prefixes(self) -> list:
+        return sorted(self._files)
+
+    def complete_weeks(self) -> set:
+        return set(self._complete)
+
+    def _intersection(self) -> set:
+        filled = [set(c) for c in self._counts.values() if c]
+        return set.intersection(*filled) if filled else set()
+
+    def folder_changed(self, path: Path) -> dict:
+        """Re-read one changed folder (the root or a prefix folder) and
+        return ``{(year, week): local}`` for weeks whose completeness changed.
+        """
+        path = Path(path)
+        if path == self.dest_path:
+            return self._root_changed()
+        if path.parent != self.dest_path or path.name not in self._files:
+            return {}
+        return self._apply(path.name, self._list_folder(path))
+
+    def _root_changed(self) -> dict:
+        folders = self._folders()
+        changes = {}
+        for name in set(self._files) - folders:
+            changes.update(self._apply(name, None))
+        for name in folders - set(self._files):
+            changes.update(self._apply(name, self._list_folder(self.dest_path / name)))
+        return changes
+
+    def _apply(self, prefix: str, files: dict | None) -> dict:
+        """Replace the files of ``prefix`` (None: the folder is gone)."""
+        old = self._files.get(prefix, {})
+        new = files or {}
+        counts = self._counts.setdefault(prefix, {})
+        was_filled = bool(counts)
+        touched = set()
+        for name in old.keys() - new.keys():
+            week = old[name]
+            counts[week] -= 1
+            if not counts[week]:
+                del counts[week]
+                touched.add(week)
+        for name in new.keys() - old.keys():
+            week = new[name]
+            if week not in counts:
+                touched.add(week)
+            counts[week] = counts.get(week, 0) + 1
+        if files is None:
+            del self._files[prefix]
+            del self._counts[prefix]
+        else:
+            self._files[prefix] = new
+
+        if was_filled != bool(counts):
+            # a folder gained its first or lost its last week file: every week may change
+            complete = self._intersection()
+        else:
+            complete = set(self._complete)
+            filled = [c for c in self._counts.values() if c]
+            for week in touched:
+                if filled and all(week in c for c in filled):
+                    complete.add(week)
+                else:
+                    complete.discard(week)
+        changes = {week: week in complete for week in complete ^ self._complete}
+        self._complete = complete
+        return changes
+
+
+def apply_local_changes(week_status: dict, changes: dict) -> list:
+    """Apply ``{(year, week): local}`` changes to ``week_status`` in place.
+
+    Returns the weeks whose entry changed.
+    """
+    changed = []
+    for week, local in changes.items():
+        entry = week_status.get(week)
+        if entry is None:
+            if not local:
+                continue
+            week_status[week] = {"local": True, "bucket": False, "stale": False}
+        elif bool(entry.get("local")) == local:
+            continue
+        elif not local and not entry.get("bucket"):
+            del week_status[week]
+        else:
+            # a week that is gone locally cannot be outdated
+            week_status[week] = {**entry, "local": local, "stale": entry.get("stale", False) and local}
+        changed.append(week)
+    return changed
+
+
+def _parse_listing_entry(obj: dict) -> dict | None:
+    """Turn a ListObjectsV2 entry into a listing dict, or None if the key does
+    not follow the <prefix>/YYYYWww_*.parquet layout.
+    """
+    key = obj["Key"]
+    if "/" not in key:
+        return None
+
+    prefix, filename = key.split("/", 1)
+    m = _PATTERN.match(filename)
+    if not m:
+        return None
+
+    return {
+        "key": key,
+        "prefix": prefix,
+        "filename": filename,
+        "year": int(m.group("year")),
+        "week": int(m.group("week")),
+        "size": obj.get("Size", 0),
+        "etag": obj.get("ETag", "").strip('"'),
+        "last_modified": _timestamp(obj.get("LastModified")),
+    }
+
+
+def _timestamp(value) -> str | None:
+    # boto3 returns datetimes; keep manifests and queues JSON friendly
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+@tracing.traced("list_prefixes")
+def _list_prefixes(s3, bucket: str) -> list:
+    """Return the top-level prefixes (folders) of the bucket."""
+    prefixes = []
     paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket):
+    for page in paginator.paginate(Bucket=bucket, Delimiter="/"):
+        for cp in page.get("CommonPrefixes", []):
+            prefixes.append(cp["Prefix"].rstrip("/"))
+    return prefixes
+
+
+def _list_page(s3, kwargs: dict, limit: AdaptiveLimit, policy: RetryPolicy, cancel_event=None) -> dict:
+    """Fetch one ListObjectsV2 page, retrying transient errors with backoff."""
+    attempt = 0
+    while True:
+        attempt += 1
+        if not limit.acquire(cancel_event):
+            _check_cancelled(cancel_event)
+        started = time.monotonic()
+        try:
+            with tracing.span("list_page", prefix=kwargs.get("Prefix", ""), attempt=attempt) as span:
+                page = s3.list_objects_v2(**kwargs)
+                if span is not None:
+                    span["keys"] = len(page.get("Contents", []))
+        except Exception as exc:
+            limit.release(ok=False, latency=time.monotonic() - started, throttled=is_throttle_error(exc))
+            if not policy.should_retry(exc, attempt):
+                raise
+            delay = policy.delay(attempt)
+            logger.warning("Listing %s failed (attempt %d/%d), retrying in %.1fs: %s",
+                           kwargs.get("Prefix", ""), attempt, policy.attempts, delay, exc)
+            if cancel_event is not None and cancel_event.wait(delay):
+                _check_cancelled(cancel_event)
+            elif cancel_event is None:
+                time.sleep(delay)
+            continue
+        limit.release(ok=True, amount=len(page.get("Contents", [])), latency=time.monotonic() - started)
+        return page
+
+
+@tracing.traced("list_range")
+def _list_range(s3, bucket: str, prefix: str, limit: AdaptiveLimit, cancel_event=None, policy=None, flt=None,
+                start_after: str | None = None, stop_after: str | None = None, max_pages: int | None = None) -> tuple:
+    """List the keys of one prefix in (``start_after``, ``stop_after``] page
+    by page, taking a listing slot for each request.
+
+    Returns ``(entries, resume_after)``; ``resume_after`` is the last key
+    seen when listing stopped after ``max_pages`` with more keys to come.
+    """
+    entries = []
+    policy = policy or RetryPolicy()
+    flt = flt or SyncFilter()
+    kwargs = {"Bucket": bucket, "Prefix": prefix + "/"}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    pages = 0
+    while True:
+        page = _list_page(s3, kwargs, limit, policy, cancel_event)
+        pages += 1
+        contents = page.get("Contents", [])
+        for obj in contents:
+            # past the week range or into the next key range
+            if stop_after and obj["Key"] > stop_after:
+                return entries, None
+            entry = _parse_listing_entry(obj)
+            if entry is not None and flt.accepts(entry):
+                entries.append(entry)
+
+        if not page.get("IsTruncated"):
+            return entries, None
+        if max_pages and pages >= max_pages and contents:
+            return entries, contents[-1]["Key"]
+        _check_cancelled(cancel_event)
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+def _week_extent(s3, bucket: str, prefix: str, limit: AdaptiveLimit, cancel_event=None, policy=None, flt=None):
+    """First and last (year, week) of the week files of a prefix within the
+    week filter, or None if it has none.
+
+    Keys sort by week, so a page listed with StartAfter starts at the first
+    week at or after any week. Small prefixes fit on the first page; for
+    larger ones the last week is found by doubling the distance from the
+    first one and then bisecting, a few dozen requests instead of listing
+    the whole prefix.
+    """
+    flt = flt or SyncFilter()
+    policy = policy or RetryPolicy()
+
+    def _probe(week=None):
+        # (first, last, more) of the page of week files at or after ``week``
+        kwargs = {"Bucket": bucket, "Prefix": prefix + "/"}
+        start = f"{prefix}/{week[0]:04d}W{week[1]:02d}" if week else flt.start_after(prefix)
+        if start:
+            kwargs["StartAfter"] = start
+        page = _list_page(s3, kwargs, limit, policy, cancel_event)
+        weeks = []
         for obj in page.get("Contents", []):
-            key = obj["Key"]
-            if "/" not in key:
+            entry = _parse_listing_entry(obj)
+            if entry is None:
                 continue
+            found = (entry["year"], entry["week"])
+            if not flt.week_in_scope(found):
+                # past the week range: nothing further counts
+                return (weeks[0], weeks[-1], False) if weeks else None
+            weeks.append(found)
+        if not weeks:
+            return None
+        return weeks[0], weeks[-1], bool(page.get("IsTruncated"))
 
-            prefix, filename = key.split("/", 1)
-            m = _PATTERN.match(filename)
-            if not m:
-                continue
+    def _monday(week):
+        return date.fromisocalendar(*week, 1)
+
+    def _plus(week, weeks):
+        return (_monday(week) + timedelta(weeks=weeks)).isocalendar()[:2]
+
+    probe = _probe()
+    if probe is None:
+        return None
+    first, last, more = probe
+    step = 1
+    while more:
+        bound = _plus(last, step)
+        probe = _probe(bound)
+        if probe is None:
+            break
+        _, last, more = probe
+        step *= 2
+    else:
+        return first, last
+    # the last week lies in [last, bound)
+    while (_monday(bound) - _monday(last)).days > 7:
+        mid = _plus(last, (_monday(bound) - _monday(last)).days // 14)
+        probe = _probe(mid)
+        if probe is None:
+            bound = mid
+            continue
+        _, last, more = probe
+        if not more:
+            break
+    return first, last
+
+
+def _key_ranges(prefix: str, resume_after: str, stop_after: str | None, first_week: tuple | None,
+                max_parts: int) -> list:
+    """Split the rest of a prefix listing into contiguous (start, stop] key
+    ranges on week boundaries.
+
+    "<prefix>/2024W05" sorts just before every file of that week, so it is a
+    clean boundary. The number of ranges follows how many weeks the first
+    page covered (roughly a page per range), capped at ``max_parts``. The
+    last range is open ended, or ends at the week filter.
+    """
+    m = _PATTERN.match(resume_after.rsplit("/", 1)[-1])
+    if not m or max_parts < 2:
+        return [(resume_after, stop_after)]
+    try:
+        start = date.fromisocalendar(int(m.group("year")), int(m.group("week")), 1)
+        first = date.fromisocalendar(*first_week, 1) if first_week else start
+        if stop_after:
+            year, week = stop_after.rsplit("/", 1)[-1][:7].split("W")
+            end = date.fromisocalendar(int(year), int(week), 1)
+        else:
+            end = date.today()
+    except ValueError:
+        return [(resume_after, stop_after)]
+
+    remaining = (end - start).days // 7
+    per_page = max(1, (start - first).days // 7)
+    parts = min(max_parts, remaining, -(-remaining // per_page))
+    if parts < 2:
+        return [(resume_after, stop_after)]
+
+    bounds = [resume_after]
+    for i in range(1, parts):
+        year, week, _ = (start + timedelta(weeks=remaining * i // parts)).isocalendar()
+        bounds.append(f"{prefix}/{year:04d}W{week:02d}")
+    bounds.append(stop_after)
+    return list(zip(bounds, bounds[1:]))
 
-            year = int(m.group("year"))
-            week = int(m.group("week"))
-            weeks_per_prefix[prefix].add((year, week))
+
+def list_bucket_objects(s3, config: dict, cancel_event=None):
+    """Yield listing dicts for every week file in the bucket.
+
+    If the producer publishes an object index at the bucket root (see
+    ``app.bucket_manifest``) it is used instead of listing. Otherwise the
+    top-level prefixes are listed concurrently; the number of parallel page
+    requests is adjusted by an AIMD controller within listing_workers_min/max.
+    A prefix that needs more than one page is split into up to
+    ``listing_partitions`` week ranges that are listed concurrently too.
+    Prefixes and weeks outside the configured sync filter (see
+    ``app.sync_filter``) are never listed; a key shard lists only its own
+    week range of each prefix.
+    """
+    flt = SyncFilter.from_config(config)
+    with tracing.span("bucket_manifest"):
+        manifest_objects = fetch_bucket_manifest(s3, config)
+    if manifest_objects is not None:
+        entries = [e for e in map(_parse_listing_entry, manifest_objects) if e is not None]
+        if flt.key_sharded:
+            extents = {}
+            for entry in entries:
+                week = (entry["year"], entry["week"])
+                if flt.week_in_scope(week):
+                    lo, hi = extents.get(entry["prefix"], (week, week))
+                    extents[entry["prefix"]] = (min(lo, week), max(hi, week))
+            for prefix, (first, last) in extents.items():
+                flt.set_shard_extent(prefix, first, last)
+        for entry in entries:
+            if flt.accepts(entry):
+                yield entry
+        return
+
+    bucket = config["bucket"]
+    # literal include patterns are the prefixes themselves, no need to discover them
+    prefixes = flt.literal_prefixes()
+    if prefixes is None:
+        prefixes = _list_prefixes(s3, bucket)
+    prefixes = [p for p in prefixes if flt.prefix_allowed(p)]
+    _check_cancelled(cancel_event)
+    if not prefixes:
+        return
+
+    limit = _adaptive_limit(config, "listing")
+    policy = RetryPolicy(config)
+    partitions = int(config.get("listing_partitions", _DEFAULT_LISTING_PARTITIONS))
+    with ThreadPoolExecutor(max_workers=limit.maximum, thread_name_prefix="listing") as pool:
+        def _submit(prefix, start_after, stop_after, max_pages=None):
+            return pool.submit(tracing.bind(_list_range), s3, bucket, prefix, limit, cancel_event, policy, flt,
+                               start_after, stop_after, max_pages)
+
+        if flt.key_sharded:
+            # key shards split the weeks each prefix actually holds
+            probes = {pool.submit(tracing.bind(_week_extent), s3, bucket, p, limit, cancel_event, policy, flt): p
+                      for p in prefixes}
+            for f in as_completed(probes):
+                flt.set_shard_extent(probes[f], *(f.result() or (None, None)))
+
+        # the first page shows how dense a prefix is; the rest is then
+        # listed as concurrent key ranges
+        head_pages = 1 if partitions > 1 else None
+        pending = {_submit(p, flt.start_after(p), flt.stop_after(p), head_pages): p for p in prefixes}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                prefix = pending.pop(f)
+                entries, resume_after = f.result()
+                yield from entries
+                if resume_after is None:
+                    continue
+                first_week = (entries[0]["year"], entries[0]["week"]) if entries else None
+                ranges = _key_ranges(prefix, resume_after, flt.stop_after(prefix), first_week, partitions)
+                if len(ranges) > 1:
+                    logger.info("Listing %s in %d key ranges", prefix, len(ranges))
+                for start_after, stop_after in ranges:
+                    pending[_submit(prefix, start_after, stop_after)] = prefix
+
+
+@tracing.traced("bucket_weeks")
+def bucket_complete_weeks(objects) -> set:
+    """Return the (year, week) tuples present in ALL prefixes of a listing."""
+    weeks_per_prefix = defaultdict(set)
+    for entry in objects:
+        weeks_per_prefix[entry["prefix"]].add((entry["year"], entry["week"]))
 
     if not weeks_per_prefix:
         return set()
 
-    logger.info("Refresh scan (bucket): found %d prefixes, %d common weeks", len(weeks_per_prefix), len(set.intersection(*weeks_per_prefix.values())))
+    common = set.intersection(*weeks_per_prefix.values())
+    logger.info("Refresh scan (bucket): found %d prefixes, %d common weeks", len(weeks_per_prefix), len(common))
+    return common
 
-    return set.intersection(*weeks_per_prefix.values())
 
+def get_bucket_complete_weeks(cancel_event=None, profile: str | None = None) -> set:
+    """Scan the configured Cloudflare R2 bucket and return set of (year, week)
+    that exist in ALL prefixes (folders) in the bucket.
+    """
+    config = load_config(profile)
+    if not config:
+        return set()
 
-def build_week_status(local_weeks: set, bucket_weeks: set) -> dict:
-    """Return dict mapping (year,week) -> {'local':bool,'bucket':bool}.
+    s3 = get_s3_client(config)
+    return bucket_complete_weeks(list_bucket_objects(s3, config, cancel_event=cancel_event))
+
+
+@tracing.traced("find_stale")
+def find_stale_objects(objects, dest_path: Path, manifest=None, record: bool = True) -> list:
+    """Return listing entries whose local copy differs from the bucket.
+
+    Uses only the listing already fetched (no HEAD requests): a local file is
+    stale when the ETag or size recorded in the manifest differs from the
+    listing. Local files without a manifest entry (downloaded before the
+    manifest existed) are compared by size and adopted into the manifest
+    when the size matches; with ``record=False`` the manifest is left
+    untouched.
     """
+    manifest = manifest or get_local_manifest()
+    stale = []
+    for entry in objects:
+        recorded = manifest.get(entry["key"])
+        if recorded is not None:
+            if recorded.get("etag") != entry["etag"] or recorded.get("size") != entry["size"]:
+                stale.append(entry)
+            continue
+
+        local_file = dest_path / entry["prefix"] / entry["filename"]
+        try:
+            local_size = local_file.stat().st_size
+        except OSError:
+            continue
+        if local_size != entry["size"]:
+            stale.append(entry)
+        elif record:
+            manifest.record(entry["key"], entry["size"], entry["etag"], entry.get("last_modified"))
+    if record:
+        manifest.save()
+    if stale:
+        logger.info("Found %d local files that differ from the bucket", len(stale))
+    return stale
+
+
+@tracing.traced("build_week_status")
+def build_week_status(local_weeks: set, bucket_weeks: set, stale_weeks: set | None = None) -> dict:
+    """Return dict mapping (year,week) -> {'local':bool,'bucket':bool,'stale':bool}.
+
+    ``stale`` marks weeks that are present locally but have files which were
+    re-uploaded in the bucket since they were downloaded.
+    """
+    stale_weeks = stale_weeks or set()
     keys = set(local_weeks) | set(bucket_weeks)
     status = {}
     for k in keys:
         status[k] = {
             "local": k in local_weeks,
             "bucket": k in bucket_weeks,
+            "stale": k in stale_weeks,
         }
     return status
 
 
+def _status_from_listing(objects: list, config: dict) -> dict:
+    profile = config.get("profile")
+    local_weeks = get_local_complete_weeks(profile)
+    stale = find_stale_objects(objects, Path(config["local_path"]), get_local_manifest(profile))
+    stale_weeks = {(o["year"], o["week"]) for o in stale}
+    return build_week_status(local_weeks, bucket_complete_weeks(objects), stale_weeks)
+
+
+def refresh_week_status(old_status: dict | None = None, cancel_event=None, progress=None, profile: str | None = None) -> dict:
+    """Scan local folder and bucket and return a fresh week status dict.
+
+    ``old_status`` is only used to log whether the refresh discovered new weeks.
+    ``profile`` selects the configuration profile (default: the active one).
+    """
+    config = load_config(profile)
+    if not config:
+        return {}
+
+    with tracing.operation("refresh", config):
+        if progress:
+            progress({"stage": "bucket"})
+        s3 = get_s3_client(config)
+        objects = list(list_bucket_objects(s3, config, cancel_event=cancel_event))
+        _check_cancelled(cancel_event)
+
+        if progress:
+            progress({"stage": "local"})
+        status = _status_from_listing(objects, config)
+
+        # log whether refresh discovered new available or updated weeks
+        old_status = old_status or {}
+        old_available = {k for k, v in old_status.items() if needs_download(v)}
+        new_available = {k for k, v in status.items() if needs_download(v)}
+        added = new_available - old_available
+        if added:
+            logger.info("Refresh: new data found for %d weeks", len(added))
+        else:
+            logger.info("Refresh: everything up to date")
+
+        return status
+
+
+def needs_download(week_status: dict) -> bool:
+    """True for weeks that are in the bucket but missing or outdated locally."""
+    return bool(week_status.get("bucket") and (not week_status.get("local") or week_status.get("stale")))
+
+
 def _week_key_to_str(tpl: tuple) -> str:
     return f"{tpl[0]:04d}-{tpl[1]:02d}"
 
@@ -119,121 +724,900 @@ def _str_to_week_key(s: str) -> tuple:
     return (int(y), int(w))
 
 
-def get_week_status_path() -> Path:
-    return get_appdata_dir() / "week_status.json"
+def get_week_status_path(profile: str | None = None) -> Path:
+    return get_state_dir(profile) / "week_status.json"
 
 
-def save_week_status(week_status: dict):
+@tracing.traced("save_week_status")
+def save_week_status(week_status: dict, profile: str | None = None):
     # Accept dict with tuple keys -> convert to string keys
     data = { _week_key_to_str(k): v for k, v in week_status.items() }
-    path = get_week_status_path()
+    path = get_week_status_path(profile)
     path.write_text(json.dumps(data, indent=2), encoding="utf-8")
 
 
-def load_week_status() -> dict:
-    path = get_week_status_path()
+@tracing.traced("load_week_status")
+def load_week_status(profile: str | None = None) -> dict:
+    path = get_week_status_path(profile)
     if not path.exists():
         return {}
     raw = json.loads(path.read_text(encoding="utf-8"))
     return { _str_to_week_key(k): v for k, v in raw.items() }
 
 
-def download_weeks(weeks: set):
-    """Download files for the given set of (year, week) tuples from the configured
-    R2 bucket into the local folder structure. Returns updated week_status dict.
+def _ensure_writable_dir(directory: Path):
+    """Create ``directory`` and check that we can write to it."""
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        raise OSError(f"Failed to create directory {directory}: {e}") from e
+
+    try:
+        # per-thread name: workers starting in a new folder check it concurrently
+        test_path = directory / f".__writetest__{os.getpid()}_{threading.get_ident()}"
+        with open(test_path, "w", encoding="utf-8") as fh:
+            fh.write("")
+        test_path.unlink()
+    except Exception as e:
+        raise PermissionError(f"Permission denied to write to directory {directory}: {e}") from e
+
+
+def _free_space(path: Path) -> int:
+    """Free bytes on the volume holding ``path``, which may not exist yet."""
+    for candidate in (path, *path.parents):
+        if candidate.exists():
+            return shutil.disk_usage(candidate).free
+    return shutil.disk_usage(path.anchor or ".").free
+
+
+def _min_free_bytes(config: dict) -> int:
+    return int(float(config.get("min_free_space_mb", _DEFAULT_MIN_FREE_MB)) * 1024 * 1024)
+
 
-    The function attempts to download any objects whose filename matches the week
-    and places them into <local_path>/<prefix>/<filename> where prefix is the
-    top-level prefix (folder) from the bucket key (prefix/filename).
+def _disk_cost(item: dict, cache=None) -> int:
+    """Bytes ``item`` takes on the destination volume; nothing when the
+    object cache can link it into place (see ``ObjectCache.links_to``)."""
+    if cache is not None and cache.has(item.get("etag", ""), item.get("size", 0)):
+        return 0
+    return item.get("size", 0)
+
+
+def _preflight_disk_space(config: dict, dest_path: Path, items: list, cache=None) -> int | None:
+    """Check the listed sizes of ``items`` against the free space of the
+    destination volume, keeping ``min_free_space_mb`` free. ``cache`` is the
+    object cache if it can link files onto this volume.
+
+    Returns None if everything fits, otherwise the byte budget that does:
+    downloads are then taken in queue order until the budget is used up and
+    the rest stays queued for a later run. With ``disk_full_policy``
+    "refuse", or when not even the first file fits, ``DiskSpaceError`` is
+    raised instead.
     """
-    config = load_config()
-    if config is None:
-        raise RuntimeError("Configuration not found")
+    planned = sum(_disk_cost(i, cache) for i in items)
+    reserve = _min_free_bytes(config)
+    free = _free_space(dest_path)
+    budget = free - reserve
+    if planned <= budget:
+        return None
 
-    if not weeks:
-        # nothing to do, return current status
-        return build_week_status(get_local_complete_weeks(), get_bucket_complete_weeks())
+    message = (f"Not enough space in {dest_path}: {human_size(planned)} to download, "
+               f"{human_size(free)} free of which {human_size(reserve)} is kept free")
+    if config.get("disk_full_policy", "trim") == "refuse":
+        raise DiskSpaceError(message)
+    fitting = used = 0
+    for item in items:
+        if used + _disk_cost(item, cache) > budget:
+            break
+        fitting += 1
+        used += _disk_cost(item, cache)
+    if not fitting:
+        raise DiskSpaceError(message)
+    logger.warning("%s; downloading about the first %d of %d files (%s), the rest stays queued",
+                   message, fitting, len(items), human_size(used))
+    return budget
 
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=config["endpoint"],
-        aws_access_key_id=config["access_key"],
-        aws_secret_access_key=config["secret_key"],
-    )
 
+_fallocate = None
+
+
+def _linux_fallocate():
+    """libc ``fallocate(2)``, or None. Unlike ``os.posix_fallocate`` it never
+    falls back to writing zeros, which glibc does on NFS / CIFS."""
+    global _fallocate
+    if _fallocate is None:
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            func = getattr(libc, "fallocate64", None) or libc.fallocate
+            func.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+            func.restype = ctypes.c_int
+            _fallocate = func
+        except (OSError, AttributeError):
+            _fallocate = False
+    return _fallocate or None
+
+
+def _preallocate(fh, size: int) -> bool:
+    """Reserve ``size`` bytes for a file about to be written so it is laid
+    out in one piece: ``fallocate(2)`` on Linux, otherwise by extending the
+    file (NTFS allocates the clusters up front). Returns False if the
+    filesystem cannot allocate without writing the data (EOPNOTSUPP); a full
+    volume raises.
+    """
+    if size <= 0:
+        return False
+    try:
+        if sys.platform.startswith("linux"):
+            fallocate = _linux_fallocate()
+            if fallocate is None:
+                return False
+            if fallocate(fh.fileno(), 0, 0, size) != 0:
+                code = ctypes.get_errno()
+                raise OSError(code, os.strerror(code))
+            return True
+        if sys.platform == "win32":
+            fh.truncate(size)
+            return True
+        # elsewhere sparse files would only fake the reservation
+        return False
+    except OSError as exc:
+        if exc.errno == errno.ENOSPC:
+            raise
+        # EOPNOTSUPP, ENOSYS, EINVAL: no native preallocation on this filesystem
+        return False
+
+
+def _download_item(s3, bucket: str, item: dict, dest_path: Path, queue, stats, cancel_event=None, leases=None,
+                   preallocate: bool = False) -> dict:
+    """Stream one object into ``local_file`` and return its verified size/etag.
+
+    Data is written to a ``.part`` file next to the target and moved into
+    place only once the body has been fully received, so an interrupted
+    transfer never leaves a truncated parquet file behind. The ETag is
+    computed while streaming and compared with what the bucket reported;
+    on mismatch the file is quarantined and ``IntegrityError`` is raised so
+    the object is retried. With ``preallocate`` the ``.part`` file is first
+    allocated at its final size.
+    """
+    key = item["key"]
+    local_file = dest_path / item["prefix"] / item["filename"]
+    part_file = local_file.with_name(local_file.name + ".part")
+    transferred = 0
+    limiter = get_bandwidth_limiter()
+    stats.start_transfer()
+    try:
+        resp = s3.get_object(Bucket=bucket, Key=key)
+        # the GET response describes the bytes we actually receive; it only
+        # differs from the listing if the object was replaced in between
+        etag = resp.get("ETag", item.get("etag", "")).strip('"')
+        size = resp.get("ContentLength", item.get("size", 0))
+        last_modified = _timestamp(resp.get("LastModified")) or item.get("last_modified")
+        if etag != item.get("etag"):
+            logger.info("Object %s changed since listing (etag %s -> %s)", key, item.get("etag"), etag)
+        hasher = EtagHasher(etag, size)
+
+        with open(part_file, "wb") as fh:
+            preallocated = preallocate and _preallocate(fh, size)
+            for chunk in resp["Body"].iter_chunks(_CHUNK_SIZE):
+                _check_cancelled(cancel_event)
+                if queue.is_cancelled(key):
+                    raise _ItemCancelled()
+                limiter.consume(len(chunk), cancel_event)
+                fh.write(chunk)
+                hasher.update(chunk)
+                transferred += len(chunk)
+                stats.add_bytes(len(chunk))
+                if leases is not None:
+                    leases.keepalive(key)
+            if preallocated:
+                # drop the reserved tail if the body was shorter than announced
+                fh.truncate()
+
+        problem = hasher.check()
+        if problem and hasher.part_sizes:
+            # the uploader may have used an uncommon part size: ask the bucket
+            part_size = _first_part_size(s3, bucket, key)
+            if part_size and part_size not in hasher.part_sizes:
+                hasher = hash_file(part_file, etag, size, part_size)
+                problem = hasher.check()
+        if problem:
+            quarantine(part_file, dest_path, key, problem)
+            raise IntegrityError(f"{key}: {problem}")
+        if not hasher.verifiable:
+            logger.info("ETag of %s cannot be reproduced locally, verified size only", key)
+
+        os.replace(part_file, local_file)
+        stats.end_transfer(True)
+        return {"size": size, "etag": etag, "last_modified": last_modified, "part_size": hasher.part_size}
+    except BaseException:
+        stats.end_transfer(False, item.get("size", 0), transferred)
+        # cleanup partial file if created
+        try:
+            if part_file.exists():
+                part_file.unlink()
+        except Exception as cleanup_exc:
+            logger.warning("Failed to cleanup partial file %s: %s", str(part_file), cleanup_exc)
+        raise
+
+
+def _first_part_size(s3, bucket: str, key: str) -> int | None:
+    """Size of part 1 of a multipart object, i.e. the uploader's part size."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key, PartNumber=1).get("ContentLength")
+    except Exception as exc:
+        logger.warning("Cannot read the part size of %s: %s", key, exc)
+        return None
+
+
+def _log_fields(key: str, size: int | None = None, seconds: float | None = None, **fields) -> dict:
+    """Structured fields for per-object log lines (see ``log_format``)."""
+    fields["key"] = key
+    if size is not None:
+        fields["bytes"] = size
+    if seconds is not None:
+        fields["duration_ms"] = round(seconds * 1000, 1)
+        if size is not None and seconds > 0:
+            fields["throughput"] = round(size / seconds)
+    return {"extra": fields}
+
+
+def _restore_from_cache(cache, item: dict, local_file: Path, checked_dirs: set) -> bool:
+    """Populate ``local_file`` from the object cache. Returns False on a miss."""
+    if not cache.has(item.get("etag", ""), item.get("size", 0)):
+        return False
+    if local_file.parent not in checked_dirs:
+        try:
+            _ensure_writable_dir(local_file.parent)
+        except OSError:
+            # let the regular download path report the problem
+            return False
+        checked_dirs.add(local_file.parent)
+    method = cache.materialize(item["etag"], item["size"], local_file)
+    if method is None:
+        return False
+    logger.info("Restored file from cache (%s): %s", method, str(local_file),
+                **_log_fields(item["key"], item["size"], method=method))
+    return True
+
+
+@tracing.traced("drain_queue")
+def _drain_queue(s3, config: dict, queue, cancel_event=None, progress=None, only: set | None = None, leases=None):
+    """Download queued items in priority order using a pool of worker threads.
+
+    Workers pop the next item only when they are free, so weeks prioritised
+    while a download is running are picked up immediately. How many workers
+    transfer at once is decided by an AIMD controller (``AdaptiveLimit``)
+    within download_workers_min/max. Transient errors are retried with
+    jittered exponential backoff; objects that still fail are written to the
+    failure journal. With ``only``, just those keys are downloaded.
+
+    Before starting, the planned bytes are checked against the free space of
+    the destination (see ``_preflight_disk_space``); objects the cache can
+    link into place do not count. If they do not all fit, workers stop once
+    the bytes that do are used up, whichever items the queue hands out
+    first. If the volume still
+    fills up, the run stops, the remaining objects stay queued and
+    ``DiskSpaceError`` is raised.
+
+    Objects already present in the object cache (see ``app.object_cache``)
+    are linked or copied into place instead of being downloaded, and every
+    completed download is hardlinked into the cache, which is then trimmed
+    to its size limit.
+
+    With ``leases`` (a ``LeaseManager``, used by sharded workers sharing one
+    ``local_path``) an object is only transferred while holding its lease.
+    Objects leased by another worker are tried again later in the run, until
+    that worker has completed them (then they are skipped) or its lease has
+    expired.
+    """
     bucket = config["bucket"]
     dest_path = Path(config["local_path"])
+    limit = _adaptive_limit(config, "download")
+    policy = RetryPolicy(config)
+    journal = get_failure_journal(config.get("profile"))
+    manifest = get_local_manifest(config.get("profile"))
+    cache = get_object_cache(config)
+    workers = limit.maximum
+    preallocate = bool(config.get("preallocate", True))
+    disk_full = threading.Event()
+    space_used_up = threading.Event()
 
     failures = []
     downloaded = []
+    checked_dirs = set()
+    lock = threading.Lock()
 
-    logger.info("Download requested for %d weeks", len(weeks))
-    # Iterate through objects and download matching ones
-    paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket):
-        for obj in page.get("Contents", []):
-            key = obj["Key"]
-            if "/" not in key:
-                continue
+    get_bandwidth_limiter().configure(config)
 
-            prefix, filename = key.split("/", 1)
-            m = _PATTERN.match(filename)
-            if not m:
-                continue
+    # byte-level progress, delivered through ``progress`` at a bounded rate
+    stats = TransferStats(f"{bucket}, {limit.minimum}-{limit.maximum} workers", emit=progress)
+    planned = [i for i in queue.pending() if only is None or i["key"] in only]
+    # cached objects only take space if the cache has to copy them over
+    linked = cache if cache is not None and cache.links_to(dest_path) else None
+    budget = _preflight_disk_space(config, dest_path, planned, linked) if planned else None
+    if budget is not None:
+        # charged as items are popped, so weeks prioritised meanwhile still run first
+        budget = [budget]
+    used = 0
+    for item in planned:
+        used += _disk_cost(item, linked)
+        if budget is not None and used > budget[0]:
+            break
+        stats.add_planned(item.get("size", 0))
 
-            year = int(m.group("year"))
-            week = int(m.group("week"))
-            if (year, week) not in weeks:
-                continue
+    def _refund(item: dict):
+        if budget is not None:
+            with lock:
+                budget[0] += _disk_cost(item, linked)
 
-            # ensure local folder exists; filename may contain subpaths
-            local_dir = dest_path / prefix
-            local_file = local_dir / filename
-            # ensure parent folders exist
+    def _charge(item: dict) -> bool:
+        """Take the item's bytes from the budget; False when they do not fit."""
+        if budget is None:
+            return True
+        with lock:
+            cost = _disk_cost(item, linked)
+            if cost > budget[0]:
+                return False
+            budget[0] -= cost
+            return True
+
+    def _transfer(item: dict) -> bool:
+        """Download one item with retries. Returns False when the worker should stop."""
+        key = item["key"]
+        local_file = dest_path / item["prefix"] / item["filename"]
+        if cache is not None and _restore_from_cache(cache, item, local_file, checked_dirs):
+            limit.release_unused()
+            manifest.record(key, item["size"], item["etag"], item.get("last_modified"))
+            queue.mark_done(key)
+            journal.resolve(key)
+            stats.local_hit(item.get("size", 0))
+            with lock:
+                downloaded.append(str(local_file))
+            return True
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
             try:
-                local_file.parent.mkdir(parents=True, exist_ok=True)
+                if local_file.parent not in checked_dirs:
+                    _ensure_writable_dir(local_file.parent)
+                    checked_dirs.add(local_file.parent)
+                with tracing.span("transfer", key=key, size=item.get("size", 0), attempt=attempt):
+                    verified = _download_item(s3, bucket, item, dest_path, queue, stats, cancel_event, leases,
+                                              preallocate)
+            except SyncCancelled:
+                limit.release_unused()
+                queue.requeue(key)
+                return False
+            except _ItemCancelled:
+                # the item stays in the queue as cancelled
+                limit.release_unused()
+                _refund(item)
+                logger.info("Download cancelled: %s", key, **_log_fields(key))
+                return True
             except Exception as e:
-                failures.append((key, f"Failed to create directory {local_file.parent}: {e}"))
-                logger.error("Failed to create directory %s: %s", str(local_file.parent), e)
+                if isinstance(e, OSError) and e.errno == errno.ENOSPC:
+                    # every further object would fail the same way
+                    limit.release_unused()
+                    queue.requeue(key)
+                    if not disk_full.is_set():
+                        disk_full.set()
+                        logger.error("Disk full while writing %s, stopping downloads", str(local_file))
+                    return False
+                elapsed = time.monotonic() - started
+                limit.release(ok=False, latency=elapsed, throttled=is_throttle_error(e))
+                if policy.should_retry(e, attempt):
+                    delay = policy.delay(attempt)
+                    logger.warning(
+                        "Download of %s failed (attempt %d/%d), retrying in %.1fs: %s",
+                        key, attempt, policy.attempts, delay, e,
+                        **_log_fields(key, seconds=elapsed, attempt=attempt, error=str(e)),
+                    )
+                    stats.retry_transfer(item.get("size", 0))
+                    if cancel_event is not None:
+                        cancel_event.wait(delay)
+                    else:
+                        time.sleep(delay)
+                    if not limit.acquire(cancel_event):
+                        queue.requeue(key)
+                        return False
+                    continue
+
+                queue.mark_failed(key)
+                journal.record(item, str(e), attempt, permanent=not is_transient_error(e))
+                with lock:
+                    failures.append((key, str(e)))
+                logger.error("Failed to download %s after %d attempts: %s", key, attempt, e,
+                             **_log_fields(key, seconds=elapsed, attempt=attempt, error=str(e)))
+                return True
+            else:
+                elapsed = time.monotonic() - started
+                limit.release(ok=True, amount=item.get("size", 0), latency=elapsed)
+                manifest.record(key, verified["size"], verified["etag"], verified["last_modified"],
+                                verified["part_size"])
+                if cache is not None:
+                    cache.add(local_file, verified["etag"])
+                queue.mark_done(key)
+                journal.resolve(key)
+                with lock:
+                    downloaded.append(str(local_file))
+                logger.info("Downloaded file: %s", str(local_file),
+                            **_log_fields(key, verified["size"], elapsed, attempt=attempt))
+                return True
+
+    run_started = time.time()
+
+    def _done_elsewhere(item: dict) -> bool:
+        # another worker may have finished the object since we listed it
+        local_file = dest_path / item["prefix"] / item["filename"]
+        try:
+            st = local_file.stat()
+        except OSError:
+            return False
+        return st.st_size == item.get("size") and st.st_mtime >= run_started
+
+    # items leased by another worker: (retry at, item), tried again until
+    # that worker finishes them or its lease expires
+    deferred = []
+
+    def _transfer_leased(item: dict) -> bool:
+        key = item["key"]
+        if not leases.acquire(key):
+            limit.release_unused()
+            _refund(item)
+            with lock:
+                deferred.append((time.monotonic() + min(leases.ttl / 3, _LEASE_RETRY_SECONDS), item))
+            logger.info("Deferring %s, another worker holds its lease", key)
+            return True
+        try:
+            if _done_elsewhere(item):
+                limit.release_unused()
+                manifest.record(key, item["size"], item["etag"], item.get("last_modified"))
+                queue.mark_done(key)
+                stats.drop(item.get("size", 0))
+                logger.info("Skipping %s, already downloaded by another worker", key)
+                return True
+            return _transfer(item)
+        finally:
+            leases.release(key)
+
+    def _retry_deferred() -> bool:
+        """Wait for the next deferred item and queue it again; False if there is none."""
+        with lock:
+            if not deferred:
+                return False
+            due = min(t for t, _ in deferred)
+        delay = due - time.monotonic()
+        if delay > 0:
+            if cancel_event is not None:
+                cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+        now = time.monotonic()
+        with lock:
+            ready = [item for t, item in deferred if t <= now]
+            deferred[:] = [(t, item) for t, item in deferred if t > now]
+        for item in ready:
+            queue.requeue(item["key"])
+        return True
+
+    def _worker():
+        while ((cancel_event is None or not cancel_event.is_set()) and not disk_full.is_set()
+               and not space_used_up.is_set()):
+            if not limit.acquire(cancel_event):
+                return
+            item = queue.pop_next(only)
+            if item is None:
+                limit.release_unused()
+                if not _retry_deferred():
+                    return
                 continue
+            if not _charge(item):
+                # the free space is used up; later items stay queued
+                limit.release_unused()
+                queue.requeue(item["key"])
+                if not space_used_up.is_set():
+                    space_used_up.set()
+                    logger.warning("Free space budget used up, leaving the rest of the queue for later")
+                return
+            if not (_transfer(item) if leases is None else _transfer_leased(item)):
+                return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as pool:
+        for f in [pool.submit(tracing.bind(_worker)) for _ in range(workers)]:
+            f.result()
+    # stopped early: deferred items stay queued for the next run
+    for _, item in deferred:
+        queue.requeue(item["key"])
+
+    record_throughput(stats.finish(), config.get("profile"))
+    if cache is not None and downloaded:
+        cache.trim()
+    with tracing.span("save_queue"):
+        queue.save()
+    with tracing.span("save_manifest"):
+        manifest.save()
+    if disk_full.is_set():
+        raise DiskSpaceError(f"{dest_path} ran out of space; unfinished downloads stay queued")
+    _check_cancelled(cancel_event)
+    return failures, downloaded
+
+
+def _select_downloads(objects: list, weeks: set | None, dest_path: Path, stale: set) -> list:
+    """Listing entries of ``weeks`` (None: all) that are missing or stale locally."""
+    wanted = []
+    for entry in objects:
+        if weeks is not None and (entry["year"], entry["week"]) not in weeks:
+            continue
+        # skip download if file already exists locally and is up to date;
+        # stale files are downloaded again and replaced atomically
+        if entry["key"] not in stale and (dest_path / entry["prefix"] / entry["filename"]).exists():
+            continue
+        wanted.append(entry)
+    return wanted
+
+
+def plan_download(weeks: set | None, cancel_event=None, progress=None, profile: str | None = None,
+                  keep_listing: bool = False) -> dict:
+    """Work out what ``download_weeks(weeks)`` would transfer, without
+    downloading anything.
+
+    Objects already in the download queue are included. The result has the
+    object and byte totals, a breakdown ``per_prefix`` and ``per_week``, the
+    objects the object cache can provide (``cached``), the expected number
+    of requests and ``estimate_seconds``, based on the throughput of recent
+    downloads of the profile (None until one has been measured).
+    ``min_free_bytes`` is the space the download keeps free.
+
+    With ``keep_listing`` the bucket listing is returned as ``listing``, to be
+    passed on to ``download_weeks`` so the bucket is listed only once.
+    """
+    config = load_config(profile)
+    if not config:
+        raise RuntimeError("Configuration not found")
+    profile = config["profile"]
+
+    with tracing.operation("plan", config, weeks="all" if weeks is None else len(weeks)):
+        queue = get_download_queue(profile)
+        dest_path = Path(config["local_path"])
+        cache = get_object_cache(config)
+        items = {}
+        stale = set()
+        list_requests = 0
+        objects = None
+        if weeks is None or weeks:
+            if progress:
+                progress({"stage": "bucket"})
+            s3 = get_s3_client(config)
+            objects = list(list_bucket_objects(s3, config, cancel_event=cancel_event))
+            listed = defaultdict(int)
+            for entry in objects:
+                listed[entry["prefix"]] += 1
+            if not keep_listing:
+                # what the download will list again, one page per 1000 keys of each prefix
+                list_requests = sum(-(-n // _LIST_PAGE_SIZE) for n in listed.values())
+            # planning only reads the manifest; the download adopts files into it
+            manifest = get_local_manifest(profile)
+            stale = {o["key"] for o in find_stale_objects(objects, dest_path, manifest, record=False)}
+            for entry in _select_downloads(objects, weeks, dest_path, stale):
+                items[entry["key"]] = entry
+        # cancelled objects are not queued again by the download
+        for key in queue.cancelled() & items.keys():
+            del items[key]
+        queued = 0
+        for item in queue.pending():
+            if item["key"] not in items:
+                items[item["key"]] = item
+                queued += 1
 
-            # check that we can write to this directory
+        per_prefix = defaultdict(lambda: {"objects": 0, "bytes": 0})
+        per_week = defaultdict(lambda: {"objects": 0, "bytes": 0})
+        cached = cached_bytes = 0
+        for item in items.values():
+            size = item.get("size", 0)
+            for group in (per_prefix[item["prefix"]], per_week[(item["year"], item["week"])]):
+                group["objects"] += 1
+                group["bytes"] += size
+            if cache is not None and cache.has(item.get("etag", ""), size):
+                cached += 1
+                cached_bytes += size
+
+        total = sum(v["bytes"] for v in per_prefix.values())
+        throughput = expected_throughput(profile)
+        plan = {
+            "objects": len(items),
+            "bytes": total,
+            "weeks": len(per_week),
+            "updates": len(stale & items.keys()),
+            "queued": queued,
+            "cached": cached,
+            "cached_bytes": cached_bytes,
+            "transfer_bytes": total - cached_bytes,
+            # what the preflight check counts: cached files take space unless linked
+            "disk_bytes": total - (cached_bytes if cache is not None and cache.links_to(dest_path) else 0),
+            "requests": {"get": len(items) - cached, "list": list_requests},
+            "throughput": throughput,
+            "estimate_seconds": round((total - cached_bytes) / throughput, 1) if throughput else None,
+            "free_bytes": _free_space(dest_path),
+            "min_free_bytes": _min_free_bytes(config),
+            "per_prefix": dict(sorted(per_prefix.items())),
+            "per_week": {f"{y:04d}-W{w:02d}": v for (y, w), v in sorted(per_week.items(), reverse=True)},
+        }
+        if keep_listing:
+            plan["listing"] = objects
+        logger.info("Download plan: %d objects, %d bytes in %d weeks (%d cached)",
+                    plan["objects"], plan["bytes"], plan["weeks"], cached)
+        return plan
+
+
+def download_weeks(weeks: set | None, cancel_event=None, progress=None, priority_weeks: set | None = None,
+                   profile: str | None = None, shard: str | None = None, shard_by: str | None = None,
+                   listing: list | None = None):
+    """Download files for the given set of (year, week) tuples from the configured
+    R2 bucket into the local folder structure. Returns a tuple of
+    (week_status, failures, downloaded). ``weeks=None`` means every week in
+    the listing, so a headless sync needs a single listing.
+
+    Matching objects are added to the persistent download queue (see
+    ``app.download_queue``) and the queue is then drained newest week first,
+    with ``priority_weeks`` moved to the front. Items left in the queue by a
+    previous run are downloaded as well. Each object is placed into
+    <local_path>/<prefix>/<filename> where prefix is the top-level prefix
+    (folder) from the bucket key (prefix/filename).
+
+    ``cancel_event`` is checked between chunks; when it is set the function
+    raises ``SyncCancelled`` and unfinished objects stay queued for the next
+    run. ``progress`` receives throttled ``TransferStats`` snapshots (see
+    ``app.telemetry``). ``profile`` selects the configuration profile
+    (default: the active one).
+
+    ``shard`` ("K/N") restricts the run to one of N disjoint parts of the
+    keyspace, split into week ranges of each prefix or by prefix
+    (``shard_by``), so several processes or hosts can fill one
+    ``local_path`` together; they coordinate through lease files (see
+    ``app.sharding``).
+
+    ``listing`` is a bucket listing fetched just before (the ``listing`` of
+    a ``plan_download(..., keep_listing=True)`` result) that is used instead
+    of listing the bucket again.
+    """
+    config = load_config(profile)
+    if not config:
+        raise RuntimeError("Configuration not found")
+    profile = config["profile"]
+    if shard:
+        config["shard"] = shard
+    if shard_by:
+        config["shard_by"] = shard_by
+    leases = None
+    if config.get("shard"):
+        leases = LeaseManager(Path(config["local_path"]), config.get("lease_ttl", DEFAULT_LEASE_TTL))
+
+    with tracing.operation("download", config, weeks="all" if weeks is None else len(weeks)):
+        queue = get_download_queue(profile)
+        dest_path = Path(config["local_path"])
+        if weeks is not None and not weeks and not len(queue):
+            # nothing to do, return current status
+            return refresh_week_status(cancel_event=cancel_event, profile=profile), [], []
+
+        s3 = get_s3_client(config)
+
+        objects = None
+        if weeks is None or weeks:
+            logger.info("Download requested for %s weeks", "all" if weeks is None else len(weeks))
+            if listing is not None:
+                objects = listing
+            else:
+                objects = list(list_bucket_objects(s3, config, cancel_event=cancel_event))
+            manifest = get_local_manifest(profile)
+            stale = {o["key"] for o in find_stale_objects(objects, dest_path, manifest)}
+            added = queue.add(_select_downloads(objects, weeks, dest_path, stale))
+            logger.info("Queued %d new objects (%d updates), %d pending in total", added, len(stale), len(queue))
+
+        if priority_weeks:
+            queue.prioritize_weeks(priority_weeks)
+
+        failures, downloaded = _drain_queue(s3, config, queue, cancel_event, progress, leases=leases)
+
+        # After attempting downloads, recompute status from the listing we already have
+        if objects is not None:
+            status = _status_from_listing(objects, config)
+        else:
+            bucket_weeks = {k for k, v in load_week_status(profile).items() if v.get("bucket")}
+            status = build_week_status(get_local_complete_weeks(profile), bucket_weeks)
+
+        # return status, failures list and downloaded files list
+        logger.info("Download complete: %d downloaded, %d failures", len(downloaded), len(failures))
+        return status, failures, downloaded
+
+
+def resume_downloads(cancel_event=None, progress=None, priority_weeks: set | None = None,
+                     profile: str | None = None):
+    """Drain objects left in the download queue without listing the bucket."""
+    return download_weeks(set(), cancel_event=cancel_event, progress=progress, priority_weeks=priority_weeks,
+                          profile=profile)
+
+
+def retry_failed(cancel_event=None, progress=None, profile: str | None = None):
+    """Download exactly the keys recorded in the failure journal.
+
+    No listing is done: the journal holds everything needed to fetch the
+    objects, and the bucket side of the week status is taken from the last
+    saved status. Returns (week_status, failures, downloaded) like
+    ``download_weeks``.
+    """
+    config = load_config(profile)
+    if not config:
+        raise RuntimeError("Configuration not found")
+    profile = config["profile"]
+
+    merge_shard_journals(profile, Path(config["local_path"]))
+    items = get_failure_journal(profile).items()
+    failures, downloaded = [], []
+    if items:
+        logger.info("Retrying %d failed downloads", len(items))
+        queue = get_download_queue(profile)
+        keys = {item["key"] for item in items}
+        queue.add(items)
+        queue.prioritize_keys(keys)
+        s3 = get_s3_client(config)
+        failures, downloaded = _drain_queue(s3, config, queue, cancel_event, progress, only=keys)
+
+    bucket_weeks = {k for k, v in load_week_status(profile).items() if v.get("bucket")}
+    status = build_week_status(get_local_complete_weeks(profile), bucket_weeks)
+    logger.info("Retry complete: %d downloaded, %d still failing", len(downloaded), len(failures))
+    return status, failures, downloaded
+
+
+def _verify_full(dest_path: Path, manifest, cancel_event=None, progress=None, s3=None, bucket: str | None = None) -> list:
+    """Hash every manifest entry; returns (key, problem, verifiable, entry) tuples.
+
+    With ``s3``, a multipart ETag that no common part size reproduces is
+    checked again with the part size read from the bucket, which is then
+    recorded in the manifest.
+    """
+    entries = manifest.items()
+    logger.info("Verifying %d files in %s (full checksum)", len(entries), str(dest_path))
+
+    def _verify(key: str, entry: dict):
+        _check_cancelled(cancel_event)
+        path = dest_path / key
+        if not path.is_file():
+            return "missing", None
+        etag, size = entry.get("etag", ""), entry.get("size", 0)
+        hasher = hash_file(path, etag, size, entry.get("part_size"))
+        problem = hasher.check()
+        if problem and hasher.part_sizes and not entry.get("part_size") and s3 is not None:
+            part_size = _first_part_size(s3, bucket, key)
+            if part_size and part_size not in hasher.part_sizes:
+                hasher = hash_file(path, etag, size, part_size)
+                problem = hasher.check()
+                if problem is None:
+                    manifest.record(key, size, etag, entry.get("last_modified"), part_size)
+        return problem, hasher.verifiable
+
+    results = []
+    workers = max(1, min(8, os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify") as pool:
+        futures = {pool.submit(_verify, key, entry): (key, entry) for key, entry in entries}
+        for f in as_completed(futures):
+            key, entry = futures[f]
             try:
-                test_path = local_file.parent / (".__writetest__" + local_file.name)
-                with open(test_path, "w", encoding="utf-8") as fh:
-                    fh.write("")
-                test_path.unlink()
-            except Exception as e:
-                failures.append((key, f"Permission denied to write to directory {local_file.parent}: {e}"))
-                logger.error("Permission denied writing to %s: %s", str(local_file.parent), e)
-                continue
-            # skip download if file already exists locally
-            if local_file.exists():
-                # record as skipped (not a failure)
-                # but do not treat as downloaded
+                problem, verifiable = f.result()
+            except SyncCancelled:
                 continue
+            except Exception as exc:
+                problem, verifiable = f"unreadable: {exc}", True
+            results.append((key, problem, verifiable, entry))
+            if progress:
+                progress({"checked": len(results), "total": len(entries)})
+    return results
+
 
+def _verify_quick(dest_path: Path, manifest, cancel_event=None, progress=None) -> list:
+    """Check parquet header/footer and size of every file in the prefix folders.
+
+    Folders are the same ones ``get_local_complete_weeks`` scans and are
+    checked in parallel. Files without a manifest entry are checked too
+    (without the size comparison).
+    """
+    folders = [f for f in dest_path.iterdir() if f.is_dir() and not f.name.startswith(".")]
+    logger.info("Verifying %d folders in %s (parquet footers)", len(folders), str(dest_path))
+
+    def _check_folder(folder: Path) -> list:
+        results = []
+        for f in folder.iterdir():
+            _check_cancelled(cancel_event)
+            if not f.is_file() or not _PATTERN.match(f.name):
+                continue
+            key = f"{folder.name}/{f.name}"
+            entry = manifest.get(key) or {}
             try:
-                # download object to local file path
-                s3.download_file(bucket, key, str(local_file))
-                downloaded.append(str(local_file))
-                logger.info("Downloaded file: %s", str(local_file))
-            except Exception as e:
-                # cleanup partial file if created
-                try:
-                    if local_file.exists():
-                        local_file.unlink()
-                except Exception as cleanup_exc:
-                    logger.warning("Failed to cleanup partial file %s: %s", str(local_file), cleanup_exc)
-
-                failures.append((key, str(e)))
-                logger.error("Failed to download %s: %s", key, e)
-
-    # After attempting downloads, recompute status
-    local_weeks = get_local_complete_weeks()
-    bucket_weeks = get_bucket_complete_weeks()
-    status = build_week_status(local_weeks, bucket_weeks)
-
-    # return status, failures list and downloaded files list
-    logger.info("Download complete: %d downloaded, %d failures", len(downloaded), len(failures))
-    return status, failures, downloaded
+                problem = check_parquet_footer(f, entry.get("size"))
+            except Exception as exc:
+                problem = f"unreadable: {exc}"
+            results.append((key, problem, False, entry))
+        return results
+
+    results = []
+    # count the manifest entries whose file has disappeared as well
+    seen = set()
+    workers = max(1, min(16, len(folders)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verify") as pool:
+        for f in as_completed([pool.submit(_check_folder, folder) for folder in folders]):
+            for result in f.result():
+                results.append(result)
+                seen.add(result[0])
+            if progress:
+                progress({"checked": len(results)})
+
+    for key, entry in manifest.items():
+        if key not in seen and "/" in key and not (dest_path / key).is_file():
+            results.append((key, "missing", None, entry))
+    return results
+
+
+def verify_local_mirror(mode: str = "full", cancel_event=None, progress=None, profile: str | None = None) -> dict:
+    """Check the local mirror and repair what is broken.
+
+    ``mode="full"`` hashes every file recorded in the local manifest through
+    memory maps and compares size and ETag. ``mode="quick"`` only checks the
+    parquet header/footer magic, the footer length and the size, which takes
+    seconds instead of hours. Corrupt files are quarantined and their keys,
+    like those of missing files, are put back on the download queue.
+    Returns a summary dict.
+    """
+    config = load_config(profile)
+    if not config:
+        raise RuntimeError("Configuration not found")
+
+    dest_path = Path(config["local_path"])
+    manifest = get_local_manifest(config["profile"])
+    cache = get_object_cache(config)
+    if mode == "quick":
+        results = _verify_quick(dest_path, manifest, cancel_event, progress)
+    else:
+        results = _verify_full(dest_path, manifest, cancel_event, progress, get_s3_client(config), config["bucket"])
+    _check_cancelled(cancel_event)
+
+    summary = {"mode": mode, "checked": 0, "ok": 0, "missing": [], "corrupt": [], "unverifiable": 0, "requeued": 0}
+    requeue = []
+    for key, problem, verifiable, entry in results:
+        summary["checked"] += 1
+        if problem is None:
+            summary["ok"] += 1
+            if mode == "full" and not verifiable:
+                summary["unverifiable"] += 1
+            continue
+
+        if problem == "missing":
+            summary["missing"].append(key)
+        else:
+            summary["corrupt"].append((key, problem))
+            quarantine(dest_path / key, dest_path, key, problem)
+            # the cache may hold a hardlink to the same corrupt data
+            if cache is not None:
+                cache.discard(entry.get("etag", ""))
+        manifest.remove(key)
+
+        prefix, filename = key.split("/", 1)
+        m = _PATTERN.match(filename)
+        if m:
+            requeue.append({
+                "key": key,
+                "prefix": prefix,
+                "filename": filename,
+                "year": int(m.group("year")),
+                "week": int(m.group("week")),
+                "size": entry.get("size", 0),
+                "etag": entry.get("etag", ""),
+            })
+
+    manifest.save()
+    if requeue:
+        summary["requeued"] = get_download_queue(config["profile"]).add(requeue)
+
+    logger.info(
+        "Verify (%s) complete: %d checked, %d ok, %d missing, %d corrupt, %d requeued",
+        mode, summary["checked"], summary["ok"], len(summary["missing"]), len(summary["corrupt"]), summary["requeued"],
+    )
+    return summary
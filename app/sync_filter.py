@@ -0,0 +1,191 @@
+import re
+from datetime import date, timedelta
+from fnmatch import fnmatchcase
+
+from app.sharding import parse_shard, shard_of, week_slice
+
+
+_WEEK = re.compile(r"^\s*(\d{4})-?W(\d{1,2})\s*$", re.IGNORECASE)
+_LAST = re.compile(r"^\s*last\s+(\d+)\s*$", re.IGNORECASE)
+# Shard range of a prefix this shard has nothing of: "0000W00" sorts before every week
+_NO_WEEKS = ((0, 0), (0, 0))
+
+
+def parse_week(text: str) -> tuple:
+    """Parse "YYYY-Www" (or "YYYYWww") into a (year, week) tuple."""
+    m = _WEEK.match(text or "")
+    if not m:
+        raise ValueError(f"Invalid week '{text}', expected YYYY-Www")
+    year, week = int(m.group(1)), int(m.group(2))
+    try:
+        date.fromisocalendar(year, week, 1)
+    except ValueError:
+        raise ValueError(f"Week {week} does not exist in {year}") from None
+    return year, week
+
+
+def format_week(week: tuple) -> str:
+    return f"{week[0]:04d}-W{week[1]:02d}"
+
+
+def parse_week_range(text: str) -> dict:
+    """Parse the week range field of the settings dialog.
+
+    Accepts "YYYY-Www..YYYY-Www" (either side may be empty), a single week,
+    or "last N" for a rolling window of the N most recent weeks. Returns the
+    ``sync_from`` / ``sync_to`` / ``sync_weeks_back`` config keys; an empty
+    string means no week filter. Raises ValueError on malformed input.
+    """
+    text = (text or "").strip()
+    result = {"sync_from": None, "sync_to": None, "sync_weeks_back": None}
+    if not text:
+        return result
+    m = _LAST.match(text)
+    if m:
+        if int(m.group(1)) < 1:
+            raise ValueError("The rolling window must cover at least one week")
+        result["sync_weeks_back"] = int(m.group(1))
+        return result
+    start, sep, end = text.partition("..")
+    if not sep:
+        end = start
+    if start.strip():
+        result["sync_from"] = format_week(parse_week(start))
+    if end.strip():
+        result["sync_to"] = format_week(parse_week(end))
+    if result["sync_from"] and result["sync_to"] and parse_week(result["sync_from"]) > parse_week(result["sync_to"]):
+        raise ValueError("The first week of the range is after the last one")
+    return result
+
+
+def format_week_range(config: dict) -> str:
+    if config.get("sync_weeks_back"):
+        return f"last {config['sync_weeks_back']}"
+    start, end = config.get("sync_from") or "", config.get("sync_to") or ""
+    if not start and not end:
+        return ""
+    if start == end:
+        return start
+    return f"{start}..{end}"
+
+
+def parse_patterns(text: str) -> list:
+    """Split a comma/semicolon separated list of prefix patterns."""
+    return [p.strip().strip("/") for p in re.split(r"[;,]", text or "") if p.strip().strip("/")]
+
+
+class SyncFilter:
+    """Which prefixes and weeks this workstation mirrors.
+
+    ``include_prefixes`` / ``exclude_prefixes`` are shell-style patterns
+    (``fnmatch``) matched against top-level prefixes; an empty include list
+    means all prefixes. The week range comes from ``sync_from`` / ``sync_to``
+    ("YYYY-Www", inclusive) or ``sync_weeks_back`` (rolling window ending at
+    the current week). Keys are named ``<prefix>/YYYYWww_*.parquet`` and
+    listed in lexicographic order, so the range maps onto ``StartAfter`` and
+    an early stop of the listing.
+
+    A ``shard`` (k, n) keeps only the k-th of n deterministic slices, by
+    prefix (other prefixes are never listed) or by key (``shard_by``). Key
+    shards are contiguous week ranges of each prefix, between the first and
+    last week it holds in the bucket (see ``set_shard_extent``), so a shard
+    lists only its own part of the keyspace.
+    """
+
+    def __init__(self, include=None, exclude=None, first=None, last=None, shard=None, shard_by="key"):
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.first = first
+        self.last = last
+        self.shard = shard
+        self.shard_by = shard_by
+        self._shard_weeks: dict[str, tuple] = {}
+
+    @classmethod
+    def from_config(cls, config: dict, today: date | None = None) -> "SyncFilter":
+        first = parse_week(config["sync_from"]) if config.get("sync_from") else None
+        last = parse_week(config["sync_to"]) if config.get("sync_to") else None
+        back = config.get("sync_weeks_back")
+        if back:
+            today = today or date.today()
+            start = today - timedelta(weeks=int(back) - 1)
+            first = start.isocalendar()[:2]
+            last = None
+        shard = parse_shard(config["shard"]) if config.get("shard") else None
+        return cls(
+            config.get("include_prefixes"), config.get("exclude_prefixes"), first, last,
+            shard, config.get("shard_by", "key"),
+        )
+
+    @property
+    def key_sharded(self) -> bool:
+        return bool(self.shard) and self.shard_by == "key"
+
+    def set_shard_extent(self, prefix: str, first: tuple | None, last: tuple | None):
+        """Split ``prefix`` into key shards over the weeks it holds in the bucket
+        (within the week range). Without any weeks the first shard takes the
+        prefix and the others skip it.
+        """
+        if first is None or last is None:
+            self._shard_weeks[prefix] = (None, None) if self.shard[0] == 1 else _NO_WEEKS
+            return
+        self._shard_weeks[prefix] = week_slice(tuple(first), max(tuple(first), tuple(last)), *self.shard)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.include or self.exclude or self.first or self.last or self.shard)
+
+    def prefix_allowed(self, prefix: str) -> bool:
+        if self.include and not any(fnmatchcase(prefix, p) for p in self.include):
+            return False
+        if self.shard and self.shard_by == "prefix" and shard_of(prefix, self.shard[1]) != self.shard[0]:
+            return False
+        return not any(fnmatchcase(prefix, p) for p in self.exclude)
+
+    def literal_prefixes(self) -> list | None:
+        """The include list if it names prefixes without wildcards, else None."""
+        if not self.include or any(set(p) & set("*?[") for p in self.include):
+            return None
+        return list(self.include)
+
+    def week_in_scope(self, week: tuple) -> bool:
+        week = tuple(week)
+        if self.first is not None and week < self.first:
+            return False
+        if self.last is not None and week > self.last:
+            return False
+        return True
+
+    def in_shard(self, entry: dict) -> bool:
+        if not self.key_sharded:
+            return True
+        lo, hi = self._shard_weeks.get(entry["prefix"], (None, None))
+        week = (entry["year"], entry["week"])
+        return (lo is None or week >= lo) and (hi is None or week < hi)
+
+    def accepts(self, entry: dict) -> bool:
+        if not self.in_shard(entry):
+            return False
+        return self.prefix_allowed(entry["prefix"]) and self.week_in_scope((entry["year"], entry["week"]))
+
+    def start_after(self, prefix: str) -> str | None:
+        """ListObjectsV2 ``StartAfter`` that skips weeks before the range."""
+        bounds = [self.first, self._shard_weeks.get(prefix, (None, None))[0]]
+        bounds = [b for b in bounds if b is not None]
+        if not bounds:
+            return None
+        first = max(bounds)
+        # "<prefix>/2024W05" sorts just before "<prefix>/2024W05_..."
+        return f"{prefix}/{first[0]:04d}W{first[1]:02d}"
+
+    def stop_after(self, prefix: str) -> str | None:
+        """Keys sorting after this are past the range; listing can stop there."""
+        bounds = []
+        if self.last is not None:
+            # "~" sorts after "_", so every file of the last week is before the bound
+            bounds.append(f"{prefix}/{self.last[0]:04d}W{self.last[1]:02d}~")
+        hi = self._shard_weeks.get(prefix, (None, None))[1]
+        if hi is not None:
+            # the next shard starts with this week
+            bounds.append(f"{prefix}/{hi[0]:04d}W{hi[1]:02d}")
+        return min(bounds) if bounds else None
@@ -0,0 +1,280 @@
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import get_state_dir
+from app.logger import logger
+from app.utils import human_size
+
+
+# Smoothing factor for the moving-average throughput (per snapshot tick)
+_EWMA_ALPHA = 0.3
+# Seconds of samples used for the "current" throughput
+_CURRENT_WINDOW = 3.0
+# Download jobs remembered per profile for time estimates
+_HISTORY_SIZE = 20
+# Jobs that transferred less than this say little about throughput
+_HISTORY_MIN_BYTES = 1024 * 1024
+
+_history_lock = threading.Lock()
+
+
+class TransferStats:
+    """Byte-level progress of one download job, aggregated over all workers.
+
+    Workers report bytes as they stream; ``emit`` is called with a snapshot
+    dict at most once per ``interval`` seconds, no matter how many workers
+    report. The same numbers are written to the log every ``log_interval``
+    seconds and once more as a summary when the job finishes.
+    """
+
+    def __init__(self, label: str = "download", emit=None, interval: float = 0.5, log_interval: float = 30.0):
+        self.label = label
+        self._emit = emit
+        self._interval = interval
+        self._log_interval = log_interval
+        self._lock = threading.Lock()
+
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.active = 0
+
+        self._started = time.monotonic()
+        self._samples = deque([(self._started, 0)])
+        self._avg = 0.0
+        self._peak = 0.0
+        self._last_emit = 0.0
+        self._last_log = self._started
+
+    def add_planned(self, size: int, files: int = 1):
+        with self._lock:
+            self.bytes_total += size
+            self.files_total += files
+
+    def start_transfer(self):
+        with self._lock:
+            self.active += 1
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self.bytes_done += n
+        self._maybe_emit()
+
+    def end_transfer(self, ok: bool, size: int = 0, transferred: int = 0):
+        """Finish one transfer. Failed or cancelled objects are dropped from the
+        plan so that progress and ETA only describe data that will arrive.
+        """
+        with self._lock:
+            self.active -= 1
+            if ok:
+                self.files_done += 1
+            else:
+                self.files_failed += 1
+                self.files_total -= 1
+                self.bytes_total -= size
+                self.bytes_done -= transferred
+        self._maybe_emit()
+
+    def local_hit(self, size: int = 0):
+        """An object was satisfied locally (e.g. from the object cache); it
+        counts as done but is dropped from the byte plan so throughput and ETA
+        only describe network transfers.
+        """
+        with self._lock:
+            self.files_done += 1
+            self.bytes_total -= size
+        self._maybe_emit()
+
+    def drop(self, size: int = 0):
+        """Remove a planned object that will not be transferred by this job."""
+        with self._lock:
+            self.files_total -= 1
+            self.bytes_total -= size
+        self._maybe_emit()
+
+    def retry_transfer(self, size: int = 0):
+        """Put a failed transfer back into the plan because it will be retried."""
+        with self._lock:
+            self.files_failed -= 1
+            self.files_total += 1
+            self.bytes_total += size
+
+    def _tick_locked(self, now: float) -> dict:
+        self._samples.append((now, self.bytes_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > _CURRENT_WINDOW:
+            self._samples.popleft()
+        t0, b0 = self._samples[0]
+        current = (self.bytes_done - b0) / (now - t0) if now > t0 else 0.0
+        self._avg = current if self._avg == 0.0 else _EWMA_ALPHA * current + (1 - _EWMA_ALPHA) * self._avg
+        self._peak = max(self._peak, current)
+
+        remaining = max(0, self.bytes_total - self.bytes_done)
+        eta = remaining / self._avg if self._avg > 0 else None
+        return {
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "files_done": self.files_done,
+            "files_failed": self.files_failed,
+            "files_total": self.files_total,
+            "active": self.active,
+            "throughput": current,
+            "avg_throughput": self._avg,
+            "elapsed": now - self._started,
+            "eta": eta,
+        }
+
+    def _maybe_emit(self, force: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_emit < self._interval:
+                return
+            self._last_emit = now
+            snap = self._tick_locked(now)
+            log_now = now - self._last_log >= self._log_interval
+            if log_now:
+                self._last_log = now
+
+        if log_now:
+            logger.info("Transfer progress (%s): %s", self.label, format_snapshot(snap))
+        if self._emit:
+            self._emit(snap)
+
+    def finish(self) -> dict:
+        """Emit a final snapshot and log the per-job summary."""
+        self._maybe_emit(force=True)
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            summary = {
+                "files": self.files_done,
+                "failed": self.files_failed,
+                "bytes": self.bytes_done,
+                "seconds": round(elapsed, 3),
+                "avg_throughput": self.bytes_done / elapsed if elapsed > 0 else 0.0,
+                "peak_throughput": self._peak,
+            }
+        logger.info(
+            "Transfer summary (%s): %d files, %d failed, %s in %.1fs, avg %s/s, peak %s/s",
+            self.label,
+            summary["files"],
+            summary["failed"],
+            human_size(summary["bytes"]),
+            summary["seconds"],
+            human_size(summary["avg_throughput"]),
+            human_size(summary["peak_throughput"]),
+            extra={
+                "job": self.label,
+                "files": summary["files"],
+                "failed": summary["failed"],
+                "bytes": summary["bytes"],
+                "duration_ms": round(elapsed * 1000, 1),
+                "throughput": round(summary["avg_throughput"]),
+                "peak_throughput": round(summary["peak_throughput"]),
+            },
+        )
+        return summary
+
+
+def get_throughput_history_path(profile: str | None = None) -> Path:
+    return get_state_dir(profile) / "throughput_history.json"
+
+
+def _load_history(path: Path) -> list:
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("runs", [])
+    except FileNotFoundError:
+        return []
+    except Exception as exc:
+        logger.warning("Failed to load throughput history %s: %s", str(path), exc)
+        return []
+
+
+def record_throughput(summary: dict, profile: str | None = None):
+    """Remember the throughput of a finished download job (a ``finish`` summary)."""
+    if summary["bytes"] < _HISTORY_MIN_BYTES or summary["seconds"] <= 0:
+        return
+    path = get_throughput_history_path(profile)
+    with _history_lock:
+        runs = _load_history(path)
+        runs.append({
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "bytes": summary["bytes"],
+            "seconds": summary["seconds"],
+            "throughput": round(summary["avg_throughput"]),
+        })
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps({"runs": runs[-_HISTORY_SIZE:]}, indent=2), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("Failed to save throughput history %s: %s", str(path), exc)
+
+
+def expected_throughput(profile: str | None = None) -> float | None:
+    """Bytes/s a download is expected to reach on this machine: the median of
+    recent jobs of the profile, or None before the first measured download.
+    """
+    with _history_lock:
+        runs = _load_history(get_throughput_history_path(profile))
+    samples = [r["throughput"] for r in runs if r.get("throughput")]
+    return float(statistics.median(samples)) if samples else None
+
+
+def format_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    if h:
+        return f"{h}:{m:02d}:{s:02d}"
+    return f"{m:02d}:{s:02d}"
+
+
+def format_snapshot(snap: dict) -> str:
+    """One-line human readable rendering of a ``TransferStats`` snapshot."""
+    return (
+        f"{human_size(snap['bytes_done'])} / {human_size(snap['bytes_total'])}, "
+        f"{snap['files_done']}/{snap['files_total']} files, "
+        f"{human_size(snap['throughput'])}/s (avg {human_size(snap['avg_throughput'])}/s), "
+        f"{snap['active']} active, ETA {format_eta(snap['eta'])}"
+    )
+
+
+def format_plan(plan: dict, top: int = 5) -> str:
+    """Multi-line human readable rendering of a ``plan_download`` result."""
+    lines = [f"{plan['objects']} files, {human_size(plan['bytes'])} in {plan['weeks']} weeks"]
+    if plan["updates"]:
+        lines.append(f"{plan['updates']} of them replace outdated local files")
+    if plan["cached"]:
+        lines.append(f"{plan['cached']} files ({human_size(plan['cached_bytes'])}) come from the local cache")
+    lines.append(f"About {plan['requests']['get']} downloads and {plan['requests']['list']} listing requests")
+    # the download keeps min_free_bytes free and trims or refuses beyond that
+    reserve = plan.get("min_free_bytes", 0)
+    if plan.get("disk_bytes", plan["transfer_bytes"]) > plan["free_bytes"] - reserve:
+        lines.append(
+            f"Not enough disk space: only {human_size(max(0, plan['free_bytes'] - reserve))} usable at the "
+            f"destination ({human_size(plan['free_bytes'])} free, {human_size(reserve)} kept free)"
+        )
+    else:
+        lines.append(f"{human_size(plan['free_bytes'])} free at the destination ({human_size(reserve)} kept free)")
+    if plan["estimate_seconds"] is not None:
+        lines.append(
+            f"Estimated time: {format_eta(plan['estimate_seconds'])} "
+            f"at {human_size(plan['throughput'])}/s (recent downloads)"
+        )
+    else:
+        lines.append("Estimated time: unknown until a first download has been measured")
+    for title, groups in (("Largest prefixes", plan["per_prefix"]), ("Largest weeks", plan["per_week"])):
+        largest = sorted(groups.items(), key=lambda kv: kv[1]["bytes"], reverse=True)[:top]
+        if len(groups) > 1 and largest:
+            lines.append(f"\n{title}:")
+            lines += [f"  {name}: {v['objects']} files, {human_size(v['bytes'])}" for name, v in largest]
+    return "\n".join(lines)
@@ -0,0 +1,169 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from app.config import get_appdata_dir
+from app.logger import logger
+
+
+# Tracing is opt-in: SA_R2_TRACE=1 in the environment or "trace": true in config.json
+ENV_VAR = "SA_R2_TRACE"
+# Trace files kept in the traces folder; older ones are removed
+MAX_TRACE_FILES = 50
+# Frequent GUI operations (calendar redraws) are kept in a subfolder of their
+# own so they never push out the refresh / download traces
+UI_GROUP = "ui"
+MAX_UI_TRACE_FILES = 20
+
+_env_enabled = os.getenv(ENV_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+_config_enabled = False
+
+_current = contextvars.ContextVar("sa_r2_trace", default=None)
+_NOOP = nullcontext()
+
+
+def get_trace_dir() -> Path:
+    trace_dir = get_appdata_dir() / "traces"
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    return trace_dir
+
+
+def configure(config: dict | None):
+    """Apply the hidden ``trace`` setting for operations started without a config."""
+    global _config_enabled
+    _config_enabled = bool((config or {}).get("trace"))
+
+
+def enabled(config: dict | None = None) -> bool:
+    return _env_enabled or _config_enabled or bool((config or {}).get("trace"))
+
+
+class Trace:
+    """Spans of one operation, saved as a Chrome trace (chrome://tracing, Perfetto)."""
+
+    def __init__(self, name: str, profile: str | None = None, group: str | None = None):
+        self.name = name
+        self.profile = profile
+        self.group = group
+        self.started = datetime.now()
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start_ns: int, end_ns: int, args: dict):
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self._events.append({
+                "name": name,
+                "ph": "X",
+                "ts": start_ns // 1000,
+                "dur": max(1, (end_ns - start_ns) // 1000),
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": args,
+            })
+
+    def save(self) -> Path | None:
+        with self._lock:
+            events = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self._threads.items()
+            ] + self._events
+        suffix = f"-{self.profile}" if self.profile else ""
+        trace_dir = get_trace_dir()
+        keep = MAX_TRACE_FILES
+        if self.group:
+            trace_dir = trace_dir / self.group
+            trace_dir.mkdir(exist_ok=True)
+            keep = MAX_UI_TRACE_FILES if self.group == UI_GROUP else MAX_TRACE_FILES
+        path = trace_dir / f"{self.started:%Y%m%d-%H%M%S-%f}-{self.name}{suffix}.json"
+        try:
+            path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+            for old in sorted(trace_dir.glob("*.json"))[:-keep]:
+                old.unlink()
+        except OSError as exc:
+            logger.warning("Failed to write trace %s: %s", path, exc)
+            return None
+        logger.info("Trace of %s written to %s (%d spans)", self.name, path, len(self._events))
+        return path
+
+
+class _Span:
+    def __init__(self, trace: Trace, name: str, args: dict):
+        self._trace = trace
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self._args
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._trace.add(self._name, self._start, time.perf_counter_ns(), self._args)
+        return False
+
+
+def span(name: str, **args):
+    """Time a block inside the current operation. Yields the ``args`` dict
+    (None when not tracing), so results can be attached once known.
+    """
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, args)
+
+
+def traced(name: str):
+    """Decorator form of ``span`` for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with _Span(trace, name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def operation(name: str, config: dict | None = None, group: str | None = None, **args):
+    """Trace one user-visible operation (refresh, download, ...) into its own
+    file when tracing is enabled. Inside another operation it is a span.
+    Traces of a ``group`` (e.g. ``UI_GROUP``) go to a subfolder with its own
+    retention limit.
+    """
+    if _current.get() is not None:
+        with span(name, **args) as span_args:
+            yield span_args
+        return
+    if not enabled(config):
+        yield None
+        return
+
+    trace = Trace(name, (config or {}).get("profile"), group)
+    token = _current.set(trace)
+    try:
+        with _Span(trace, name, args):
+            yield args
+    finally:
+        _current.reset(token)
+        trace.save()
+
+
+def bind(fn):
+    """Carry the current operation into a worker thread (``pool.submit(bind(fn), ...)``)."""
+    if _current.get() is None:
+        return fn
+    ctx = contextvars.copy_context()
+    return functools.partial(ctx.run, fn)
@@ -6,24 +6,38 @@ from PySide6.QtWidgets import (
     QPushButton,
     QMessageBox,
     QHBoxLayout,
-    QGridLayout
+    QGridLayout,
+    QMenu,
+    QComboBox,
 )
-from PySide6.QtCore import Signal, QTimer, Qt
+from PySide6.QtCore import Signal, Qt
 from datetime import datetime
-import threading
 
 from app.calendar import YearCalendarWidget
+from app.download_queue import get_download_queue
+from app.failure_journal import get_failure_journal
+from app.jobs import JobManager, JobState
 from app.sync import (
-    get_local_complete_weeks,
-    get_bucket_complete_weeks,
-    build_week_status,
+    apply_local_changes,
+    refresh_week_status,
+    download_weeks,
+    retry_failed,
+    resume_downloads,
+    verify_local_mirror,
+    needs_download,
+    plan_download,
     load_week_status,
     save_week_status,
 )
 from app.config_dialog import ConfigDialog
 from PySide6.QtWidgets import QDialog
-from app.config import load_config, save_config
+from app.config import get_active_profile, list_profiles, load_config, save_config, set_active_profile
+from app.logger import logger
+from app.sync_filter import SyncFilter
+from app.telemetry import format_plan, format_snapshot
+from app.watcher import LocalWatcher
 from app import theme
+from app import tracing
 
 
 class MainWindow(QMainWindow):
@@ -49,6 +63,9 @@ class MainWindow(QMainWindow):
 
         # Load config (theme not needed anymore, but keeping for other potential settings)
         self._config = load_config()
+        tracing.configure(self._config)
+        # profile shown in the calendar; jobs of other profiles keep running
+        self._profile = get_active_profile()
 
         # --- Central widget ---
         central = QWidget()
@@ -76,24 +93,34 @@ class MainWindow(QMainWindow):
         year = datetime.now().year
         calendar = YearCalendarWidget(year)
         self._calendar = calendar
+        calendar.week_action.connect(self._on_week_action)
         layout.addWidget(calendar)
+        self._apply_sync_filter()
+
+        # weeks the user asked to download first (calendar context menu), per profile
+        self._priority_weeks: dict[str, set] = {}
 
         # --- Grid Layout for Controls (3 columns) ---
         grid = QGridLayout()
         grid.setContentsMargins(0, 0, 0, 0)
         grid.setSpacing(12)
         
-        def _legend_item(color: str, border_color: str, text: str):
+        def _legend_item(color: str, border_color: str, text: str, line: str = "solid"):
             w = QLabel(text)
             w.setAlignment(Qt.AlignCenter)
             w.setFixedHeight(44)
-            w.setStyleSheet(f"background-color: {color}; border-radius: 0px; color: #ffffff; font-size: 14px; border: 1px solid {border_color};")
+            w.setStyleSheet(f"background-color: {color}; border-radius: 0px; color: #ffffff; font-size: 14px; border: 1px {line} {border_color};")
             return w
 
-        # Row 0: Legends
-        grid.addWidget(_legend_item("rgba(83, 26, 70, 0.3)", "#531a46", "synced"), 0, 0)
-        grid.addWidget(_legend_item("rgba(216, 43, 44, 0.3)", "#d82b2c", "available in bucket"), 0, 1)
-        grid.addWidget(_legend_item("rgba(128, 128, 128, 0.1)", "#808080", "no data"), 0, 2)
+        # Row 0: Legends (own row layout spanning the grid, there are more than 3)
+        legends = QHBoxLayout()
+        legends.setSpacing(12)
+        legends.addWidget(_legend_item("rgba(83, 26, 70, 0.3)", "#531a46", "synced"))
+        legends.addWidget(_legend_item("rgba(216, 43, 44, 0.3)", "#d82b2c", "available in bucket"))
+        legends.addWidget(_legend_item("rgba(228, 83, 46, 0.3)", "#e4532e", "updated in bucket"))
+        legends.addWidget(_legend_item("rgba(128, 128, 128, 0.1)", "#808080", "no data"))
+        legends.addWidget(_legend_item("transparent", "rgba(128, 128, 128, 0.6)", "outside sync filter", "dashed"))
+        grid.addLayout(legends, 0, 0, 1, 3)
 
         # Row 1: Action Buttons
         self._refresh_btn = QPushButton("Refresh")
@@ -109,151 +136,436 @@ class MainWindow(QMainWindow):
         self._settings_btn.setToolTip("Change R2 credentials, bucket and local folder")
         self._settings_btn.clicked.connect(self._open_settings)
         grid.addWidget(self._settings_btn, 1, 2)
+
+        # Row 2: maintenance actions
+        self._retry_btn = QPushButton("Retry failed")
+        self._retry_btn.setToolTip("Download again the files that failed last time, without listing the bucket")
+        self._retry_btn.clicked.connect(self._on_retry_failed)
+        grid.addWidget(self._retry_btn, 2, 0)
+
+        self._verify_btn = QPushButton("Verify mirror")
+        self._verify_btn.setToolTip("Check local files for truncation or corruption")
+        verify_menu = QMenu(self._verify_btn)
+        verify_menu.addAction("Quick check (parquet footers)", lambda: self._on_verify("quick"))
+        verify_menu.addAction("Full checksum", lambda: self._on_verify("full"))
+        self._verify_btn.setMenu(verify_menu)
+        grid.addWidget(self._verify_btn, 2, 1)
+
+        self._profile_box = QComboBox()
+        self._profile_box.setToolTip("Switch between mirror profiles (add one in Settings by saving under a new name)")
+        self._fill_profile_box()
+        self._profile_box.currentTextChanged.connect(self._on_profile_changed)
+        grid.addWidget(self._profile_box, 2, 2)
         
         layout.addLayout(grid)
 
+        # Row below the controls: live transfer telemetry while downloading
+        self._transfer_label = QLabel("")
+        self._transfer_label.setObjectName("transferLabel")
+        self._transfer_label.setAlignment(Qt.AlignCenter)
+        self._transfer_label.setVisible(False)
+        layout.addWidget(self._transfer_label)
+
         # Apply initial stylesheet
         self.setStyleSheet(theme.get_stylesheet())
 
         # connect signal
         self.week_status_updated.connect(self._on_week_status_updated)
 
-        # Load persisted week status and render immediately
+        # background jobs (refresh / download) report back through signals
+        self._jobs = JobManager(parent=self)
+        self._jobs.job_state_changed.connect(self._on_job_state_changed)
+        self._jobs.job_progress.connect(self._on_job_progress)
+        self._jobs.job_finished.connect(self._on_job_finished)
+        self._jobs.job_failed.connect(self._on_job_failed)
+        self._update_retry_button()
+
+        # Load persisted week status and render immediately; downloads queued
+        # by a previous session also enable the download button
         try:
-            ws = load_week_status()
+            ws = load_week_status(self._profile)
             if ws:
                 self._calendar.set_week_status(ws)
-                # enable download button if anything available
-                self._update_download_button(ws)
+            self._update_download_button(ws)
         except Exception as exc:
             # non-fatal: show a message
             QMessageBox.warning(self, "Warning", f"Failed to load saved week status: {exc}")
 
+        # optional watcher on the local folder ("watch_local" in config.json)
+        self._watcher = None
+        self._scan_job = None
+        self._start_watcher()
+
         # Year navigation now uses mouse wheel (scroll down = next year, scroll up = previous year)
 
         central.setLayout(layout)
         self.setCentralWidget(central)
 
+    def _apply_sync_filter(self):
+        """Mark weeks outside the configured sync filter in the calendar."""
+        try:
+            flt = SyncFilter.from_config(load_config(self._profile))
+        except ValueError as exc:
+            logger.warning("Ignoring invalid sync filter: %s", exc)
+            flt = SyncFilter()
+        self._calendar.set_scope(flt.week_in_scope if flt.active else None)
+
+    def _key(self, kind: str, profile: str | None = None) -> str:
+        # one job of each kind per profile; profiles run side by side
+        return f"{kind}:{profile or self._profile}"
+
+    @staticmethod
+    def _job_profile(job) -> str:
+        return job.key.partition(":")[2]
+
+    def _fill_profile_box(self):
+        self._profile_box.blockSignals(True)
+        self._profile_box.clear()
+        self._profile_box.addItems(list_profiles())
+        self._profile_box.setCurrentText(self._profile)
+        self._profile_box.setEnabled(self._profile_box.count() > 1)
+        self._profile_box.blockSignals(False)
+
+    def _on_profile_changed(self, name: str):
+        """Show another profile from its saved status; no listing is needed."""
+        if not name or name == self._profile:
+            return
+        try:
+            set_active_profile(name)
+        except KeyError:
+            return
+        self._profile = name
+        self._apply_sync_filter()
+        try:
+            ws = load_week_status(name)
+        except Exception:
+            ws = {}
+        self._calendar.set_week_status(ws)
+        self._sync_buttons()
+        self._start_watcher()
+
+    def _start_watcher(self):
+        """(Re)start watching the local folder of the profile being shown."""
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher.deleteLater()
+            self._watcher = None
+            self._scan_job = None
+        config = load_config(self._profile)
+        if not config.get("watch_local") or not config.get("local_path"):
+            return
+        self._watcher = LocalWatcher(self._profile, parent=self)
+        self._watcher.local_weeks_changed.connect(self._on_local_weeks_changed)
+        # a scan of a previous watcher of this profile would be joined otherwise
+        self._jobs.cancel(self._key("local_scan"))
+        self._scan_job = self._jobs.submit(
+            "local_scan", self._watcher.scan, key=self._key("local_scan"), lane="refresh",
+        )
+
+    def _on_local_scan_finished(self, job):
+        if job is not self._scan_job or self._watcher is None:
+            # the watcher was replaced while it scanned
+            return
+        self._scan_job = None
+        self._watcher.start()
+        complete = job.result
+        # bring the saved status in line with what is on disk right now
+        status = self._calendar._week_status
+        self._on_local_weeks_changed({
+            week: week in complete
+            for week in set(status) | complete
+            if bool(status.get(week, {}).get("local")) != (week in complete)
+        })
+
+    def _on_local_weeks_changed(self, changes: dict):
+        status = self._calendar._week_status
+        weeks = apply_local_changes(status, changes)
+        if not weeks:
+            return
+        self._calendar.update_weeks(weeks)
+        self._update_download_button(status)
+        try:
+            save_week_status(status, self._profile)
+        except Exception:
+            pass
+
+    def _sync_buttons(self):
+        """Bring the buttons in line with the jobs of the profile being shown."""
+        refreshing = self._jobs.is_active(self._key("refresh"))
+        self._refresh_btn.setEnabled(not refreshing)
+        self._refresh_btn.setText("Refreshing..." if refreshing else "Refresh")
+        verifying = self._jobs.is_active(self._key("verify"))
+        self._verify_btn.setEnabled(not verifying)
+        self._verify_btn.setText("Verifying..." if verifying else "Verify mirror")
+        if self._jobs.is_active(self._key("download")):
+            self._download_btn.setText("Cancel download")
+            self._download_btn.setEnabled(True)
+        elif self._jobs.is_active(self._key("plan")):
+            self._download_btn.setText("Planning...")
+            self._download_btn.setEnabled(False)
+        else:
+            self._update_download_button(self._calendar._week_status)
+        self._transfer_label.setVisible(False)
+        self._update_retry_button()
+
     def _start_refresh(self):
-        # disable UI while refreshing and run scan in background
+        # disable the refresh button while refreshing and run scan in background;
+        # a refresh requested while one is running joins the running one
         self._refresh_btn.setEnabled(False)
         self._refresh_btn.setText("Refreshing...")
         # snapshot the existing week status to detect changes after refresh
         old_status = dict(self._calendar._week_status)
-
-        def _worker(old_status=old_status):
-            try:
-                local_weeks = get_local_complete_weeks()
-                bucket_weeks = get_bucket_complete_weeks()
-                status = build_week_status(local_weeks, bucket_weeks)
-                # log whether refresh discovered new available weeks
-                from app.logger import logger
-                old_available = {k for k, v in old_status.items() if v.get("bucket") and not v.get("local")}
-                new_available = {k for k, v in status.items() if v.get("bucket") and not v.get("local")}
-                added = new_available - old_available
-                if added:
-                    logger.info("Refresh: new data found for %d weeks", len(added))
-                else:
-                    logger.info("Refresh: everything up to date")
-                # emit to UI thread
-                self.week_status_updated.emit(status)
-            except Exception as exc:
-                # forward as signal with empty status and schedule message box in main thread
-                self.week_status_updated.emit({})
-                QTimer.singleShot(0, lambda: QMessageBox.critical(self, "Refresh Failed", str(exc)))
-            finally:
-                # Re-enable button in main thread via emitted signal handler
-                pass
-
-        t = threading.Thread(target=_worker, daemon=True)
-        t.start()
+        self._jobs.submit("refresh", refresh_week_status, old_status, key=self._key("refresh"), profile=self._profile)
 
     def _on_week_status_updated(self, status: dict):
-        try:
+        with tracing.operation("apply_week_status", group=tracing.UI_GROUP, weeks=len(status)):
             # Update calendar and persist
             self._calendar.set_week_status(status)
             # update download availability
             self._update_download_button(status)
-            # reset download button label in case it was showing progress
-            self._download_btn.setText("Download new files")
             try:
-                save_week_status(status)
+                save_week_status(status, self._profile)
             except Exception:
                 # ignore persistence errors for now
                 pass
-        finally:
-            self._refresh_btn.setEnabled(True)
-            self._refresh_btn.setText("Refresh")
 
     def _update_download_button(self, status: dict):
-        # enable if any week has bucket=True and local=False
-        has = any(v.get("bucket") and not v.get("local") for v in status.values())
-        self._download_btn.setEnabled(bool(has))
+        # while a download runs the button is its cancel button
+        if self._jobs.is_active(self._key("download")) or self._jobs.is_active(self._key("plan")):
+            return
+        # enable if any week is missing or outdated locally or downloads are queued
+        has = any(needs_download(v) for v in status.values())
+        queued = len(get_download_queue(self._profile))
+        if queued:
+            self._download_btn.setText(f"Resume download ({queued} queued)")
+        else:
+            self._download_btn.setText("Download new files")
+        self._download_btn.setEnabled(bool(has or queued))
 
     def _on_download(self):
-        # Minimal download workflow placeholder: disable button and show message
+        # the download button doubles as a cancel button while a download runs
+        if self._jobs.is_active(self._key("download")):
+            self._jobs.cancel(self._key("download"))
+            self._download_btn.setEnabled(False)
+            self._download_btn.setText("Cancelling...")
+            return
+
+        if not any(needs_download(v) for v in self._calendar._week_status.values()):
+            # only objects queued earlier are left: no listing or plan needed
+            self._download_btn.setText("Cancel download")
+            priority = self._priority_weeks.setdefault(self._profile, set())
+            self._jobs.submit("download", resume_downloads, priority_weeks=priority, key=self._key("download"),
+                              profile=self._profile)
+            return
+
+        # show what would be transferred first; the download starts once confirmed
         self._download_btn.setEnabled(False)
-        self._download_btn.setText("Downloading...")
-        # disable refresh to avoid concurrent operations
-        self._refresh_btn.setEnabled(False)
+        self._download_btn.setText("Planning...")
+        self._jobs.submit("plan", plan_download, self._weeks_to_download(), key=self._key("plan"), profile=self._profile,
+                          keep_listing=True)
+
+    def _weeks_to_download(self) -> set:
+        return {k for k, v in self._calendar._week_status.items() if needs_download(v)}
+
+    def _confirm_plan(self, plan: dict):
+        if not plan["objects"]:
+            QMessageBox.information(self, "Download Plan", "Nothing to download, the mirror is up to date.")
+            self._update_download_button(self._calendar._week_status)
+            return
+        answer = QMessageBox.question(
+            self, "Download Plan", f"{format_plan(plan)}\n\nStart the download now?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes,
+        )
+        if answer == QMessageBox.Yes:
+            # reuse the plan's listing instead of listing the bucket again
+            self._start_download(plan.get("listing"))
+        else:
+            self._update_download_button(self._calendar._week_status)
+
+    def _start_download(self, listing: list | None = None):
+        self._download_btn.setText("Cancel download")
+        self._download_btn.setEnabled(True)
+        weeks_to_download = self._weeks_to_download()
+        # the set is shared with the job so weeks prioritised later still apply
+        priority = self._priority_weeks.setdefault(self._profile, set())
+        self._jobs.submit(
+            "download", download_weeks, weeks_to_download,
+            priority_weeks=priority, key=self._key("download"), profile=self._profile, listing=listing,
+        )
+
+    def _update_retry_button(self):
+        failed = len(get_failure_journal(self._profile))
+        busy = self._jobs.is_active(self._key("download"))
+        self._retry_btn.setText(f"Retry failed ({failed})" if failed else "Retry failed")
+        self._retry_btn.setEnabled(bool(failed) and not busy)
+
+    def _on_retry_failed(self):
+        self._retry_btn.setEnabled(False)
+        self._download_btn.setText("Cancel download")
+        self._download_btn.setEnabled(True)
+        # runs under the profile's download key so it never overlaps a regular download
+        self._jobs.submit("download", retry_failed, key=self._key("download"), profile=self._profile)
+
+    def _on_verify(self, mode: str):
+        self._verify_btn.setEnabled(False)
+        self._verify_btn.setText("Verifying...")
+        self._jobs.submit("verify", verify_local_mirror, mode, key=self._key("verify"), profile=self._profile)
+
+    def _show_verify_result(self, summary: dict):
+        label = "Quick check" if summary["mode"] == "quick" else "Full checksum"
+        msgs = [f"{label}: checked {summary['checked']} files, {summary['ok']} OK."]
+        if summary["missing"]:
+            msgs.append(f"Missing: {len(summary['missing'])}")
+        if summary["corrupt"]:
+            sample = "\n".join(f"{k}: {err}" for k, err in summary["corrupt"][:5])
+            msgs.append(f"Corrupt (moved to .quarantine): {len(summary['corrupt'])}\n{sample}")
+        if summary["requeued"]:
+            msgs.append(f"{summary['requeued']} files were queued for download again.")
+        QMessageBox.information(self, "Verify Result", "\n\n".join(msgs))
+
+    def _on_week_action(self, week: tuple, action: str):
+        queue = get_download_queue(self._profile)
+        priority = self._priority_weeks.setdefault(self._profile, set())
+        if action == "prioritize":
+            priority.add(week)
+            queue.prioritize_weeks({week})
+            if not self._jobs.is_active(self._key("download")):
+                self._on_download()
+        elif action == "cancel":
+            priority.discard(week)
+            removed = queue.cancel_week(week)
+            logger.info("Cancelled %d queued objects for %d-W%02d", removed, week[0], week[1])
+            if not self._jobs.is_active(self._key("download")):
+                self._update_download_button(self._calendar._week_status)
+
+    def _on_job_state_changed(self, job):
+        if self._job_profile(job) != self._profile:
+            # buttons only reflect the profile being shown
+            return
+        if job.kind == "refresh" and not job.active:
+            self._refresh_btn.setEnabled(True)
+            self._refresh_btn.setText("Refresh")
+        elif job.kind == "verify" and not job.active:
+            self._verify_btn.setEnabled(True)
+            self._verify_btn.setText("Verify mirror")
+        elif job.kind == "download" and not job.active:
+            self._transfer_label.setVisible(False)
+            self._update_retry_button()
+        elif job.kind == "download":
+            self._retry_btn.setEnabled(False)
+        if job.kind == "download" and job.state == JobState.CANCELLED:
+            # pick up whatever was downloaded before the cancellation
+            self._download_btn.setText("Download new files")
+            self._start_refresh()
 
-        # determine weeks to download
-        current_status = self._calendar._week_status
-        weeks_to_download = {k for k, v in current_status.items() if v.get("bucket") and not v.get("local")}
+    def _on_job_progress(self, job, payload: dict):
+        if job.kind == "download" and "bytes_done" in payload and self._job_profile(job) == self._profile:
+            self._transfer_label.setText(format_snapshot(payload))
+            self._transfer_label.setVisible(True)
+
+    def _on_job_finished(self, job):
+        profile = self._job_profile(job)
+        if profile != self._profile:
+            # finished in the background: keep its status for when it is shown again
+            if job.kind == "refresh":
+                save_week_status(job.result, profile)
+            elif job.kind == "download":
+                self._priority_weeks.pop(profile, None)
+                new_status, failures, downloaded = job.result
+                save_week_status(new_status, profile)
+                self._show_download_result(failures, downloaded, profile)
+            elif job.kind == "verify":
+                self._show_verify_result(job.result)
+            # a plan or local scan of a profile no longer shown is dropped
+            return
+
+        if job.kind == "refresh":
+            self.week_status_updated.emit(job.result)
+        elif job.kind == "plan":
+            self._confirm_plan(job.result)
+        elif job.kind == "local_scan":
+            self._on_local_scan_finished(job)
+        elif job.kind == "download":
+            self._priority_weeks.pop(profile, None)
+            new_status, failures, downloaded = job.result
+            self.week_status_updated.emit(new_status)
+            self._show_download_result(failures, downloaded)
+        elif job.kind == "verify":
+            self._show_verify_result(job.result)
+            if job.result["requeued"]:
+                self._start_refresh()
+
+    def _on_job_failed(self, job, message: str):
+        if job.kind == "local_scan":
+            # the calendar keeps the saved status; a refresh rescans the folder
+            logger.warning("Scanning the local folder failed, not watching it: %s", message)
+            return
+        if self._job_profile(job) != self._profile:
+            QMessageBox.critical(self, f"{job.kind.capitalize()} Failed ({self._job_profile(job)})", message)
+            return
+        if job.kind == "refresh":
+            self.week_status_updated.emit({})
+            QMessageBox.critical(self, "Refresh Failed", message)
+        elif job.kind == "verify":
+            QMessageBox.critical(self, "Verify Failed", message)
+        elif job.kind == "plan":
+            QMessageBox.critical(self, "Planning Failed", message)
+            self._update_download_button(self._calendar._week_status)
+        elif job.kind == "download":
+            QMessageBox.critical(self, "Download Failed", message)
+            # still refresh to update any partial changes
+            self._download_btn.setText("Download new files")
+            self._start_refresh()
 
-        def _worker():
-            try:
-                from app.sync import download_weeks
-
-                new_status, failures, downloaded = download_weeks(weeks_to_download)
-                # emit updated status
-                self.week_status_updated.emit(new_status)
-
-                # Inform user with details and show folder location for convenience
-                def _show_result():
-                    msgs = []
-                    if downloaded:
-                        msgs.append(f"Downloaded {len(downloaded)} files.")
-                        # show up to 5 file paths
-                        sample = "\n".join(downloaded[:5])
-                        msgs.append(f"Examples:\n{sample}")
-                        # show folder of first downloaded file
-                        first_folder = downloaded[0]
-                    else:
-                        msgs.append("No new files were downloaded (already present locally or nothing to download).")
-
-                    if failures:
-                        msgs.append(f"\nFailures: {len(failures)} files failed to download.")
-                        # include examples of failures (up to 5) to help diagnose permission issues
-                        sample_fail = "\n".join([f"{k}: {err}" for k, err in failures[:5]])
-                        msgs.append(f"Examples of failures:\n{sample_fail}")
-
-                    QMessageBox.information(self, "Download Result", "\n\n".join(msgs))
-
-                QTimer.singleShot(0, _show_result)
-            except Exception as exc:
-                # show error in main thread
-                QTimer.singleShot(0, lambda: QMessageBox.critical(self, "Download Failed", str(exc)))
-                # still emit refresh to update any partial changes
-                try:
-                    new_status = build_week_status(get_local_complete_weeks(), get_bucket_complete_weeks())
-                    self.week_status_updated.emit(new_status)
-                except Exception:
-                    self.week_status_updated.emit({})
-
-        t = threading.Thread(target=_worker, daemon=True)
-        t.start()
+    def _show_download_result(self, failures: list, downloaded: list, profile: str | None = None):
+        # Inform user with details and show folder location for convenience
+        msgs = []
+        if downloaded:
+            msgs.append(f"Downloaded {len(downloaded)} files.")
+            # show up to 5 file paths
+            sample = "\n".join(downloaded[:5])
+            msgs.append(f"Examples:\n{sample}")
+        else:
+            msgs.append("No new files were downloaded (already present locally or nothing to download).")
+
+        if failures:
+            msgs.append(f"\nFailures: {len(failures)} files failed to download.")
+            # include examples of failures (up to 5) to help diagnose permission issues
+            sample_fail = "\n".join([f"{k}: {err}" for k, err in failures[:5]])
+            msgs.append(f"Examples of failures:\n{sample_fail}")
+            msgs.append("Failed files were remembered; use \"Retry failed\" to fetch just those.")
+
+        title = f"Download Result ({profile})" if profile else "Download Result"
+        QMessageBox.information(self, title, "\n\n".join(msgs))
+
+    def closeEvent(self, event):
+        # ask running jobs to stop; worker threads exit at their next cancellation check
+        self._jobs.shutdown()
+        if self._watcher is not None:
+            self._watcher.stop()
+        super().closeEvent(event)
 
     def _open_settings(self):
-        dlg = ConfigDialog()
+        dlg = ConfigDialog(self._profile)
         if dlg.exec() == QDialog.Accepted:
+            # saving under a new name adds a profile and switches to it
+            if dlg.profile != self._profile:
+                self._profile = dlg.profile
+                set_active_profile(self._profile)
+                self._fill_profile_box()
+                self._calendar.set_week_status({})
+                self._sync_buttons()
             # config saved; refresh and re-evaluate download availability
+            tracing.configure(load_config(self._profile))
+            self._apply_sync_filter()
             try:
-                ws = load_week_status()
+                ws = load_week_status(self._profile)
                 if ws:
                     self._calendar.set_week_status(ws)
                     self._update_download_button(ws)
             except Exception:
                 pass
+            # the local folder or filter may have changed
+            self._start_watcher()
             # run a refresh to pick up new credentials / bucket
             self._start_refresh()
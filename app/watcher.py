@@ -0,0 +1,91 @@
+from pathlib import Path
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+from app.config import load_config
+from app.logger import logger
+from app.sync import LocalIndex
+from app.sync_filter import SyncFilter
+
+
+# Folder change notifications arriving within this many ms are handled together
+_DEBOUNCE_MS = 300
+
+
+class LocalWatcher(QObject):
+    """Watch the local mirror of a profile and report week-level changes.
+
+    The destination folder and its prefix folders are watched with
+    ``QFileSystemWatcher`` (inotify on Linux). A change notification re-reads
+    only the folder it names into a ``LocalIndex``, so files created,
+    deleted or renamed by other tools show up in the calendar without a
+    refresh. Changes are emitted as ``{(year, week): local}``. The initial
+    ``scan`` runs off the GUI thread, watching starts after it.
+    """
+
+    local_weeks_changed = Signal(object)
+
+    def __init__(self, profile: str | None = None, parent=None):
+        super().__init__(parent)
+        config = load_config(profile)
+        try:
+            flt = SyncFilter.from_config(config)
+        except ValueError:
+            flt = SyncFilter()
+        self._index = LocalIndex(Path(config["local_path"]), flt)
+        self._fs = QFileSystemWatcher(self)
+        self._fs.directoryChanged.connect(self._on_directory_changed)
+        self._dirty: set[str] = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(_DEBOUNCE_MS)
+        self._timer.timeout.connect(self._flush)
+
+    def scan(self, cancel_event=None, progress=None) -> set:
+        """Index the destination once; returns the complete weeks.
+
+        Reads every prefix folder, so it is meant to run as a background job
+        (it only touches the index); call ``start`` once it has finished.
+        """
+        return self._index.scan()
+
+    def start(self):
+        """Start watching the folders found by ``scan``."""
+        self._sync_paths()
+        logger.info("Watching %s (%d folders) for local changes", self._index.dest_path, len(self._index.prefixes()))
+
+    def stop(self):
+        self._timer.stop()
+        paths = self._fs.directories()
+        if paths:
+            self._fs.removePaths(paths)
+
+    def _sync_paths(self):
+        """Watch the root and exactly the prefix folders currently indexed."""
+        dest = self._index.dest_path
+        wanted = {str(dest / name) for name in self._index.prefixes()}
+        if dest.is_dir():
+            wanted.add(str(dest))
+        current = set(self._fs.directories())
+        if current - wanted:
+            self._fs.removePaths(list(current - wanted))
+        if wanted - current:
+            failed = self._fs.addPaths(sorted(wanted - current))
+            if failed:
+                logger.warning("Cannot watch %d folders (e.g. %s)", len(failed), failed[0])
+
+    def _on_directory_changed(self, path: str):
+        self._dirty.add(path)
+        self._timer.start()
+
+    def _flush(self):
+        dirty, self._dirty = self._dirty, set()
+        changes = {}
+        for path in sorted(dirty):
+            changes.update(self._index.folder_changed(Path(path)))
+        if any(Path(p) == self._index.dest_path for p in dirty):
+            # prefix folders were added or removed
+            self._sync_paths()
+        if changes:
+            logger.info("Local changes: %d weeks updated", len(changes))
+            self.local_weeks_changed.emit(changes)
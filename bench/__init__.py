@@ -0,0 +1 @@
+"""Offline benchmarks for ``app.sync`` (see ``python -m bench.run --help``)."""
@@ -0,0 +1,263 @@
+"""Localhost S3-compatible endpoint with rule-based fault injection.
+
+Serves a synthetic ``Keyspace`` (see ``bench.fake_s3``) over HTTP as
+ListObjectsV2 XML and GetObject bodies, so the real boto3 / botocore stack
+is exercised. Faults are described by ``FaultRule`` objects, e.g.
+``FaultRule.parse("get:reset:0.05")``:
+
+    latency=S     sleep S seconds before answering
+    throttle      503 SlowDown
+    error         500 InternalError
+    reset         send part of the body, then drop the connection (TCP RST)
+    truncate      send part of the body, then close the connection cleanly
+    corrupt       full-length body with one flipped byte (ETag unchanged)
+    page_error    500 on listing requests that carry a continuation token
+"""
+import fnmatch
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+from bench.fake_s3 import FakeS3, Keyspace
+
+FAULTS = ("latency", "throttle", "error", "reset", "truncate", "corrupt", "page_error")
+OPS = ("get", "list", "*")
+
+
+class FaultRule:
+    """Inject ``fault`` into ``op`` requests whose key (or listing prefix)
+    matches ``match``, with the given probability and at most ``times`` times.
+    """
+
+    def __init__(self, op: str, fault: str, probability: float = 1.0, value: float | None = None,
+                 match: str = "*", times: int | None = None):
+        if op not in OPS:
+            raise ValueError(f"Unknown operation '{op}', expected one of {', '.join(OPS)}")
+        if fault not in FAULTS:
+            raise ValueError(f"Unknown fault '{fault}', expected one of {', '.join(FAULTS)}")
+        self.op = op
+        self.fault = fault
+        self.probability = probability
+        self.value = value
+        self.match = match
+        self.times = times
+        self.hits = 0
+
+    @classmethod
+    def parse(cls, text: str) -> "FaultRule":
+        """``OP:FAULT[=VALUE][:PROBABILITY[:GLOB[:TIMES]]]``, e.g. ``get:latency=0.2:0.1:prefix_00*``."""
+        parts = text.split(":")
+        if len(parts) < 2:
+            raise ValueError(f"Invalid fault rule '{text}', expected OP:FAULT[:PROBABILITY[:GLOB[:TIMES]]]")
+        fault, _, value = parts[1].partition("=")
+        try:
+            return cls(
+                parts[0],
+                fault,
+                probability=float(parts[2]) if len(parts) > 2 and parts[2] else 1.0,
+                value=float(value) if value else None,
+                match=parts[3] if len(parts) > 3 and parts[3] else "*",
+                times=int(parts[4]) if len(parts) > 4 and parts[4] else None,
+            )
+        except ValueError as exc:
+            raise ValueError(f"Invalid fault rule '{text}': {exc}") from None
+
+    def __str__(self):
+        value = f"={self.value:g}" if self.value is not None else ""
+        return f"{self.op}:{self.fault}{value}:{self.probability:g}:{self.match}" + (f":{self.times}" if self.times else "")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeR2"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        path = unquote(url.path).lstrip("/")
+        bucket = self.server.bucket
+        # path style (/bucket/key) or virtual host style (bucket.host/key)
+        if path == bucket or path.startswith(bucket + "/"):
+            path = path[len(bucket) + 1:]
+
+        if not path and query.get("list-type") == "2":
+            self._list(query)
+        elif path:
+            self._get(path)
+        else:
+            self._error(400, "InvalidRequest", "Only ListObjectsV2 and GetObject are supported")
+
+    def do_HEAD(self):
+        self._error(405, "MethodNotAllowed", "HEAD is not supported")
+
+    def _send(self, status: int, body: bytes, headers: dict | None = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, code: str, message: str):
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f"<Error><Code>{code}</Code><Message>{escape(message)}</Message><RequestId>fake-r2</RequestId></Error>"
+        ).encode()
+        self._send(status, body, {"Content-Type": "application/xml"})
+
+    def _drop(self, hard: bool):
+        """Close the connection mid-response; ``hard`` sends a TCP RST."""
+        self.wfile.flush()
+        if hard:
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        else:
+            self.connection.shutdown(socket.SHUT_WR)
+        self.close_connection = True
+
+    def _list(self, query: dict):
+        prefix = query.get("prefix", "")
+        token = query.get("continuation-token")
+        faults = self.server.faults_for("list", prefix)
+        if "page_error" in faults and token:
+            return self._error(500, "InternalError", "Injected pagination failure")
+        if self._common_fault(faults):
+            return
+
+        page = self.server.backend.list_objects_v2(
+            Bucket=self.server.bucket,
+            Prefix=prefix,
+            Delimiter=query.get("delimiter") or None,
+            StartAfter=query.get("start-after", ""),
+            ContinuationToken=token,
+            MaxKeys=int(query.get("max-keys", 1000)),
+        )
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+            f"<Name>{self.server.bucket}</Name><Prefix>{escape(prefix)}</Prefix>",
+            f"<KeyCount>{page['KeyCount']}</KeyCount><MaxKeys>{query.get('max-keys', 1000)}</MaxKeys>",
+            f"<IsTruncated>{'true' if page['IsTruncated'] else 'false'}</IsTruncated>",
+        ]
+        if query.get("delimiter"):
+            parts.append(f"<Delimiter>{escape(query['delimiter'])}</Delimiter>")
+        if token:
+            parts.append(f"<ContinuationToken>{escape(token)}</ContinuationToken>")
+        if page.get("NextContinuationToken"):
+            parts.append(f"<NextContinuationToken>{escape(page['NextContinuationToken'])}</NextContinuationToken>")
+        for obj in page["Contents"]:
+            parts.append(
+                f"<Contents><Key>{escape(obj['Key'])}</Key>"
+                f"<LastModified>{obj['LastModified']:%Y-%m-%dT%H:%M:%S.000Z}</LastModified>"
+                f"<ETag>{escape(obj['ETag'])}</ETag><Size>{obj['Size']}</Size>"
+                "<StorageClass>STANDARD</StorageClass></Contents>"
+            )
+        for cp in page.get("CommonPrefixes", []):
+            parts.append(f"<CommonPrefixes><Prefix>{escape(cp['Prefix'])}</Prefix></CommonPrefixes>")
+        parts.append("</ListBucketResult>")
+        self._send_body("".join(parts).encode(), {"Content-Type": "application/xml"}, faults)
+
+    def _get(self, key: str):
+        if key not in self.server.keyspace.sizes:
+            return self._error(404, "NoSuchKey", "The specified key does not exist.")
+        faults = self.server.faults_for("get", key)
+        if self._common_fault(faults):
+            return
+
+        obj = self.server.backend.get_object(Bucket=self.server.bucket, Key=key)
+        body = obj["Body"].read()
+        if "corrupt" in faults:
+            mid = len(body) // 2
+            body = body[:mid] + bytes([body[mid] ^ 0xFF]) + body[mid + 1:]
+        self._send_body(body, {
+            "Content-Type": "application/octet-stream",
+            "ETag": obj["ETag"],
+            "Last-Modified": f"{obj['LastModified']:%a, %d %b %Y %H:%M:%S GMT}",
+        }, faults)
+
+    def _send_body(self, body: bytes, headers: dict, faults: dict):
+        """Send a 200 response, cut short by a reset / truncate fault."""
+        if "reset" not in faults and "truncate" not in faults:
+            return self._send(200, body, headers)
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[: random.randint(0, max(0, len(body) - 1))])
+        self._drop(hard="reset" in faults)
+
+    def _common_fault(self, faults: dict) -> bool:
+        """Apply latency / throttle / error; True when the response was sent."""
+        if "latency" in faults:
+            time.sleep(faults["latency"] or 0.0)
+        if "throttle" in faults:
+            self._error(503, "SlowDown", "Please reduce your request rate.")
+            return True
+        if "error" in faults:
+            self._error(500, "InternalError", "Injected server error")
+            return True
+        return False
+
+
+class FakeR2(ThreadingHTTPServer):
+    """Fake R2 endpoint on ``127.0.0.1:port`` (0 picks a free port).
+
+    Use as a context manager; ``endpoint`` is the URL to configure. Hit
+    counts per rule are kept on the rules themselves, request counts on
+    ``backend.requests``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, keyspace: Keyspace, rules: list | None = None, bucket: str = "bench",
+                 port: int = 0, seed: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.keyspace = keyspace
+        self.backend = FakeS3(keyspace)
+        self.bucket = bucket
+        self.rules = list(rules or [])
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def faults_for(self, op: str, name: str) -> dict:
+        """Faults (name -> value) that fire for this request."""
+        fired = {}
+        with self._lock:
+            for rule in self.rules:
+                if rule.op not in (op, "*") or not fnmatch.fnmatchcase(name, rule.match):
+                    continue
+                if rule.times is not None and rule.hits >= rule.times:
+                    continue
+                if self._rng.random() >= rule.probability:
+                    continue
+                rule.hits += 1
+                fired[rule.fault] = rule.value
+        return fired
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-r2", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
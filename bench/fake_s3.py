@@ -0,0 +1,189 @@
+"""In-process stand-in for the parts of the boto3 S3 client used by ``app.sync``.
+
+Objects are synthetic: only their keys and sizes are stored, bodies are
+generated on demand as minimal valid parquet files (header/footer magic), so
+keyspaces of a million objects fit in memory. ``latency`` is added to every
+request and ``bandwidth`` (bytes/s per stream) throttles object bodies.
+"""
+import hashlib
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+PARQUET_MAGIC = b"PAR1"
+
+# Body chunks are generated per size; keep the distinct sizes bounded
+_SIZE_STEP = 1024
+_MIN_SIZE = 16
+
+
+class Keyspace:
+    """Sorted synthetic keys ``<prefix>/YYYYWww_NNN.parquet`` with their sizes.
+
+    ``objects`` are spread evenly over ``prefixes`` folders, ``files_per_week``
+    files per prefix and week, weeks counting up from ``start_year``. Sizes
+    are drawn from ``size`` = (min, max) bytes with a fixed seed so every run
+    sees the same keyspace.
+    """
+
+    def __init__(self, objects: int, prefixes: int = 20, files_per_week: int = 10,
+                 size: tuple = (64 * 1024, 64 * 1024), start_year: int = 2000, seed: int = 0):
+        self.objects = objects
+        self.prefixes = [f"prefix_{i:03d}" for i in range(prefixes)]
+        self.files_per_week = files_per_week
+        rng = random.Random(seed)
+        per_prefix = -(-objects // prefixes)
+
+        entries = []
+        for prefix in self.prefixes:
+            for i in range(per_prefix):
+                if len(entries) >= objects:
+                    break
+                week_index, n = divmod(i, files_per_week)
+                year, week = start_year + week_index // 52, week_index % 52 + 1
+                sz = rng.randint(size[0], size[1]) // _SIZE_STEP * _SIZE_STEP
+                entries.append((f"{prefix}/{year}W{week:02d}_{n:03d}.parquet", max(sz, _MIN_SIZE)))
+        entries.sort()
+        self.keys = [k for k, _ in entries]
+        self.sizes = dict(entries)
+
+    def weeks(self) -> list:
+        """All (year, week) tuples of the keyspace, oldest first."""
+        weeks = set()
+        for key in self.keys:
+            stem = key.split("/", 1)[1]
+            weeks.add((int(stem[:4]), int(stem[5:7])))
+        return sorted(weeks)
+
+
+class _Body:
+    def __init__(self, data: bytes, bandwidth: float | None):
+        self._data = data
+        self._bandwidth = bandwidth
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        view = memoryview(self._data)
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            if self._bandwidth:
+                time.sleep(len(chunk) / self._bandwidth)
+            yield bytes(chunk)
+
+    def read(self) -> bytes:
+        return self._data
+
+    def close(self):
+        pass
+
+
+class _Paginator:
+    def __init__(self, client):
+        self._client = client
+
+    def paginate(self, **kwargs):
+        while True:
+            page = self._client.list_objects_v2(**kwargs)
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+class FakeS3:
+    """Implements ``list_objects_v2`` (Prefix, Delimiter, StartAfter,
+    ContinuationToken, MaxKeys), its paginator and ``get_object``.
+
+    Request counts are kept in ``requests`` ({"list": n, "get": n}).
+    """
+
+    last_modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def __init__(self, keyspace: Keyspace, latency: float = 0.0, bandwidth: float | None = None):
+        self.keyspace = keyspace
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = {"list": 0, "get": 0}
+        self._bodies: dict[int, tuple] = {}
+        self._lock = threading.Lock()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = {"list": 0, "get": 0}
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _body(self, size: int) -> tuple:
+        """(bytes, etag) of the synthetic parquet file of ``size`` bytes."""
+        with self._lock:
+            cached = self._bodies.get(size)
+        if cached is None:
+            # header magic, zero-filled footer, 4-byte footer length, footer magic
+            data = PARQUET_MAGIC + bytes(size - 12) + (size - 12).to_bytes(4, "little") + PARQUET_MAGIC
+            cached = (data, hashlib.md5(data).hexdigest())
+            with self._lock:
+                self._bodies[size] = cached
+        return cached
+
+    def etag(self, size: int) -> str:
+        """MD5 of the synthetic body of ``size`` bytes, as served in ``ETag``."""
+        return self._body(size)[1]
+
+    def _entry(self, key: str) -> dict:
+        size = self.keyspace.sizes[key]
+        return {"Key": key, "Size": size, "ETag": f'"{self._body(size)[1]}"', "LastModified": self.last_modified}
+
+    def get_paginator(self, name: str):
+        if name != "list_objects_v2":
+            raise NotImplementedError(name)
+        return _Paginator(self)
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", Delimiter: str | None = None, StartAfter: str = "",
+                        ContinuationToken: str | None = None, MaxKeys: int = 1000, **kwargs) -> dict:
+        self._count("list")
+        keys = self.keyspace.keys
+        after = max(StartAfter or "", ContinuationToken or "")
+        i = max(bisect_left(keys, Prefix), bisect_right(keys, after) if after else 0)
+
+        contents, common = [], []
+        token = None
+        while i < len(keys) and len(contents) + len(common) < MaxKeys:
+            key = keys[i]
+            if not key.startswith(Prefix):
+                break
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                cp = Prefix + rest.split(Delimiter, 1)[0] + Delimiter
+                common.append({"Prefix": cp})
+                # skip every key below this common prefix; resuming after
+                # this bound continues with the next key outside it
+                token = cp[:-1] + chr(ord(Delimiter) + 1)
+                i = bisect_left(keys, token, i)
+                continue
+            contents.append(self._entry(key))
+            token = key
+            i += 1
+
+        truncated = i < len(keys) and keys[i].startswith(Prefix)
+        page = {"Contents": contents, "KeyCount": len(contents) + len(common), "IsTruncated": truncated}
+        if common:
+            page["CommonPrefixes"] = common
+        if truncated:
+            page["NextContinuationToken"] = token
+        return page
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self._count("get")
+        size = self.keyspace.sizes[Key]
+        data, etag = self._body(size)
+        return {
+            "Body": _Body(data, self.bandwidth),
+            "ContentLength": size,
+            "ETag": f'"{etag}"',
+            "LastModified": self.last_modified,
+        }
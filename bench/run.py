@@ -0,0 +1,257 @@
+"""Benchmark refresh and download against an in-process S3 stand-in.
+
+    python -m bench.run [--keyspaces 10k,100k,1m] [--latency 0.02] [--compare OLD.json]
+
+For every keyspace a synthetic bucket (see ``bench.fake_s3``) is generated
+and a local mirror is seeded for the oldest ``--local-fraction`` of weeks
+(sparse files of the right size). Then ``get_bucket_complete_weeks``,
+``get_local_complete_weeks``, ``build_week_status`` and ``download_weeks``
+(the newest ``--download-weeks`` weeks, end to end) are timed. Everything
+runs in a temporary app data folder, so the real configuration is never
+touched. Results are written as JSON; ``--compare`` prints the change
+against an earlier result file.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+from bench.fake_s3 import FakeS3, Keyspace
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def parse_count(text: str) -> int:
+    """"10k" -> 10000, "1m" -> 1000000."""
+    text = text.strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def parse_bytes(text: str) -> int:
+    """"64k" -> 65536, "1m" -> 1048576."""
+    text = text.strip().lower()
+    factor = {"k": 1024, "m": 1024 * 1024}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def parse_size_range(text: str) -> tuple:
+    """"64k" or "16k-1m" -> (min, max) bytes."""
+    lo, _, hi = text.partition("-")
+    lo = parse_bytes(lo)
+    return lo, max(lo, parse_bytes(hi)) if hi else lo
+
+
+def _timed(fn, repeat: int) -> tuple:
+    """Run ``fn`` ``repeat`` times; returns (last result, timing dict)."""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - started)
+    return result, {
+        "seconds": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "runs": [round(r, 6) for r in runs],
+    }
+
+
+def _seed_local(keyspace: Keyspace, dest: Path, weeks: set) -> int:
+    count = 0
+    for key in keyspace.keys:
+        prefix, filename = key.split("/", 1)
+        if (int(filename[:4]), int(filename[5:7])) not in weeks:
+            continue
+        path = dest / prefix / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.truncate(keyspace.sizes[key])
+        count += 1
+    return count
+
+
+def run_keyspace(label: str, args, workdir: Path, overrides: dict) -> dict:
+    from app import sync
+    from app.config import save_config
+
+    keyspace = Keyspace(
+        parse_count(label),
+        prefixes=args.prefixes,
+        files_per_week=args.files_per_week,
+        size=parse_size_range(args.size),
+    )
+    client = FakeS3(keyspace, latency=args.latency, bandwidth=parse_bytes(args.bandwidth) if args.bandwidth else None)
+    weeks = keyspace.weeks()
+    local_weeks = set(weeks[: int(len(weeks) * args.local_fraction)])
+    download = set(weeks[-args.download_weeks:]) if args.download_weeks else set()
+
+    dest = workdir / f"mirror-{label}"
+    dest.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    seeded = _seed_local(keyspace, dest, local_weeks)
+    print(f"[{label}] {keyspace.objects} objects, {len(weeks)} weeks, "
+          f"seeded {seeded} local files in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    profile = f"bench-{label}"
+    save_config({
+        "endpoint": "http://bench.invalid",
+        "access_key": "bench",
+        "secret_key": "bench",
+        "bucket": "bench",
+        "local_path": str(dest),
+        "use_bucket_manifest": False,
+        # identical synthetic bodies would all be served from the cache
+        "object_cache": False,
+        **overrides,
+    }, profile)
+
+    result = {
+        "keyspace": label,
+        "objects": keyspace.objects,
+        "prefixes": args.prefixes,
+        "weeks": len(weeks),
+        "local_files": seeded,
+    }
+    with mock.patch.object(sync, "get_s3_client", return_value=client):
+        client.reset_counters()
+        bucket_weeks, timing = _timed(lambda: sync.get_bucket_complete_weeks(profile=profile), args.repeat)
+        result["get_bucket_complete_weeks"] = {
+            **timing,
+            "weeks": len(bucket_weeks),
+            "list_requests": client.requests["list"] // args.repeat,
+        }
+        print(f"[{label}] get_bucket_complete_weeks {timing['seconds']:.3f}s", file=sys.stderr)
+
+        local, timing = _timed(lambda: sync.get_local_complete_weeks(profile), args.repeat)
+        result["get_local_complete_weeks"] = {**timing, "weeks": len(local)}
+        print(f"[{label}] get_local_complete_weeks {timing['seconds']:.3f}s", file=sys.stderr)
+
+        _, timing = _timed(lambda: sync.build_week_status(local, bucket_weeks), max(args.repeat, 5))
+        result["build_week_status"] = timing
+
+        if download:
+            client.reset_counters()
+            started = time.perf_counter()
+            _, failures, downloaded = sync.download_weeks(download, profile=profile)
+            seconds = time.perf_counter() - started
+            size = sum(Path(p).stat().st_size for p in downloaded)
+            result["download_weeks"] = {
+                "seconds": round(seconds, 6),
+                "weeks": len(download),
+                "files": len(downloaded),
+                "failed": len(failures),
+                "bytes": size,
+                "throughput": round(size / seconds, 1) if seconds > 0 else None,
+                "list_requests": client.requests["list"],
+                "get_requests": client.requests["get"],
+            }
+            print(f"[{label}] download_weeks {seconds:.3f}s, {len(downloaded)} files", file=sys.stderr)
+    return result
+
+
+def compare(old: dict, new: dict):
+    """Print timings of ``new`` next to ``old`` for keyspaces present in both."""
+    before = {r["keyspace"]: r for r in old.get("results", [])}
+    for res in new["results"]:
+        prev = before.get(res["keyspace"])
+        if prev is None:
+            continue
+        for name, metrics in res.items():
+            if not isinstance(metrics, dict) or name not in prev:
+                continue
+            a, b = prev[name]["seconds"], metrics["seconds"]
+            change = f"{(b - a) / a:+.1%}" if a else "n/a"
+            print(f"{res['keyspace']:>6} {name:<28} {a:10.4f}s -> {b:10.4f}s  {change}")
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--keyspaces", default="10k,100k,1m", help="comma separated object counts (default 10k,100k,1m)")
+    parser.add_argument("--prefixes", type=int, default=20, help="top-level prefixes per keyspace (default 20)")
+    parser.add_argument("--files-per-week", type=int, default=10, help="objects per prefix and week (default 10)")
+    parser.add_argument("--size", default="64k", help="object size or range, e.g. 64k or 16k-1m (default 64k)")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every request (default 0.02)")
+    parser.add_argument("--bandwidth", help="per-stream body bandwidth, e.g. 10m (bytes/s; default unlimited)")
+    parser.add_argument("--local-fraction", type=float, default=0.25,
+                        help="share of (oldest) weeks present locally (default 0.25)")
+    parser.add_argument("--download-weeks", type=int, default=2, help="newest weeks to download, 0 to skip (default 2)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per read-only measurement (default 3)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="config override, value parsed as JSON (e.g. download_workers_max=32)")
+    parser.add_argument("--output", help=f"result file (default {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary mirror and app data")
+    parser.add_argument("--verbose", action="store_true", help="show the app log on stderr")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    overrides = {}
+    for item in args.set:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--set expects KEY=VALUE, got '{item}'")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+
+    workdir = Path(tempfile.mkdtemp(prefix="sa_r2_bench_"))
+    # the app reads its data folder from the environment; import it only now
+    os.environ.pop("APPDATA", None)
+    os.environ["XDG_CONFIG_HOME"] = str(workdir / "appdata")
+    from app.logger import set_console_level
+
+    if not args.verbose:
+        set_console_level(logging.WARNING)
+
+    started = datetime.now(timezone.utc)
+    report = {
+        "started": started.isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep", "verbose")},
+        "results": [],
+    }
+    try:
+        for label in (k.strip() for k in args.keyspaces.split(",") if k.strip()):
+            report["results"].append(run_keyspace(label, args, workdir, overrides))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{started:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
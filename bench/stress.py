@@ -0,0 +1,284 @@
+"""Stress the sync engine against a fault-injecting fake R2 endpoint.
+
+    python -m bench.stress [--objects 5k] [--profiles 2] [--fault get:reset:0.05 ...] [--baseline]
+
+Starts ``bench.fake_r2`` on localhost and, for every profile, runs a full
+download while refreshes run concurrently, through the real boto3 client.
+Rounds are repeated (retrying the failure journal) until the mirror is
+complete or ``--rounds`` is reached. Afterwards every mirror is checked:
+no ``.part`` files, no file whose size or MD5 differs from the bucket, and
+no missing objects. Without ``--fault`` a mixed default fault set is used;
+``--baseline`` first runs once without faults to compare throughput.
+Exits 1 if a check fails. Results are written as JSON.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from bench.fake_r2 import FakeR2, FaultRule
+from bench.fake_s3 import Keyspace
+from bench.run import RESULTS_DIR, parse_count, parse_size_range
+
+DEFAULT_FAULTS = (
+    "*:latency=0.01:0.2",
+    "*:throttle:0.03",
+    "get:error:0.02",
+    "get:reset:0.03",
+    "get:truncate:0.03",
+    "get:corrupt:0.02",
+    "list:page_error:0.05",
+)
+
+
+def check_mirror(keyspace: Keyspace, dest: Path, expected_etags: dict) -> dict:
+    """Compare ``dest`` with the bucket; dot-folders (quarantine, leases) are ignored."""
+    part_files, corrupt, unknown = [], [], []
+    present = set()
+    for folder in dest.iterdir():
+        if not folder.is_dir() or folder.name.startswith("."):
+            continue
+        for path in folder.rglob("*"):
+            if not path.is_file():
+                continue
+            if path.name.endswith(".part"):
+                part_files.append(str(path))
+                continue
+            key = f"{folder.name}/{path.relative_to(folder).as_posix()}"
+            if key not in keyspace.sizes:
+                unknown.append(key)
+                continue
+            present.add(key)
+            size = keyspace.sizes[key]
+            data = path.read_bytes()
+            if len(data) != size or hashlib.md5(data).hexdigest() != expected_etags[size]:
+                corrupt.append(key)
+    quarantine = dest / ".quarantine"
+    return {
+        "part_files": part_files,
+        "corrupt": corrupt,
+        "unknown": unknown,
+        "missing": len(keyspace.sizes) - len(present),
+        "quarantined": sum(1 for p in quarantine.rglob("*") if p.is_file()) if quarantine.exists() else 0,
+    }
+
+
+def _sync_profile(profile: str, rounds: int, refreshes: threading.Event, errors: list) -> dict:
+    """Download until nothing fails or ``rounds`` is reached; refresh concurrently."""
+    from app.sync import download_weeks, refresh_week_status, retry_failed, save_week_status
+
+    stop = threading.Event()
+    refresh_count = 0
+
+    def _refresh_loop():
+        nonlocal refresh_count
+        while not stop.is_set():
+            try:
+                save_week_status(refresh_week_status(profile=profile), profile)
+                refresh_count += 1
+            except Exception as exc:
+                # listing failures that survive all retries are expected under faults
+                errors.append(f"refresh {profile}: {type(exc).__name__}: {exc}")
+            stop.wait(0.2)
+
+    refresher = threading.Thread(target=_refresh_loop, name=f"refresh-{profile}", daemon=True)
+    if refreshes.is_set():
+        refresher.start()
+
+    started = time.perf_counter()
+    history = []
+    downloaded = 0
+    size = 0
+    try:
+        complete = False
+        for n in range(rounds):
+            # the first round lists and downloads everything, later ones only
+            # retry the failure journal unless the listing itself failed
+            run = retry_failed if complete else download_weeks
+            try:
+                if run is download_weeks:
+                    _, failures, files = download_weeks(None, profile=profile)
+                else:
+                    _, failures, files = retry_failed(profile=profile)
+            except Exception as exc:
+                errors.append(f"{run.__name__} {profile}: {type(exc).__name__}: {exc}")
+                history.append({"round": n + 1, "error": str(exc)})
+                continue
+            complete = True
+            downloaded += len(files)
+            size += sum(Path(f).stat().st_size for f in files if Path(f).exists())
+            history.append({"round": n + 1, "downloaded": len(files), "failed": len(failures)})
+            if not failures:
+                break
+    finally:
+        stop.set()
+        if refresher.is_alive():
+            refresher.join()
+    seconds = time.perf_counter() - started
+    return {
+        "profile": profile,
+        "seconds": round(seconds, 3),
+        "downloaded": downloaded,
+        "bytes": size,
+        "throughput": round(size / seconds, 1) if seconds > 0 else None,
+        "refreshes": refresh_count,
+        "rounds": history,
+    }
+
+
+def run_scenario(name: str, args, workdir: Path, keyspace: Keyspace, rules: list) -> dict:
+    from app.config import save_config
+
+    errors = []
+    refreshes = threading.Event()
+    if not args.no_refresh:
+        refreshes.set()
+
+    with FakeR2(keyspace, rules, seed=args.seed) as server:
+        profiles = []
+        for i in range(args.profiles):
+            profile = f"{name}-{i + 1}"
+            dest = workdir / profile
+            dest.mkdir(parents=True)
+            save_config({
+                "endpoint": server.endpoint,
+                "access_key": "stress",
+                "secret_key": "stress",
+                "bucket": server.bucket,
+                "local_path": str(dest),
+                "use_bucket_manifest": False,
+                "object_cache": False,
+                "retry_base_delay": 0.05,
+                "retry_max_delay": 1.0,
+            }, profile)
+            profiles.append(profile)
+
+        started = time.perf_counter()
+        results = [None] * len(profiles)
+
+        def _run(i):
+            results[i] = _sync_profile(profiles[i], args.rounds, refreshes, errors)
+
+        threads = [threading.Thread(target=_run, args=(i,), name=f"stress-{p}") for i, p in enumerate(profiles)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        seconds = time.perf_counter() - started
+
+        expected = {size: server.backend.etag(size) for size in set(keyspace.sizes.values())}
+        checks = {}
+        for profile in profiles:
+            checks[profile] = check_mirror(keyspace, workdir / profile, expected)
+
+        total = sum(r["bytes"] for r in results)
+        return {
+            "scenario": name,
+            "faults": [str(r) for r in rules],
+            "fault_hits": {str(r): r.hits for r in rules},
+            "requests": dict(server.backend.requests),
+            "seconds": round(seconds, 3),
+            "bytes": total,
+            "throughput": round(total / seconds, 1) if seconds > 0 else None,
+            "profiles": results,
+            "checks": checks,
+            "errors": errors[:50],
+            "error_count": len(errors),
+        }
+
+
+def _violations(result: dict) -> list:
+    problems = []
+    for profile, check in result["checks"].items():
+        if check["part_files"]:
+            problems.append(f"{profile}: {len(check['part_files'])} .part files left")
+        if check["corrupt"]:
+            problems.append(f"{profile}: {len(check['corrupt'])} corrupt files")
+        if check["unknown"]:
+            problems.append(f"{profile}: {len(check['unknown'])} files not in the bucket")
+        if check["missing"]:
+            problems.append(f"{profile}: {check['missing']} objects missing")
+    return problems
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m bench.stress", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--objects", default="5k", help="objects in the fake bucket (default 5k)")
+    parser.add_argument("--prefixes", type=int, default=10, help="top-level prefixes (default 10)")
+    parser.add_argument("--files-per-week", type=int, default=5, help="objects per prefix and week (default 5)")
+    parser.add_argument("--size", default="8k-64k", help="object size or range (default 8k-64k)")
+    parser.add_argument("--profiles", type=int, default=2, help="profiles syncing concurrently (default 2)")
+    parser.add_argument("--rounds", type=int, default=5, help="download + retry rounds per profile (default 5)")
+    parser.add_argument("--fault", action="append", default=[], metavar="RULE",
+                        help="OP:FAULT[=VALUE][:PROBABILITY[:GLOB[:TIMES]]], repeatable (see bench.fake_r2)")
+    parser.add_argument("--baseline", action="store_true", help="run once without faults first")
+    parser.add_argument("--no-refresh", action="store_true", help="do not refresh concurrently with downloads")
+    parser.add_argument("--seed", type=int, default=0, help="seed for fault decisions (default 0)")
+    parser.add_argument("--output", help=f"result file (default {RESULTS_DIR}/stress-<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary mirrors and app data")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        rules = [FaultRule.parse(text) for text in (args.fault or DEFAULT_FAULTS)]
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    workdir = Path(tempfile.mkdtemp(prefix="sa_r2_stress_"))
+    # the app reads its data folder from the environment; import it only now
+    os.environ.pop("APPDATA", None)
+    os.environ["XDG_CONFIG_HOME"] = str(workdir / "appdata")
+    import logging
+    from app.logger import set_console_level
+
+    set_console_level(logging.ERROR)
+
+    keyspace = Keyspace(parse_count(args.objects), prefixes=args.prefixes,
+                        files_per_week=args.files_per_week, size=parse_size_range(args.size))
+    started = datetime.now(timezone.utc)
+    report = {"started": started.isoformat(timespec="seconds"), "objects": keyspace.objects, "scenarios": []}
+    try:
+        if args.baseline:
+            report["scenarios"].append(run_scenario("baseline", args, workdir, keyspace, []))
+        report["scenarios"].append(run_scenario("faults", args, workdir, keyspace, rules))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    problems = []
+    for result in report["scenarios"]:
+        found = _violations(result)
+        problems += [f"{result['scenario']}: {p}" for p in found]
+        print(f"{result['scenario']:>8}: {result['bytes'] / 1e6:.1f} MB in {result['seconds']:.1f}s "
+              f"({result['throughput'] / 1e6:.2f} MB/s), {result['error_count']} errors, "
+              f"{'OK' if not found else 'FAILED'}", file=sys.stderr)
+        if result["fault_hits"]:
+            print("          " + ", ".join(f"{k}: {v}" for k, v in result["fault_hits"].items()), file=sys.stderr)
+    if args.baseline:
+        base, faulty = report["scenarios"][0]["throughput"], report["scenarios"][-1]["throughput"]
+        if base and faulty:
+            report["throughput_ratio"] = round(faulty / base, 3)
+            print(f"throughput under faults: {faulty / base:.0%} of baseline", file=sys.stderr)
+    report["problems"] = problems
+    for problem in problems:
+        print(f"PROBLEM {problem}", file=sys.stderr)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"stress-{started:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
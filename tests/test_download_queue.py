@@ -0,0 +1,42 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.download_queue import DownloadQueue
+
+
+def entry(key: str, week: int) -> dict:
+    return {"key": key, "prefix": "p", "filename": key, "year": 2024, "week": week, "size": 1, "etag": "e"}
+
+
+class CancelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "download_queue.json"
+        self.queue = DownloadQueue(self.path)
+        self.queue.add([entry("a", 1), entry("b", 2)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cancelled_week_is_not_queued_again(self):
+        self.assertEqual(self.queue.cancel_week((2024, 1)), 1)
+        self.assertEqual(self.queue.add([entry("a", 1)]), 0)
+        self.assertEqual(self.queue.cancelled(), {"a"})
+        self.assertEqual([i["key"] for i in self.queue.pending()], ["b"])
+
+    def test_cancel_survives_restart(self):
+        self.queue.cancel_week((2024, 1))
+        queue = DownloadQueue(self.path)
+        self.assertEqual(queue.cancelled(), {"a"})
+        self.assertEqual(len(queue), 1)
+
+    def test_prioritizing_queues_cancelled_week_again(self):
+        self.queue.cancel_week((2024, 1))
+        self.assertEqual(self.queue.prioritize_weeks({(2024, 1)}), 1)
+        self.assertEqual(self.queue.pop_next()["key"], "a")
+        self.assertEqual(self.queue.cancelled(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.integrity import EtagHasher, check_parquet_footer
+from bench.fake_s3 import FakeS3, Keyspace
+
+MB = 1024 * 1024
+
+
+def multipart_etag(data: bytes, part_size: int) -> str:
+    digests = [hashlib.md5(data[i:i + part_size]).digest() for i in range(0, len(data), part_size)]
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def stream(hasher: EtagHasher, data: bytes, chunk: int = 256 * 1024) -> EtagHasher:
+    for i in range(0, len(data), chunk):
+        hasher.update(data[i:i + chunk])
+    return hasher
+
+
+class EtagHasherTest(unittest.TestCase):
+    def setUp(self):
+        # 9 MiB has 2 parts with 5 MiB (rclone) and with 8 MiB (AWS CLI, boto3) chunks
+        self.data = os.urandom(9 * MB)
+
+    def test_ambiguous_part_size_matches_any_candidate(self):
+        for part_size in (5 * MB, 8 * MB):
+            etag = multipart_etag(self.data, part_size)
+            hasher = stream(EtagHasher(etag, len(self.data)), self.data)
+            self.assertIsNone(hasher.check(), part_size)
+            self.assertTrue(hasher.verifiable)
+            self.assertEqual(hasher.hexdigest(), etag)
+
+    def test_corrupt_multipart_object_is_detected(self):
+        data = os.urandom(20 * MB)
+        etag = multipart_etag(data, 8 * MB)
+        corrupt = data[:100] + bytes([data[100] ^ 0xFF]) + data[101:]
+        hasher = stream(EtagHasher(etag, len(corrupt)), corrupt)
+        self.assertIn("checksum mismatch", hasher.check())
+        self.assertTrue(hasher.verifiable)
+
+    def test_known_part_size_is_used(self):
+        etag = multipart_etag(self.data, 3 * MB)
+        hasher = stream(EtagHasher(etag, len(self.data), part_size=3 * MB), self.data)
+        self.assertIsNone(hasher.check())
+        self.assertEqual(hasher.part_size, 3 * MB)
+
+    def test_no_part_size_fits_part_count_checks_size_only(self):
+        digest = multipart_etag(self.data, 5 * MB).partition("-")[0]
+        hasher = stream(EtagHasher(f"{digest}-50", len(self.data)), self.data)
+        self.assertIsNone(hasher.check())
+        self.assertFalse(hasher.verifiable)
+
+    def test_size_mismatch(self):
+        etag = multipart_etag(self.data, 5 * MB)
+        hasher = stream(EtagHasher(etag, len(self.data)), self.data[:-1])
+        self.assertIn("size mismatch", hasher.check())
+
+    def test_single_part_mismatch(self):
+        data = self.data[:MB]
+        hasher = stream(EtagHasher(hashlib.md5(data).hexdigest(), len(data)), b"x" + data[1:])
+        self.assertIn("checksum mismatch", hasher.check())
+
+
+class ParquetFooterTest(unittest.TestCase):
+    def test_fake_s3_bodies_pass_footer_check(self):
+        s3 = FakeS3(Keyspace(1, prefixes=1))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "x.parquet"
+            for size in (16, 64 * 1024):
+                data = s3._body(size)[0]
+                path.write_bytes(data)
+                self.assertIsNone(check_parquet_footer(path, size))
+                path.write_bytes(data[:-1])
+                self.assertIsNotNone(check_parquet_footer(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
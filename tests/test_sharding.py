@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.sharding import LeaseManager, week_slice
+
+
+class WeekSliceTest(unittest.TestCase):
+    def test_slices_are_contiguous_and_open_ended(self):
+        slices = [week_slice((2023, 50), (2024, 10), k, 3) for k in (1, 2, 3)]
+        self.assertIsNone(slices[0][0])
+        self.assertIsNone(slices[-1][1])
+        for (_, hi), (lo, _) in zip(slices, slices[1:]):
+            self.assertEqual(hi, lo)
+        self.assertEqual([s[1] for s in slices[:2]], [(2024, 2), (2024, 6)])
+
+    def test_more_shards_than_weeks(self):
+        slices = [week_slice((2024, 5), (2024, 5), k, 4) for k in (1, 2, 3, 4)]
+        self.assertEqual(slices[0], (None, (2024, 5)))
+        self.assertEqual(slices[1], ((2024, 5), (2024, 5)))
+        self.assertEqual(slices[3], ((2024, 5), None))
+
+
+class LeaseTakeoverTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name)
+        self.a = LeaseManager(self.dest, ttl=60, owner="a")
+        self.b = LeaseManager(self.dest, ttl=60, owner="b")
+        self.dead = LeaseManager(self.dest, ttl=60, owner="dead")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def expire(self, key):
+        old = time.time() - 120
+        os.utime(self.dead._path(key), (old, old))
+
+    def owner(self, key):
+        return json.loads(self.a._path(key).read_text(encoding="utf-8"))["owner"]
+
+    def test_expired_lease_is_taken_over(self):
+        self.assertTrue(self.dead.acquire("k"))
+        self.assertFalse(self.a.acquire("k"))
+        self.expire("k")
+        self.assertTrue(self.a.acquire("k"))
+        self.assertEqual(self.owner("k"), "a")
+
+    def test_takeover_race_has_one_winner(self):
+        self.assertTrue(self.dead.acquire("k"))
+        self.expire("k")
+        read = self.b._read
+
+        def read_then_lose_race(path):
+            seen = read(path)
+            # "a" takes the stale lease over between b's check and b's rename
+            if path == self.b._path("k") and seen and seen[0] == "dead":
+                self.assertTrue(self.a.acquire("k"))
+            return seen
+
+        self.b._read = read_then_lose_race
+        self.assertFalse(self.b.acquire("k"))
+        self.assertEqual(self.owner("k"), "a")
+        self.assertEqual([p.name for p in self.a.dir.iterdir()], [self.a._path("k").name])
+
+    def test_lease_created_during_restore_is_kept(self):
+        c = LeaseManager(self.dest, ttl=60, owner="c")
+        self.assertTrue(self.dead.acquire("k"))
+        self.expire("k")
+        read = self.b._read
+
+        def read_with_two_racers(path):
+            seen = read(path)
+            if path == self.b._path("k") and seen and seen[0] == "dead":
+                # "a" takes over before b's rename ...
+                self.assertTrue(self.a.acquire("k"))
+            elif path != self.b._path("k"):
+                # ... and "c" creates a new lease before b can put a's back
+                self.assertTrue(c.acquire("k"))
+            return seen
+
+        self.b._read = read_with_two_racers
+        self.assertFalse(self.b.acquire("k"))
+        self.assertEqual(self.owner("k"), "c")
+        # a's moved lease is left in place, not deleted
+        moved = [p for p in self.a.dir.iterdir() if ".stale." in p.name]
+        self.assertEqual(len(moved), 1)
+        self.assertEqual(json.loads(moved[0].read_text(encoding="utf-8"))["owner"], "a")
+
+        # a notices on its next renewal and neither renews nor releases c's lease
+        self.a._held["k"] = time.monotonic() - 60
+        mtime = self.a._path("k").stat().st_mtime
+        self.a.keepalive("k")
+        self.a.release("k")
+        self.assertEqual(self.owner("k"), "c")
+        self.assertEqual(self.a._path("k").stat().st_mtime, mtime)
+
+
+if __name__ == "__main__":
+    unittest.main()